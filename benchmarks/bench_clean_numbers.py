@@ -0,0 +1,62 @@
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from utils.globals.constants import clean_and_parse_number, clean_and_parse_numbers
+
+# Compares the per-cell clean_and_parse_number loops the PDF readers used with the column-wise
+# clean_and_parse_numbers, on cells shaped like pdfplumber output of GSTR-3B/9/9C amount columns.
+# Run from the repository root: python -m benchmarks.bench_clean_numbers [--rows N] [--cols N] [--repeat N]
+
+_sample_cells = ["1,23,45,678.90", "12,345.00", "-4,500.50", "0.00", "-", "", None, "9,99,999\n.00",
+                 "1,000 .25", "\t72,000.00 ", "(\n)", "Rs. 10", "2.5.1"]
+
+
+def _make_frame(rows, cols, seed=0):
+    rng = random.Random(seed)
+    return pd.DataFrame([[rng.choice(_sample_cells) for _ in range(cols)] for _ in range(rows)], dtype=object)
+
+
+def _per_cell(frame):
+    df = frame.copy()
+    for row_idx in range(df.shape[0]):
+        for col_idx in range(df.shape[1]):
+            df.iat[row_idx, col_idx] = clean_and_parse_number(df.iat[row_idx, col_idx])
+    return df
+
+
+def _best_of(fn, frame, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(frame)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-cell vs column-wise number cleaning.")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--cols", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    frame = _make_frame(args.rows, args.cols)
+    per_cell_seconds, expected = _best_of(_per_cell, frame, args.repeat)
+    vectorized_seconds, actual = _best_of(clean_and_parse_numbers, frame, args.repeat)
+    if not (expected.astype("float64").to_numpy() == actual.to_numpy()).all():
+        raise SystemExit("[Benchmark] ❌ clean_and_parse_numbers does not match clean_and_parse_number")
+
+    cells = args.rows * args.cols
+    print(f"[Benchmark] {cells} cells, best of {args.repeat}")
+    print(f"  per-cell clean_and_parse_number : {per_cell_seconds * 1000:9.2f} ms")
+    print(f"  clean_and_parse_numbers         : {vectorized_seconds * 1000:9.2f} ms")
+    print(f"  speedup                         : {per_cell_seconds / vectorized_seconds:9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from glob import glob
+
+from utils import pdf_table_cache
+from utils.extractors.gstr3b_table_extractor import extract_fixed_tables_from_gstr3b
+
+# Compares the two ways extract_fixed_tables_from_gstr3b gets cell text: pdfplumber's table.extract() and the
+# word-coordinate path (one extract_words() per page, words placed in cells by their coordinates). Both run on the
+# same GSTR-3B PDFs with an empty PDF table cache each, and every table_map must come out the same. Its result on
+# real returns decides whether GSTR3B_WORD_EXTRACTION can be turned on; both paths still run table detection.
+# Run from the repository root, e.g. on a year of monthly returns for three GSTINs:
+#     python -m benchmarks.bench_gstr3b_extraction path/to/gstr3b_pdfs
+
+
+def _run(pdf_files, words):
+    # A fresh cache directory, so that every PDF is really parsed
+    with tempfile.TemporaryDirectory() as cache_dir:
+        pdf_table_cache.PDF_TABLE_CACHE_PATH = cache_dir
+        results = {}
+        start = time.perf_counter()
+        for pdf_path in pdf_files:
+            results[pdf_path] = extract_fixed_tables_from_gstr3b(pdf_path, words=words)
+        return time.perf_counter() - start, results
+
+
+def _differences(expected, actual):
+    if list(expected) != list(actual):
+        return [f"tables {list(expected)} vs {list(actual)}"]
+    return [f"table {key}" for key in expected
+            if not (expected[key].columns.equals(actual[key].columns) and expected[key].equals(actual[key]))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark GSTR-3B table extraction with and without words.")
+    parser.add_argument("pdf_dir", help="Folder with GSTR-3B PDFs, e.g. 36 monthly returns.")
+    args = parser.parse_args(argv)
+
+    pdf_files = sorted(glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if not pdf_files:
+        print(f"[Benchmark] No PDFs found in {args.pdf_dir}")
+        return 1
+    stdout = sys.stdout
+    try:
+        sys.stdout = open(os.devnull, "w")  # The extractor prints a lot per file
+        table_seconds, expected = _run(pdf_files, words=False)
+        word_seconds, actual = _run(pdf_files, words=True)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    mismatches = {pdf_path: _differences(expected[pdf_path], actual[pdf_path]) for pdf_path in pdf_files}
+    mismatches = {pdf_path: diff for pdf_path, diff in mismatches.items() if diff}
+    print(f"[Benchmark] {len(pdf_files)} GSTR-3B PDF(s), empty PDF table cache")
+    print(f"  table.extract()        : {table_seconds:8.2f} s")
+    print(f"  word coordinates       : {word_seconds:8.2f} s")
+    print(f"  speedup                : {table_seconds / word_seconds:8.2f}x")
+    if mismatches:
+        for pdf_path, diff in mismatches.items():
+            print(f"[Benchmark] ❌ {os.path.basename(pdf_path)} differs: {', '.join(diff)}")
+        return 2
+    print("[Benchmark] ✅ All table maps match")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
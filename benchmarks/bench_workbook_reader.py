@@ -0,0 +1,93 @@
+import argparse
+import os
+import time
+from glob import glob
+
+from openpyxl import load_workbook
+
+from utils.workbook_reader import open_rows_workbook, reader_backend
+
+# Compares the ways an Excel input can be read for its cell values: openpyxl's default mode (what every reader used
+# before utils/workbook_reader.py), openpyxl read-only mode (the fallback backend) and calamine (the default
+# backend). Every sheet of every workbook is read row by row with each backend and the non-empty rows must match.
+# Run from the repository root on the uploaded workbooks of a GSTIN, e.g.:
+#     python -m benchmarks.bench_workbook_reader "uploaded_files/<gstin>/GSTR-2A" "uploaded_files/<gstin>/GSTR-2B"
+
+
+def _read_full(file_path):
+    wb = load_workbook(file_path, data_only=True)
+    try:
+        return {name: _non_empty(wb[name].iter_rows(values_only=True)) for name in wb.sheetnames}
+    finally:
+        wb.close()
+
+
+def _read_with(backend):
+    def read(file_path):
+        wb = open_rows_workbook(file_path, backend)
+        try:
+            return {name: _non_empty(wb[name].iter_rows(values_only=True)) for name in wb.sheetnames}
+        finally:
+            wb.close()
+    return read
+
+
+def _non_empty(rows):
+    # Backends differ in whether a row carries trailing empty cells; the values are what must match
+    result = []
+    for row in rows:
+        row = list(row)
+        while row and row[-1] is None:
+            row.pop()
+        if row:
+            result.append(tuple(row))
+    return result
+
+
+def _timed(read, file_path):
+    start = time.perf_counter()
+    sheets = read(file_path)
+    return time.perf_counter() - start, sheets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark openpyxl and calamine on Excel inputs.")
+    parser.add_argument("paths", nargs="+", help="xlsx files or folders with xlsx files (2A, 2B, BO comparison).")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.paths:
+        files += sorted(glob(os.path.join(path, "*.xlsx"))) if os.path.isdir(path) else [path]
+    if not files:
+        raise SystemExit("[Benchmark] ❌ No xlsx files found")
+    if reader_backend() != "calamine":
+        raise SystemExit("[Benchmark] ❌ python-calamine is not installed (or WORKBOOK_READER=openpyxl)")
+
+    backends = [("openpyxl", _read_full), ("openpyxl read-only", _read_with("openpyxl")),
+                ("calamine", _read_with("calamine"))]
+    totals = [0.0] * len(backends)
+    mismatches = 0
+    print(f"{'file':<40} {'rows':>8} " + " ".join(f"{name + ' (s)':>22}" for name, _ in backends) + f" {'speedup':>8}")
+    for file_path in files:
+        timings, expected = [], None
+        for _, read in backends:
+            elapsed, sheets = _timed(read, file_path)
+            timings.append(elapsed)
+            if expected is None:
+                expected = sheets
+            elif sheets != expected:
+                mismatches += 1
+                print(f"[Benchmark] ❌ {os.path.basename(file_path)} differs from openpyxl")
+        totals = [total + elapsed for total, elapsed in zip(totals, timings)]
+        rows = sum(len(sheet_rows) for sheet_rows in expected.values())
+        print(f"{os.path.basename(file_path)[:40]:<40} {rows:>8} " + " ".join(f"{t:>22.2f}" for t in timings)
+              + f" {timings[0] / timings[-1]:>7.1f}x")
+    print(f"{'total':<40} {'':>8} " + " ".join(f"{t:>22.2f}" for t in totals) + f" {totals[0] / totals[-1]:>7.1f}x")
+    if mismatches:
+        return 1
+    print("[Benchmark] ✅ All backends read the same values")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
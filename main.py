@@ -1,22 +1,27 @@
 import os
-import glob
+import asyncio
+import json
+import multiprocessing
 import logging
 import threading
 import webbrowser
 import sys
 import uvicorn
 from typing import List
-from fastapi import FastAPI, UploadFile, File, Form, Query, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Query, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from utils.file_handler import save_uploaded_file
+from utils.file_handler import save_uploaded_files, save_uploaded_zip, list_uploaded_files_with_hash, \
+    delete_uploaded_file
+from utils.globals.settings import MAX_UPLOAD_FILE_BYTES, MAX_UPLOAD_REQUEST_BYTES, JOB_EVENT_POLL_SECONDS, \
+    REPORTS_BASE_PATH
 from utils.pdf_processor import process_pdf_files
 from utils.csv_processor import process_csv_files
-from utils.master_generator import generate_merged_excel_and_analysis_report
-from fastapi.responses import JSONResponse
-from openpyxl import load_workbook
-from fastapi import HTTPException
+from utils.job_queue import submit_report_job, get_job, get_job_events, cancel_job
+from utils.batch import submit_batch, get_batch, discover_gstins
+from utils.process_pool import shutdown_process_pool
+from utils.workbook_reader import open_rows_workbook
 from pathlib import Path
 import psutil
 
@@ -33,8 +38,6 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-# Reports directory
-REPORTS_BASE_PATH = "reports"
 
 
 # === Resolve build/static paths (for both normal and exe/frozen) ===
@@ -89,21 +92,29 @@ async def upload_files(
         return_type: str = Form(...),
         files: List[UploadFile] = File(...)
 ):
-    saved_paths = []
-    for file in files:
-        path = await save_uploaded_file(file, gstn=gstn, return_type=return_type)
-        saved_paths.append(path)
-    return {"file_paths": saved_paths}
+    # All or nothing: a 413 for one file leaves none of this request's files stored
+    saved = await save_uploaded_files(files, gstn=gstn, return_type=return_type,
+                                      max_file_bytes=MAX_UPLOAD_FILE_BYTES,
+                                      max_request_bytes=MAX_UPLOAD_REQUEST_BYTES)
+    saved_files = [{"file_path": path, "sha256": sha256, "size": size} for path, sha256, size in saved]
+    return {"file_paths": [path for path, _, _ in saved], "files": saved_files}
+
+
+@app.post("/upload_zip/")
+async def upload_zip(gstn: str = Form(...), file: UploadFile = File(...)):
+    """
+    Uploads all the return files of a GSTIN as one zip. Each member is routed to its return type folder by
+    looking at its content; members that cannot be recognised are listed under "skipped".
+    """
+    saved, skipped = await save_uploaded_zip(file, gstn=gstn)
+    return {"file_paths": [entry["file_path"] for entry in saved], "files": saved, "skipped": skipped}
 
 
 @app.get("/files/")
 def list_uploaded_files(gstn: str, return_type: str):
-    folder_path = os.path.join("uploaded_files", gstn, return_type)
-    if not os.path.exists(folder_path):
-        return {"files": []}
-
-    files = [os.path.basename(path) for path in glob.glob(f"{folder_path}/*")]
-    return {"files": files}
+    details = list_uploaded_files_with_hash(gstn, return_type)
+    files = [entry["name"] for entry in details]
+    return {"files": files, "details": details}
 
 
 @app.post("/process/")
@@ -125,10 +136,7 @@ async def process_files(return_type: str, file_paths: List[str]):
 
 @app.delete("/delete/")
 def delete_file(gstn: str, return_type: str, filename: str):
-    folder_path = os.path.join("uploaded_files", gstn, return_type)
-    file_path = os.path.join(folder_path, filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    if delete_uploaded_file(gstn, return_type, filename):
         return {"message": "File deleted successfully."}
     return JSONResponse(status_code=404, content={"error": "File not found."})
 
@@ -137,10 +145,76 @@ def delete_file(gstn: str, return_type: str, filename: str):
 async def generate_master(gstn: str = Form(...),
                           include_ASMT_10_report: str = Form("false")):  # Default to "false" if not provided
     report_flag = include_ASMT_10_report.lower() == "true"
-    generated_reports = await generate_merged_excel_and_analysis_report(gstn, report_flag)
-    if not generated_reports:
-        raise HTTPException(status_code=404, detail="No reports generated for any return type")
-    return JSONResponse(content={"status": "completed", "reports": generated_reports})
+    # Generation takes minutes for a full year, so it runs as a background job polled through /jobs/{job_id}
+    job, attached = submit_report_job(gstn, report_flag)
+    return JSONResponse(status_code=202, content={"status": job["state"], "job_id": job["job_id"],
+                                                  "attached": attached})
+
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JSONResponse(content=job)
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job_request(job_id: str):
+    job = cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JSONResponse(status_code=202, content=job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, last_event_id: int | None = Header(None)):
+    """
+    Server-sent events for a report job: stage started/finished, file N of M parsed, rows merged, with elapsed
+    time. The stream ends after the "job_finished" event. Reconnecting clients resume after Last-Event-ID.
+    """
+    if get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def event_stream():
+        next_id = 0 if last_event_id is None else last_event_id + 1
+        while True:
+            events = get_job_events(job_id, next_id)
+            if events is None:
+                return  # Job dropped from history
+            for event in events:
+                next_id = event["id"] + 1
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+                if event["type"] == "job_finished":
+                    return
+            await asyncio.sleep(JOB_EVENT_POLL_SECONDS)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/batches/")
+async def generate_batch(gstins: str = Form(""),
+                         include_ASMT_10_report: str = Form("false")):
+    """
+    Queues report generation for many GSTINs (comma or newline separated). With no GSTINs, every GSTIN in
+    uploaded_files/ is processed. Progress and the summary are read through /batches/{batch_id}.
+    """
+    report_flag = include_ASMT_10_report.lower() == "true"
+    gstin_list = [gstin.strip() for gstin in gstins.replace("\n", ",").split(",") if gstin.strip()]
+    if not gstin_list:
+        gstin_list = discover_gstins()
+    if not gstin_list:
+        raise HTTPException(status_code=400, detail="No GSTINs given and none found in uploaded files.")
+    return JSONResponse(status_code=202, content=submit_batch(gstin_list, report_flag))
+
+
+@app.get("/batches/{batch_id}")
+def get_batch_status(batch_id: str):
+    batch = get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+    return JSONResponse(content=batch)
 
 
 @app.get("/reports/")
@@ -149,7 +223,7 @@ def list_reports(gstn: str = Query(...)):
     if not os.path.exists(reports):
         return JSONResponse(status_code=404, content={"detail": "No reports found."})
 
-    files = [f for f in os.listdir(reports)]
+    files = [f for f in os.listdir(reports) if not f.startswith(".")]  # Skip the stage manifest and cache
     return {"reports": files}
 
 
@@ -166,17 +240,22 @@ def download_report(gstn: str = Query(...), filename: str = Query(...)):
 def preview_excel(gstn: str, filename: str):
     file_path = f"reports/{gstn}/{filename}"
     try:
-        wb = load_workbook(file_path, data_only=True)
+        wb = open_rows_workbook(file_path)
         preview_data = []
-        for sheet in wb.sheetnames:
-            ws = wb[sheet]
-            rows = []
-            for row in ws.iter_rows(values_only=True):
-                rows.append([str(cell) if cell is not None else "" for cell in row])
-            preview_data.append({
-                "name": sheet,
-                "data": rows
-            })
+        try:
+            for sheet in wb.sheetnames:
+                ws = wb[sheet]
+                rows = []
+                for row in ws.iter_rows(values_only=True):
+                    rows.append([str(cell) if cell is not None else "" for cell in row])
+                # Rows end at their last value; the preview grid wants them all as wide as the sheet
+                width = max(map(len, rows), default=0)
+                preview_data.append({
+                    "name": sheet,
+                    "data": [row + [""] * (width - len(row)) for row in rows]
+                })
+        finally:
+            wb.close()
         return JSONResponse(content={"sheets": preview_data})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -203,8 +282,15 @@ def check_open_reports(gstn: str = Query(...)):
     return {"open": False}
 
 
+@app.on_event("shutdown")
+def stop_stage_workers():
+    shutdown_process_pool()
+
+
 # === App Startup ===
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Stage worker processes of the packaged exe re-enter here
+
     def open_browser():
         webbrowser.open("http://127.0.0.1:8000")
 
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app modules the way main.py does, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test in an empty folder: uploaded_files/, reports/ and the caches are relative to the CWD."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """
+    Writes a PDF and returns its path: make_pdf(name, pages), every page a (lines of text, tables) pair. Each table
+    is drawn with ruling lines as rows of cell strings, one table below the other, like the portal's forms.
+    """
+    canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+
+    def make(name, pages):
+        path = str(tmp_path / name)
+        pdf = canvas.Canvas(path, pagesize=(595, 842))
+        for lines, tables in pages:
+            y = 800
+            for line in lines:
+                pdf.drawString(40, y, line)
+                y -= 16
+            for rows in tables:
+                y -= 20
+                column_count = len(rows[0])
+                xs = [40 + 120 * column for column in range(column_count + 1)]
+                ys = [y - 20 * row for row in range(len(rows) + 1)]
+                pdf.grid(xs, ys)
+                for row_idx, row in enumerate(rows):
+                    for column, text in enumerate(row):
+                        pdf.drawString(xs[column] + 4, ys[row_idx] - 14, text)
+                y = ys[-1]
+            pdf.showPage()
+        pdf.save()
+        return path
+
+    return make
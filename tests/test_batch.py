@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from utils import batch, job_queue
+
+
+@pytest.fixture
+def fake_reports(monkeypatch):
+    """Replaces the report chain with one that returns at once, or when the returned event is set."""
+    release = threading.Event()
+    release.set()
+
+    async def generate(gstin, report_flag, stage_timings=None, cancel_event=None):
+        release.wait(timeout=10)
+        return [f"reports/{gstin}/{gstin}_GENERAL_REPORT.docx"]
+
+    monkeypatch.setattr(job_queue, "generate_merged_excel_and_analysis_report", generate)
+    return release
+
+
+def _wait_finished(batch_id, timeout=10):
+    deadline = time.time() + timeout
+    summary = batch.get_batch(batch_id)
+    while summary["state"] != "finished" and time.time() < deadline:
+        time.sleep(0.02)
+        summary = batch.get_batch(batch_id)
+    return summary
+
+
+def test_batch_of_fast_jobs_finishes(fake_reports):
+    summary = batch.submit_batch([f"FAST{i}" for i in range(5)], report_flag=False)
+    summary = _wait_finished(summary["batch_id"])
+    assert summary["state"] == "finished"
+    assert summary["counts"] == {"completed": 5}
+
+
+def test_batch_larger_than_job_history_finishes(fake_reports, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_HISTORY_LIMIT", 2)
+    summary = batch.submit_batch([f"MANY{i}" for i in range(8)], report_flag=False)
+    summary = _wait_finished(summary["batch_id"])
+    assert summary["state"] == "finished"
+    assert summary["counts"] == {"completed": 8}
+    assert [entry["gstin"] for entry in summary["gstins"]] == [f"MANY{i}" for i in range(8)]
+
+
+def test_two_batches_attached_to_one_job_both_finish(fake_reports):
+    fake_reports.clear()
+    first = batch.submit_batch(["SHARED"], report_flag=False)
+    second = batch.submit_batch(["SHARED"], report_flag=False)
+    assert first["gstins"][0]["job_id"] == second["gstins"][0]["job_id"]
+    fake_reports.set()
+    assert _wait_finished(first["batch_id"])["counts"] == {"completed": 1}
+    assert _wait_finished(second["batch_id"])["counts"] == {"completed": 1}
+
+
+def test_job_missing_from_history_does_not_keep_the_batch_running(fake_reports):
+    fake_reports.clear()
+    summary = batch.submit_batch(["GONE"], report_flag=False)
+    job_id = summary["gstins"][0]["job_id"]
+    with job_queue._lock:
+        job = job_queue._jobs.pop(job_id)
+        job["batch_ids"].clear()  # Its job_finished event no longer reaches the batch either
+    fake_reports.set()
+    summary = _wait_finished(summary["batch_id"])
+    assert summary["state"] == "finished"
+    assert summary["gstins"][0]["state"] == batch.JOB_UNKNOWN
@@ -0,0 +1,13 @@
+import pandas as pd
+
+from utils.globals.constants import clean_and_parse_number, clean_and_parse_numbers
+
+
+def test_clean_and_parse_numbers_matches_the_per_cell_parse():
+    cells = ["1,23,456.50", "12 345", "-12", ".5", "5.", "1.2.3", "-", "", None, float("nan"), 7, 2.5, "Rs. 100",
+             "₹ 1,000", " 42\n", "１２３", "１２.５", "١٢", "१२३", "²", "nan", "inf"]
+    frame = pd.DataFrame([cells[:11], cells[11:]], columns=["a", "b", "b", None, "c", "d", "e", "f", "g", "h", "i"])
+    expected = [[float(clean_and_parse_number(cell)) for cell in row] for row in frame.itertuples(index=False)]
+    parsed = clean_and_parse_numbers(frame)
+    assert parsed.to_numpy().tolist() == expected
+    assert list(parsed.columns) == list(frame.columns) and parsed.dtypes.eq("float64").all()
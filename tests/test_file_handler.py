@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from openpyxl import Workbook
+
+from utils.file_handler import save_uploaded_files, delete_uploaded_file, blob_path_for, get_file_hash, \
+    list_uploaded_files_with_hash, _extract_zip_members
+
+
+def _upload(name, data):
+    return UploadFile(file=io.BytesIO(data), filename=name)
+
+
+def test_upload_over_request_limit_stores_nothing(workdir):
+    files = [_upload("a.pdf", b"a" * 10), _upload("b.pdf", b"b" * 10)]
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(save_uploaded_files(files, "GSTIN", "GSTR-3B", max_file_bytes=100, max_request_bytes=15))
+    assert error.value.status_code == 413
+    assert "per-request limit of 15 bytes" in error.value.detail
+    assert not os.path.exists(os.path.join("uploaded_files", "GSTIN", "GSTR-3B", "a.pdf"))
+    assert os.listdir(os.path.join("uploaded_files", ".blobs", "tmp")) == []
+
+
+def test_upload_over_file_limit_names_the_file_limit(workdir):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(save_uploaded_files([_upload("a.pdf", b"a" * 10)], "GSTIN", "GSTR-3B", max_file_bytes=5,
+                                        max_request_bytes=100))
+    assert error.value.status_code == 413
+    assert "per-file upload limit of 5 bytes" in error.value.detail
+
+
+def _store(name, data, return_type="GSTR-3B"):
+    [(file_path, sha256, _)] = asyncio.run(save_uploaded_files([_upload(name, data)], "GSTIN", return_type))
+    return file_path, sha256
+
+
+def _blob_count():
+    blob_root = os.path.join("uploaded_files", ".blobs")
+    return sum(len(files) for folder, _, files in os.walk(blob_root) if os.path.basename(folder) != "tmp")
+
+
+def test_same_bytes_are_stored_once(workdir):
+    first_path, first_sha = _store("a.pdf", b"same bytes")
+    second_path, second_sha = _store("b.pdf", b"same bytes", return_type="GSTR-1")
+    assert first_sha == second_sha
+    assert _blob_count() == 1
+    with open(second_path, "rb") as f:
+        assert f.read() == b"same bytes"
+
+
+def test_a_file_replaced_out_of_band_is_hashed_again(workdir):
+    file_path, sha256 = _store("a.pdf", b"original")
+    assert get_file_hash(file_path) == sha256
+    # Same size, so only the link to the blob tells the index entry is stale
+    with open(f"{file_path}.new", "wb") as f:
+        f.write(b"replaced")
+    os.replace(f"{file_path}.new", file_path)
+    new_sha = hashlib.sha256(b"replaced").hexdigest()
+    assert get_file_hash(file_path) == new_sha
+    assert list_uploaded_files_with_hash("GSTIN", "GSTR-3B") == [{"name": "a.pdf", "sha256": new_sha, "size": 8}]
+
+
+def test_blob_is_removed_with_its_last_name(workdir):
+    _store("a.pdf", b"shared")
+    _store("b.pdf", b"shared")
+    assert delete_uploaded_file("GSTIN", "GSTR-3B", "a.pdf")
+    assert _blob_count() == 1
+    assert delete_uploaded_file("GSTIN", "GSTR-3B", "b.pdf")
+    assert _blob_count() == 0
+    assert not delete_uploaded_file("GSTIN", "GSTR-3B", "b.pdf")
+
+
+def test_reupload_with_new_content_drops_the_old_blob(workdir):
+    _, old_sha = _store("a.pdf", b"old content")
+    _, new_sha = _store("a.pdf", b"new content")
+    assert _blob_count() == 1
+    assert not os.path.exists(blob_path_for(old_sha))
+    assert os.path.exists(blob_path_for(new_sha))
+    assert list_uploaded_files_with_hash("GSTIN", "GSTR-3B") == [{"name": "a.pdf", "sha256": new_sha, "size": 11}]
+
+
+def _workbook_bytes(sheet_names):
+    wb = Workbook()
+    wb.active.title = sheet_names[0]
+    for name in sheet_names[1:]:
+        wb.create_sheet(name)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def test_zip_members_are_routed_by_sheet_names(workdir):
+    zip_path = workdir / "returns.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("2a/apr.xlsx", _workbook_bytes(["B2B", "CDNR", "TDS"]))
+        archive.writestr("2b/apr.xlsx", _workbook_bytes(["ITC Available", "B2B"]))
+        archive.writestr("notes.txt", b"not a return")
+    saved, skipped = _extract_zip_members(str(zip_path), "GSTIN", 10 ** 6, 10 ** 7)
+    assert sorted((entry["return_type"], os.path.basename(entry["file_path"])) for entry in saved) == \
+        [("GSTR-2A", "apr.xlsx"), ("GSTR-2B", "apr.xlsx")]
+    assert [entry["name"] for entry in skipped] == ["notes.txt"]
+
+
+def test_zip_members_with_the_same_name_do_not_overwrite_each_other(workdir):
+    zip_path = workdir / "returns.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("april/2a.xlsx", _workbook_bytes(["B2B", "CDNR"]))
+        archive.writestr("may/2a.xlsx", _workbook_bytes(["B2B", "CDNR", "TDS"]))
+    saved, skipped = _extract_zip_members(str(zip_path), "GSTIN", 10 ** 6, 10 ** 7)
+    assert len(saved) == 1
+    assert skipped == [{"name": "may/2a.xlsx", "reason": "Same GSTR-2A file name as april/2a.xlsx"}]
+    with zipfile.ZipFile(zip_path) as archive:
+        assert saved[0]["sha256"] == hashlib.sha256(archive.read("april/2a.xlsx")).hexdigest()
@@ -0,0 +1,145 @@
+import dataclasses
+
+import pandas as pd
+import pdfplumber
+import pytest
+
+from utils.extractors import form_layouts
+from utils.extractors.form_layouts import TableRegion, detect_layout, first_page_period
+from utils.extractors.gstr3b_table_extractor import extract_fixed_tables_from_gstr3b
+from utils.globals.constants import oldFormat, newFormat, format19_20
+from utils.pdf_table_cache import PdfTables
+
+
+class _FakePdfTables:
+    """The parts of PdfTables detect_layout reads. Asking for the total count fails the test."""
+
+    file_name = "form.pdf"
+
+    def __init__(self, first_page_text, table_count):
+        self._text = first_page_text
+        self._table_count = table_count
+        self.highest_table_asked = -1
+
+    def first_page_text(self):
+        return self._text
+
+    def get(self, idx):
+        self.highest_table_asked = max(self.highest_table_asked, idx)
+        return [["Financial Year", "-"]] if idx < self._table_count else None
+
+    @property
+    def count(self):
+        raise AssertionError("detect_layout counted every table")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("GSTR-3B Year 2021-22 Period March", (oldFormat, 1)),
+    ("GSTR-3B Year 2022-23 Period April", (newFormat, 2)),
+    ("GSTR-3B Year 2024-25 Period September", (newFormat, 3)),
+])
+def test_gstr3b_layout_from_the_first_page_period(text, expected):
+    layout = detect_layout("GSTR-3B", _FakePdfTables(text, table_count=0))
+    assert (layout.name, layout.version) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("GSTR-9C Financial Year 2018-19", oldFormat),
+    ("GSTR-9C Financial Year 2019-20", oldFormat),
+    ("GSTR-9C Financial Year 2020-21", newFormat),
+    ("GSTR-9C Financial Year 2023-24", newFormat),
+])
+def test_gstr9c_layout_from_the_financial_year_alone(text, expected):
+    pdf_tables = _FakePdfTables(text, table_count=0)
+    assert detect_layout("GSTR-9C", pdf_tables).name == expected
+    assert pdf_tables.highest_table_asked == -1  # No table searched
+
+
+@pytest.mark.parametrize("text, table_count, expected", [
+    ("GSTR-9 Financial Year 2019-20", 18, format19_20),
+    ("GSTR-9 Financial Year 2018-19", 18, oldFormat),
+    ("GSTR-9 Financial Year 2022-23", 19, newFormat),
+    ("GSTR-9", 18, oldFormat),  # No readable period: the 2019-20 layout is left out
+])
+def test_gstr9_layout_checks_the_table_count_without_counting_all_tables(text, table_count, expected):
+    pdf_tables = _FakePdfTables(text, table_count)
+    assert detect_layout("GSTR-9", pdf_tables).name == expected
+    assert pdf_tables.highest_table_asked <= 18
+
+
+def test_first_page_period_of_an_annual_return():
+    assert first_page_period("Annual Return Financial Year : 2020 - 21") == ("2020-21", None)
+
+
+_TABLE = [["Description", "Amount"], ["Taxable value", "100.00"]]
+
+
+def _drawn_regions(page, line_count, tables):
+    # TableRegions of the tables make_pdf draws on a page below line_count lines of text, measured from the top
+    regions, y = [], 800 - 16 * line_count
+    for idx, rows in enumerate(tables):
+        y -= 20
+        xs = tuple(40 + 120 * column for column in range(len(rows[0]) + 1))
+        bottom = y - 20 * len(rows)
+        # Like the generic GSTR-3B reader: the first two tables of a page have no header row
+        header_row = idx not in (0, 1)
+        regions.append(TableRegion(page, (xs[0] - 2, 842 - y - 2, xs[-1] + 2, 842 - bottom + 2), xs,
+                                   header_row=header_row, row_count=len(rows),
+                                   numeric_from_column=1 if header_row else None))
+        y = bottom
+    return regions
+
+
+def test_a_region_table_has_the_rows_of_generic_detection(workdir, make_pdf):
+    rows = [["Nature of supplies", "Integrated tax", "Cess"], ["(a) Outward taxable", "1,23,456.00", "-"]]
+    pdf_path = make_pdf("form.pdf", [(["Form GSTR-3B", "Period April"], [_TABLE, rows])])
+    [_, region] = _drawn_regions(0, 2, [_TABLE, rows])
+    with PdfTables(pdf_path) as pdf_tables:
+        assert pdf_tables.region_table(region.page, region.bbox, region.column_lines) == rows == pdf_tables.table(1)
+
+
+def _gstr3b_with_regions(make_pdf, monkeypatch, broken_table=None):
+    # Period April 2019-20: the layout before 2022, whose 9 tables are drawn 5 on the first page and 4 on the second
+    pages = [(["Financial Year 2019-20", "Period April"], [_TABLE] * 5), ([], [_TABLE] * 4)]
+    pdf_path = make_pdf("gstr3b.pdf", pages)
+    regions = _drawn_regions(0, 2, pages[0][1]) + _drawn_regions(1, 0, pages[1][1])
+    if broken_table is not None:  # Shifted onto the text lines above it, where no table is
+        region = regions[broken_table]
+        regions[broken_table] = dataclasses.replace(region, bbox=(region.bbox[0], 0, region.bbox[2], 40))
+    old_layout = form_layouts.FORM_LAYOUTS["GSTR-3B"][0]
+    layout = dataclasses.replace(old_layout, regions={key: (regions[idx],) for key, idx in old_layout.tables.items()})
+    monkeypatch.setitem(form_layouts.FORM_LAYOUTS, "GSTR-3B", [layout] + form_layouts.FORM_LAYOUTS["GSTR-3B"][1:])
+    return pdf_path
+
+
+def _assert_same_tables(table_map, expected):
+    assert list(table_map) == list(expected)
+    for key, df in expected.items():
+        pd.testing.assert_frame_equal(table_map[key], df)
+
+
+def test_gstr3b_tables_are_read_from_their_regions_alone(workdir, make_pdf, monkeypatch):
+    pdf_path = _gstr3b_with_regions(make_pdf, monkeypatch)
+    with monkeypatch.context() as m:
+        m.setattr(form_layouts, "PDF_REGION_EXTRACTION", 0)
+        expected = extract_fixed_tables_from_gstr3b(pdf_path, words=False)
+    searched = []
+    find_tables = pdfplumber.page.Page.find_tables
+
+    def recorded_find_tables(page, *args, **kwargs):
+        searched.append(page)
+        return find_tables(page, *args, **kwargs)
+    monkeypatch.setattr(pdfplumber.page.Page, "find_tables", recorded_find_tables)
+    _assert_same_tables(extract_fixed_tables_from_gstr3b(pdf_path, words=False), expected)
+    # One search per region, each on its cropped part of the page
+    assert len(searched) == 9 and all(isinstance(page, pdfplumber.page.CroppedPage) for page in searched)
+
+
+def test_gstr3b_falls_back_to_table_detection_when_a_region_fails_validation(workdir, make_pdf, monkeypatch):
+    pdf_path = _gstr3b_with_regions(make_pdf, monkeypatch, broken_table=6)
+    with monkeypatch.context() as m:
+        m.setattr(form_layouts, "PDF_REGION_EXTRACTION", 0)
+        expected = extract_fixed_tables_from_gstr3b(pdf_path, words=False)
+    table_map = extract_fixed_tables_from_gstr3b(pdf_path, words=False)
+    _assert_same_tables(table_map, expected)
+    assert list(table_map) == ["1", "2", "3.1", "3.2", "4", "5", "5.1", "6.1", "7"]
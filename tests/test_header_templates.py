@@ -0,0 +1,95 @@
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from utils import header_templates
+from utils.header_templates import _format_signature
+
+_HEADER_ROW_MAP = {"B2B": [0, 1]}
+
+
+def _save(path, bold=False, merge=False, width=None, rows=3, title="Invoice details"):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "B2B"
+    ws.append(["GSTIN of supplier", title, None])
+    ws.append([None, "Invoice number", "Invoice date"])
+    for idx in range(rows):
+        ws.append([f"27AAA{idx}", f"INV{idx}", "01-04-2024"])
+    if bold:
+        ws["A1"].font = Font(bold=True)
+    if merge:
+        ws.merge_cells("B1:C1")
+    if width:
+        ws.column_dimensions["A"].width = width
+    wb.create_sheet("Read me")
+    wb.save(path)
+    return str(path)
+
+
+def test_signature_ignores_the_data_rows(tmp_path):
+    assert _format_signature(_save(tmp_path / "a.xlsx"), _HEADER_ROW_MAP, None) == \
+        _format_signature(_save(tmp_path / "b.xlsx", rows=50), _HEADER_ROW_MAP, None)
+
+
+@pytest.mark.parametrize("change", [{"bold": True}, {"merge": True}, {"width": 30}, {"title": "Invoice Details"}])
+def test_signature_follows_header_text_styles_merges_and_widths(tmp_path, change):
+    assert _format_signature(_save(tmp_path / "a.xlsx"), _HEADER_ROW_MAP, None) != \
+        _format_signature(_save(tmp_path / "b.xlsx", **change), _HEADER_ROW_MAP, None)
+
+
+def test_merges_are_found_across_scan_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(header_templates, "_LAYOUT_SCAN_CHUNK_BYTES", 7)
+    assert _format_signature(_save(tmp_path / "a.xlsx", rows=20), _HEADER_ROW_MAP, None) != \
+        _format_signature(_save(tmp_path / "b.xlsx", merge=True, rows=20), _HEADER_ROW_MAP, None)
+
+
+
+def _save_shared_strings(path, title="Invoice details", rows=3):
+    # xlsxwriter stores text in the shared string table, in order of first use
+    xlsxwriter = pytest.importorskip("xlsxwriter")
+    workbook = xlsxwriter.Workbook(str(path))
+    ws = workbook.add_worksheet("B2B")
+    ws.write_row(0, 0, ["GSTIN of supplier", title])
+    ws.write_row(1, 1, ["Invoice number", "Invoice date"])
+    for idx in range(rows):
+        ws.write_row(idx + 2, 0, [f"27AAA{idx}", f"INV{idx}"])
+    workbook.close()
+    return str(path)
+
+
+def test_signature_follows_shared_header_strings_only(tmp_path):
+    signature = _format_signature(_save_shared_strings(tmp_path / "a.xlsx"), _HEADER_ROW_MAP, None)
+    assert _format_signature(_save_shared_strings(tmp_path / "b.xlsx", rows=50), _HEADER_ROW_MAP, None) == signature
+    assert _format_signature(_save_shared_strings(tmp_path / "c.xlsx", title="Invoice Details"), _HEADER_ROW_MAP,
+                             None) != signature
+
+
+class _CountingArchive:
+    def __init__(self, archive):
+        self.archive, self.bytes_read = archive, 0
+
+    def __getattr__(self, name):
+        return getattr(self.archive, name)
+
+    def open(self, name):
+        f = self.archive.open(name)
+        read = f.read
+
+        def counted(size=-1):
+            data = read(size)
+            self.bytes_read += len(data)
+            return data
+        f.read = counted
+        return f
+
+
+def test_shared_strings_are_read_only_up_to_the_header_strings(tmp_path, monkeypatch):
+    path = _save_shared_strings(tmp_path / "a.xlsx", rows=2000)
+    monkeypatch.setattr(header_templates, "_LAYOUT_SCAN_CHUNK_BYTES", 256)
+    with zipfile.ZipFile(path) as archive:
+        counting = _CountingArchive(archive)
+        assert header_templates._shared_strings_digest(counting, {0, 1, 2, 3}) is not None
+        assert 0 < counting.bytes_read < archive.getinfo("xl/sharedStrings.xml").file_size // 10
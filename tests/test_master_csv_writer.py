@@ -0,0 +1,32 @@
+import os
+
+import pandas as pd
+
+from utils.master_csv_writer import MasterCsvWriter
+
+
+def test_chunks_are_aligned_by_header(workdir):
+    with MasterCsvWriter(os.path.join("reports", "master.csv")) as writer:
+        writer.append(pd.DataFrame({"a": ["1"], "b": ["2"]}))
+        writer.append(pd.DataFrame({"b": ["3"], "c": ["4"]}))
+    written = pd.read_csv(os.path.join("reports", "master.csv"), dtype=str)
+    assert list(written.columns) == ["a", "b", "c"]
+    assert written.values.tolist() == [["1", "2", "0"], ["0", "3", "4"]]
+
+
+def test_repeated_headers_are_kept_apart(workdir):
+    # pdfplumber gives None for every empty header cell of a table
+    table = [["GSTIN", None, None, "Amount", "Amount"], ["27AAA", "x", "y", "1", "2"]]
+    with MasterCsvWriter(os.path.join("reports", "master.csv")) as writer:
+        writer.append(pd.DataFrame(table[1:], columns=table[0]))
+        writer.append(pd.DataFrame([["27BBB", "z", "3"]], columns=["GSTIN", None, "Amount"]))
+    with open(os.path.join("reports", "master.csv"), encoding="utf-8") as f:
+        assert f.read().splitlines() == ["GSTIN,,.1,Amount,Amount.1", "27AAA,x,y,1,2", "27BBB,z,0,3,0"]
+
+
+def test_nan_headers_are_written_empty(workdir):
+    # pandas 3 turns None column labels into NaN
+    with MasterCsvWriter(os.path.join("reports", "master.csv")) as writer:
+        writer.append(pd.DataFrame([["27AAA", "x", "y"]], columns=["GSTIN", float("nan"), float("nan")]))
+    with open(os.path.join("reports", "master.csv"), encoding="utf-8") as f:
+        assert f.read().splitlines() == ["GSTIN,,.1", "27AAA,x,y"]
@@ -0,0 +1,136 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from utils.gstr2a_merged import _parse_gstr2a_file
+from utils.gstr3b_merged_writer import stack_monthly_tables
+from utils.merged_sidecar import (MergedWorkbook, SheetGrid, decode_frame, encode_frame, openpyxl_sheets,
+                                  read_merged_sheet, read_month_table, write_sheet_sidecars, write_table_cubes)
+
+pytest.importorskip("pyarrow")
+
+_PARSE_ARGS = [{"header": None}, {"header": 0}, {"header": 1}, {"header": None, "skiprows": 2}]
+
+
+def _assert_sidecars_match_read_excel(xlsx_path):
+    with MergedWorkbook(xlsx_path) as workbook:
+        # Every sheet is read from its sidecar, not the xlsx
+        assert workbook._manifest is not None and None not in workbook._manifest["sheets"].values()
+        assert workbook.sheet_names == pd.ExcelFile(xlsx_path, engine="openpyxl").sheet_names
+        for sheet_name in workbook.sheet_names:
+            for kwargs in _PARSE_ARGS:
+                expected = pd.read_excel(xlsx_path, sheet_name=sheet_name, engine="openpyxl", **kwargs)
+                pd.testing.assert_frame_equal(workbook.parse(sheet_name, **kwargs), expected)
+
+
+def test_pandas_written_sheets_read_back_like_read_excel(tmp_path):
+    xlsx_path = str(tmp_path / "GSTR-3B_merged.xlsx")
+    df = pd.DataFrame({
+        "Amount": [1, 2.5, np.nan, 3.0, -4, 0],
+        "Text": ["x", "1,000.00", "", None, "-", "y"],
+        "Flag": [True, False, None, True, 1, 0],
+        "Date": [pd.Timestamp("2024-01-02"), pd.NaT, datetime.date(2023, 5, 6),
+                 datetime.datetime(2020, 1, 1, 3, 4, 5), None, None],
+        "Empty": [None] * 6,
+        7: [1, "a", 2.0, None, 1e20, -5],
+    })
+    grids = {}
+    with pd.ExcelWriter(xlsx_path, engine="xlsxwriter") as writer:
+        df.to_excel(writer, sheet_name="3.1", index=False, startrow=2)
+        writer.sheets["3.1"].write(0, 0, "Table 3.1")
+        grid = SheetGrid()
+        grid.put(0, 0, "Table 3.1")
+        grid.put_frame(df, 2)
+        grids["3.1"] = grid.rows()
+        pd.DataFrame([["T"]]).to_excel(writer, sheet_name="Short", index=False, header=False, startrow=3)
+        grid = SheetGrid()
+        grid.put_frame(pd.DataFrame([["T"]]), 3, header=False)
+        grids["Short"] = grid.rows()
+        pd.DataFrame().to_excel(writer, sheet_name="Empty", index=False)
+        grids["Empty"] = SheetGrid().rows()
+    write_sheet_sidecars(xlsx_path, grids)
+    _assert_sidecars_match_read_excel(xlsx_path)
+
+
+def test_openpyxl_written_sheets_read_back_like_read_excel(tmp_path):
+    xlsx_path = str(tmp_path / "GSTR-2A_merged.xlsx")
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "B2B"
+    ws.append(["GSTIN of supplier", "Invoice details", None, None])
+    ws.append([None, "Invoice number", "Invoice date", "Invoice value (₹)"])
+    ws.append(["27AAA", "INV-1", datetime.datetime(2024, 4, 1), 1180])
+    ws.append(["27BBB", 1002, None, 590.5])
+    ws.append([])
+    ws.append(["27CCC", "INV-3", datetime.datetime(2024, 4, 3), None])
+    wb.save(xlsx_path)
+    write_sheet_sidecars(xlsx_path, openpyxl_sheets(wb))
+    _assert_sidecars_match_read_excel(xlsx_path)
+
+
+def test_a_changed_xlsx_is_read_instead_of_its_sidecars(tmp_path):
+    xlsx_path = str(tmp_path / "GSTR-1_merged.xlsx")
+    pd.DataFrame({"a": [1]}).to_excel(xlsx_path, index=False, sheet_name="S")
+    write_sheet_sidecars(xlsx_path, {"S": [["a"], [1]]})
+    pd.DataFrame({"a": [2, 3]}).to_excel(xlsx_path, index=False, sheet_name="S")
+    os.utime(xlsx_path, ns=(0, 0))
+    assert read_merged_sheet(xlsx_path, "S")["a"].tolist() == [2, 3]
+
+
+def test_frames_decode_to_the_frames_encoded():
+    rows = [("27AAA", "INV-1", datetime.datetime(2024, 4, 1), 1180, 18.0, "Y", True),
+            ("27BBB", 1002, None, 590.5, None, None, False),
+            ("27CCC", None, datetime.datetime(2024, 4, 3), None, 5.0, datetime.time(9, 30), True)]
+    df = pd.DataFrame(rows)[[True, False, True]]
+    pd.testing.assert_frame_equal(decode_frame(encode_frame(df)), df.reset_index(drop=True))
+    with pytest.raises(TypeError):
+        encode_frame(pd.DataFrame({"a": [datetime.timedelta(1), "x"]}, dtype=object))
+
+
+def test_gstr2a_sheets_come_back_from_the_parsing_process_encoded(tmp_path):
+    path = str(tmp_path / "GSTR-2A_042024.xlsx")
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "B2B"
+    for _ in range(6):
+        ws.append(["Header"])
+    rows = [("27AAA", "Supplier A", "INV-1", datetime.datetime(2024, 4, 1), 1180),
+            ("27AAA", "Supplier A", "27AAA-Total", None, 1180),
+            ("27BBB", "Supplier B", 1002, datetime.datetime(2024, 4, 2), 590.5)]
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    encoded = _parse_gstr2a_file((path, 0, 1))["B2B"]
+    assert isinstance(encoded, bytes)
+    expected = pd.DataFrame([rows[0], rows[2]])
+    pd.testing.assert_frame_equal(decode_frame(encoded), expected)
+
+
+def test_one_month_of_a_summed_gstr3b_table_reads_back(tmp_path):
+    xlsx_path = str(tmp_path / "GSTR-3B_merged.xlsx")
+    columns = ["Nature of supplies", "Integrated tax", "Cess"]
+    april = pd.DataFrame([["(a) Outward taxable supplies", "1,23,456.00", "-"], ["(b) Zero rated", "", "10.50"]],
+                         columns=columns)
+    may = pd.DataFrame([["(a) Outward taxable supplies", "100.00", "1.00"], ["(b) Zero rated", "2.00", ""]],
+                       columns=columns)
+    cube = stack_monthly_tables([april, may], april.shape)
+    merged = april.astype(object)
+    merged.iloc[:, 1:] = cube.sum(axis=0)
+    merged.to_excel(xlsx_path, index=False)
+    write_sheet_sidecars(xlsx_path, {"Sheet1": [columns] + merged.values.tolist()})
+    write_table_cubes(xlsx_path, {"3.1": (["042024.pdf", "052024.pdf"], merged, cube)})
+
+    may_table = read_month_table(xlsx_path, "3.1", "052024.pdf")
+    expected = pd.DataFrame({"Nature of supplies": ["(a) Outward taxable supplies", "(b) Zero rated"],
+                             "Integrated tax": [100.0, 2.0], "Cess": [1.0, 0.0]})
+    pd.testing.assert_frame_equal(may_table, expected)
+    assert read_month_table(xlsx_path, "3.1", "062024.pdf") is None
+    assert read_month_table(xlsx_path, "4", "052024.pdf") is None
+    # The sheet sidecars are still used next to the cubes
+    assert read_merged_sheet(xlsx_path, "Sheet1")["Cess"].tolist() == [1.0, 10.5]
+    os.utime(xlsx_path, ns=(0, 0))
+    assert read_month_table(xlsx_path, "3.1", "052024.pdf") is None
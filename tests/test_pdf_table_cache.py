@@ -0,0 +1,69 @@
+import json
+import os
+
+import pdfplumber
+import pytest
+
+from utils import pdf_table_cache
+from utils.extractors.gstr3b_table_extractor import extract_fixed_tables_from_gstr3b
+from utils.pdf_table_cache import PdfTables
+
+_TABLE = [["Description", "Amount"], ["Taxable value", "100.00"]]
+
+
+def test_page_tables_leaves_the_pages_after_a_stop_unsearched(workdir, make_pdf):
+    pdf_path = make_pdf("form.pdf", [([f"Page {page}"], [_TABLE, _TABLE]) for page in range(3)])
+    with PdfTables(pdf_path) as pdf_tables:
+        pages = pdf_tables.page_tables()
+        assert next(pages) == [_TABLE, _TABLE]
+        assert len(pdf_tables._page_table_counts) == 1
+        assert pdf_tables.table(3) == _TABLE  # Random access indexes only as far as the table
+        assert len(pdf_tables._page_table_counts) == 2
+    with PdfTables(pdf_path) as pdf_tables:
+        assert [tables for tables in pdf_tables.page_tables()] == [[_TABLE, _TABLE]] * 3
+        assert pdf_tables.count == 6
+
+
+def test_gstr3b_pages_after_the_layout_tables_are_not_searched(workdir, make_pdf):
+    # Period April 2019-20: the layout before 2022, whose 9 tables all sit on the first two pages
+    pdf_path = make_pdf("gstr3b.pdf", [(["Financial Year 2019-20", "Period April"], [_TABLE] * 5),
+                                       ([], [_TABLE] * 4), ([], [_TABLE] * 2)])
+    table_map = extract_fixed_tables_from_gstr3b(pdf_path, words=False)
+    assert list(table_map) == ["1", "2", "3.1", "3.2", "4", "5", "5.1", "6.1", "7"]
+    [cache_file] = os.listdir(pdf_table_cache.PDF_TABLE_CACHE_PATH)
+    with open(os.path.join(pdf_table_cache.PDF_TABLE_CACHE_PATH, cache_file), encoding="utf-8") as f:
+        assert json.load(f)["page_table_counts"] == [5, 4]
+
+
+def test_word_coordinates_give_the_same_rows_as_pdfplumber(workdir, make_pdf):
+    rows = [["Nature of supplies", "Integrated tax", "Cess"], ["(a) Outward taxable supplies", "1,23,456.00", "-"],
+            ["(b) Zero rated", "", "0.00"]]
+    pdf_path = make_pdf("form.pdf", [(["Form GSTR-3B"], [rows, _TABLE])])
+    with PdfTables(pdf_path) as pdf_tables:
+        expected = list(pdf_tables.page_tables())
+    with PdfTables(pdf_path, words=True) as pdf_tables:
+        assert list(pdf_tables.page_tables()) == expected
+
+
+def test_pages_without_crossing_ruling_lines_are_not_searched(workdir, make_pdf, monkeypatch):
+    pdf_path = make_pdf("form.pdf", [(["Underlined heading"], []), ([], [_TABLE])])
+    # An underline only: horizontal edges, no vertical ones
+    canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+    underlined_path = os.path.join(str(workdir), "underlined.pdf")
+    pdf = canvas.Canvas(underlined_path, pagesize=(595, 842))
+    pdf.drawString(40, 800, "Underlined heading")
+    pdf.line(40, 798, 200, 798)
+    pdf.showPage()
+    pdf.save()
+    searched = []
+    find_tables = pdfplumber.page.Page.find_tables
+
+    def counted_find_tables(page, *args, **kwargs):
+        searched.append((os.path.basename(page.pdf.stream.name), page.page_number))
+        return find_tables(page, *args, **kwargs)
+    monkeypatch.setattr(pdfplumber.page.Page, "find_tables", counted_find_tables)
+    with PdfTables(underlined_path) as pdf_tables:
+        assert pdf_tables.count == 0
+    with PdfTables(pdf_path) as pdf_tables:
+        assert list(pdf_tables.page_tables()) == [[], [_TABLE]]
+    assert searched == [("form.pdf", 2)]
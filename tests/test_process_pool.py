@@ -0,0 +1,67 @@
+import asyncio
+import importlib
+import os
+import time
+
+import pytest
+
+from utils import process_pool
+from utils.globals import settings
+
+
+def _pid_after_a_while(item):
+    time.sleep(0.5)
+    return os.getpid()
+
+
+def _sleep(item):
+    time.sleep(60)
+
+
+def _fan_out_and_hang(item_count):
+    process_pool.map_in_subprocesses(_sleep, range(item_count), 4)
+
+
+def _fan_out(item_count):
+    # A stage function: parses its items on a pool of processes, like the GSTR-3B merger does with its PDFs
+    results = process_pool.map_in_subprocesses(_pid_after_a_while, range(item_count), 4)
+    return os.getpid(), [pid for pid, _ in results]
+
+
+def test_default_pool_sizes_use_every_cpu(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    for name in ("STAGE_WORKERS", "SUBPROCESS_WORKERS", "PDF_EXTRACT_WORKERS", "WORKBOOK_PARSE_WORKERS"):
+        monkeypatch.delenv(name, raising=False)
+    try:
+        defaults = importlib.reload(settings)
+        assert defaults.STAGE_WORKERS == 8
+        assert defaults.SUBPROCESS_WORKERS == 8 and defaults.PDF_EXTRACT_WORKERS == 8
+        assert defaults.WORKBOOK_PARSE_WORKERS == 8
+    finally:
+        monkeypatch.undo()
+        importlib.reload(settings)
+
+
+def test_a_stage_fans_out_over_the_shared_budget(monkeypatch):
+    monkeypatch.setattr(process_pool, "_free_subprocess_slots", 2)
+    try:
+        stage_pid, pids = asyncio.run(process_pool.run_in_process(_fan_out, 4))
+    finally:
+        process_pool.shutdown_process_pool()
+    assert len(set(pids)) == 2 and stage_pid not in pids
+    assert process_pool._free_subprocess_slots == 2  # Given back by the stage
+
+
+def test_without_free_slots_items_run_inline(monkeypatch):
+    monkeypatch.setattr(process_pool, "_free_subprocess_slots", 0)
+    assert _fan_out(3) == (os.getpid(), [os.getpid()] * 3)
+
+
+def test_slots_of_a_killed_stage_are_taken_back(monkeypatch):
+    monkeypatch.setattr(process_pool, "_free_subprocess_slots", 2)
+    try:
+        with pytest.raises(process_pool.StageTimeoutError):
+            asyncio.run(process_pool.run_in_process(_fan_out_and_hang, 2, timeout=5))
+    finally:
+        process_pool.shutdown_process_pool()
+    assert process_pool._free_subprocess_slots == 2
@@ -0,0 +1,55 @@
+import datetime
+
+import pytest
+from openpyxl import Workbook
+
+from utils.workbook_reader import open_rows_workbook, non_empty_rows
+
+pytest.importorskip("python_calamine")
+
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "B2B"
+    ws["C3"] = "GSTIN"
+    ws["D3"] = "Invoice date"
+    ws["C5"] = "27AAA"
+    ws["D5"] = datetime.datetime(2024, 4, 1)
+    ws["F5"] = 1500.0
+    ws["E6"] = 12.5
+    wb.create_sheet("Empty")
+    path = tmp_path / "book.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"min_row": 4},
+    {"min_row": 2, "max_row": 8},
+    {"min_row": 3, "max_col": 4},
+    {"min_col": 4, "max_col": 7},
+])
+def test_calamine_rows_match_openpyxl(workbook_path, kwargs):
+    rows = {}
+    for backend in ("calamine", "openpyxl"):
+        wb = open_rows_workbook(workbook_path, backend=backend)
+        try:
+            # Read-only openpyxl gives [] for an empty row
+            rows[backend] = {name: [tuple(row) for row in wb[name].iter_rows(values_only=True, **kwargs)]
+                             for name in wb.sheetnames}
+        finally:
+            wb.close()
+    assert rows["calamine"] == rows["openpyxl"]
+
+
+def test_non_empty_rows_from_calamine(workbook_path):
+    wb = open_rows_workbook(workbook_path, backend="calamine")
+    try:
+        assert non_empty_rows(wb["B2B"], min_row=4) == [
+            (None, None, "27AAA", datetime.datetime(2024, 4, 1), None, 1500), (None, None, None, None, 12.5)]
+        assert non_empty_rows(wb["Empty"], min_row=1) == []
+    finally:
+        wb.close()
@@ -0,0 +1,166 @@
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from utils.globals.settings import UPLOAD_BASE_PATH, JOB_WORKERS, JOB_HISTORY_LIMIT, BATCH_POLL_SECONDS
+from utils.job_queue import submit_report_job, get_job, ACTIVE_STATES
+from utils.process_pool import shutdown_process_pool
+from utils.progress import subscribe
+
+# A batch is a list of GSTINs submitted together during a scrutiny drive. Each GSTIN runs as an ordinary report
+# job on the job queue, so jobs are spread over JOB_WORKERS threads (and the shared stage process pool) and a
+# failing GSTIN never affects the others. The batch only keeps track of its jobs and summarises them. Which
+# batches a job belongs to is kept on the job itself (its batch_ids, set when it is submitted or attached to), and
+# its "job_finished" event carries them, so a job finishing before submit_batch has recorded it is not lost.
+_batches = OrderedDict()  # batch_id -> batch dict, oldest first
+_lock = threading.Lock()
+
+JOB_UNKNOWN = "unknown"  # The job left the job history before the batch saw it finish
+
+
+def discover_gstins():
+    """GSTINs with an upload folder in uploaded_files/."""
+    if not os.path.exists(UPLOAD_BASE_PATH):
+        return []
+    return sorted(name for name in os.listdir(UPLOAD_BASE_PATH)
+                  if not name.startswith(".") and os.path.isdir(os.path.join(UPLOAD_BASE_PATH, name)))
+
+
+def submit_batch(gstins, report_flag):
+    """Queues a report job per GSTIN (duplicates removed) and returns the batch summary."""
+    gstins = list(dict.fromkeys(gstin.strip() for gstin in gstins if gstin and gstin.strip()))
+    batch_id = uuid.uuid4().hex
+    batch = {
+        "batch_id": batch_id,
+        "include_asmt_10_report": report_flag,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "_created_time": time.time(),
+        "_finished_time": None,
+        "jobs": OrderedDict(),  # gstin -> last known job snapshot
+    }
+    with _lock:
+        _batches[batch_id] = batch
+    for gstin in gstins:
+        try:
+            job, _ = submit_report_job(gstin, report_flag, batch_id=batch_id)
+        except Exception as e:
+            print(f"[Batch] ❌ Could not queue GSTIN {gstin}: {e}")
+            job = {"job_id": None, "gstin": gstin, "state": "failed", "error": str(e), "elapsed_seconds": None,
+                   "reports": []}
+        with _lock:
+            # The job may already have finished and been recorded by _record_finished_job
+            batch["jobs"].setdefault(gstin, job)
+    print(f"[Batch] Queued batch {batch_id} with {len(gstins)} GSTIN(s) on {JOB_WORKERS} job worker(s).")
+    return get_batch(batch_id)
+
+
+def get_batch(batch_id):
+    with _lock:
+        batch = _batches.get(batch_id)
+        if batch is None:
+            return None
+        for gstin, job in batch["jobs"].items():
+            if job["job_id"] and job["state"] in ACTIVE_STATES:
+                # A job that left the job history (JOB_HISTORY_LIMIT) is no longer running
+                batch["jobs"][gstin] = get_job(job["job_id"]) or dict(
+                    job, state=JOB_UNKNOWN, error="Job left the job history before its result was recorded")
+        if batch["_finished_time"] is None and all(j["state"] not in ACTIVE_STATES for j in batch["jobs"].values()):
+            batch["_finished_time"] = time.time()
+        return _summary(batch)
+
+
+def _record_finished_job(event):
+    if event.get("type") != "job_finished" or not event.get("batch_ids"):
+        return
+    job = get_job(event["job_id"]) or {"job_id": event["job_id"], "gstin": event["gstin"], "state": event["state"],
+                                       "error": event.get("error"), "elapsed_seconds": None, "reports": []}
+    with _lock:
+        for batch_id in event["batch_ids"]:
+            batch = _batches.get(batch_id)
+            if batch is None:
+                continue
+            batch["jobs"][job["gstin"]] = job
+            if all(j["state"] not in ACTIVE_STATES for j in batch["jobs"].values()):
+                batch["_finished_time"] = time.time()
+        _trim_batches()
+
+
+subscribe(_record_finished_job)
+
+
+def _trim_batches():
+    # Called with _lock held. Keeps the finished batches within the job history limit.
+    finished = [batch_id for batch_id, batch in _batches.items() if batch["_finished_time"] is not None]
+    for batch_id in finished[:max(0, len(_batches) - JOB_HISTORY_LIMIT)]:
+        del _batches[batch_id]
+
+
+def _summary(batch):
+    jobs = list(batch["jobs"].values())
+    counts = Counter(job["state"] for job in jobs)
+    done = sum(1 for job in jobs if job["state"] not in ACTIVE_STATES)
+    elapsed = (batch["_finished_time"] or time.time()) - batch["_created_time"]
+    return {
+        "batch_id": batch["batch_id"],
+        "state": "running" if done < len(jobs) else "finished",
+        "include_asmt_10_report": batch["include_asmt_10_report"],
+        "created_at": batch["created_at"],
+        "total": len(jobs),
+        "counts": dict(counts),
+        "job_workers": JOB_WORKERS,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_gstins_per_hour": round(done * 3600 / elapsed, 2) if elapsed > 0 else None,
+        "gstins": [{
+            "gstin": job["gstin"],
+            "job_id": job["job_id"],
+            "state": job["state"],
+            "elapsed_seconds": job.get("elapsed_seconds"),
+            "error": job.get("error"),
+            "reports": list(job.get("reports") or []),
+        } for job in jobs],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate scrutiny reports for many GSTINs.")
+    parser.add_argument("gstins", nargs="*", help="GSTINs to process. Defaults to every GSTIN in uploaded_files/.")
+    parser.add_argument("--gstin-file", help="File with one GSTIN per line.")
+    parser.add_argument("--asmt-10", action="store_true", help="Also generate the ASMT-10 report.")
+    parser.add_argument("--summary", default="batch_summary.json", help="Where to write the batch summary.")
+    args = parser.parse_args(argv)
+
+    gstins = list(args.gstins)
+    if args.gstin_file:
+        with open(args.gstin_file, "r", encoding="utf-8") as f:
+            gstins += [line.strip() for line in f if line.strip()]
+    if not gstins:
+        gstins = discover_gstins()
+    if not gstins:
+        print(f"[Batch] No GSTINs given and none found in {UPLOAD_BASE_PATH}/.")
+        return 1
+
+    try:
+        summary = submit_batch(gstins, args.asmt_10)
+        while summary["state"] != "finished":
+            time.sleep(BATCH_POLL_SECONDS)
+            summary = get_batch(summary["batch_id"])
+            print(f"[Batch] {summary['counts']} after {summary['elapsed_seconds']}s")
+    finally:
+        # The stage workers are non-daemon processes waiting for work: without this the interpreter never exits
+        shutdown_process_pool()
+
+    with open(args.summary, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"[Batch] ✅ {summary['counts'].get('completed', 0)}/{summary['total']} GSTIN(s) completed in "
+          f"{summary['elapsed_seconds']}s ({summary['throughput_gstins_per_hour']} GSTINs/hour). "
+          f"Summary written to {args.summary}")
+    return 0 if summary["counts"].get("failed", 0) == 0 else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,6 +2,7 @@ import os
 from glob import glob
 import pandas as pd
 from utils.globals.constants import result_point_6
+from utils.workbook_reader import excel_file
 
 start_row_skip_nine_rows = 9  # Row 10 in Excel is index 9 in pandas
 start_row_skip_six_rows = 6  # Row 7 in Excel is index 6 in pandas
@@ -30,11 +31,11 @@ async def generate_bo_comparison_summary_analysis(gstin):
         # Load Excel and extract headers from first file only
         try:
             bo_file = bo_file_list[0]
-            all_sheets = pd.ExcelFile(bo_file)
+            all_sheets = excel_file(bo_file)
             # Read Tax Liability Summary sheet and draw analysis
             if sheet_tax_liability_summary in all_sheets.sheet_names:
-                df_raw_tax_liability_sheet = pd.read_excel(bo_file, sheet_name=sheet_tax_liability_summary, header=None,
-                                                           skiprows=start_row_skip_nine_rows)
+                df_raw_tax_liability_sheet = all_sheets.parse(sheet_name=sheet_tax_liability_summary, header=None,
+                                                              skiprows=start_row_skip_nine_rows)
                 df_raw_tax_liability_sheet = df_raw_tax_liability_sheet[
                     df_raw_tax_liability_sheet.iloc[:, 0].notna()]  # Drop empty rows
                 total_row_tax_liability_sheet = df_raw_tax_liability_sheet[
@@ -57,8 +58,8 @@ async def generate_bo_comparison_summary_analysis(gstin):
         # Read ITC(Other than IMPG) sheet and draw analysis
         try:
             if sheet_ITC_Other_than_IMPG in all_sheets.sheet_names:
-                df_raw_ITC_Other_IMPG_sheet = pd.read_excel(bo_file, sheet_name=sheet_ITC_Other_than_IMPG, header=None,
-                                                            skiprows=start_row_skip_six_rows)
+                df_raw_ITC_Other_IMPG_sheet = all_sheets.parse(sheet_name=sheet_ITC_Other_than_IMPG, header=None,
+                                                               skiprows=start_row_skip_six_rows)
                 df_raw_ITC_Other_IMPG_sheet = df_raw_ITC_Other_IMPG_sheet[
                     df_raw_ITC_Other_IMPG_sheet.iloc[:, 0].notna()]  # Drop empty rows
                 total_row_ITC_Other_IMPG_sheet = df_raw_ITC_Other_IMPG_sheet[
@@ -68,8 +69,8 @@ async def generate_bo_comparison_summary_analysis(gstin):
 
             # Read ITC(IMPG) sheet and draw analysis
             if sheet_ITC_IMPG in all_sheets.sheet_names:
-                df_raw_ITC_IMPG_sheet = pd.read_excel(bo_file, sheet_name=sheet_ITC_IMPG, header=None,
-                                                      skiprows=start_row_skip_six_rows)
+                df_raw_ITC_IMPG_sheet = all_sheets.parse(sheet_name=sheet_ITC_IMPG, header=None,
+                                                         skiprows=start_row_skip_six_rows)
                 df_raw_ITC_IMPG_sheet = df_raw_ITC_IMPG_sheet[
                     df_raw_ITC_IMPG_sheet.iloc[:, 0].notna()]  # Drop empty rows
                 total_row_ITC_IMPG_sheet = df_raw_ITC_IMPG_sheet[
@@ -105,8 +106,8 @@ async def generate_bo_comparison_summary_analysis(gstin):
         # Read Comparison Summary sheet and draw analysis
         try:
             if sheet_comparison_summary in all_sheets.sheet_names:
-                df_raw_CS_sheet = pd.read_excel(bo_file, sheet_name=sheet_comparison_summary, header=None,
-                                                skiprows=start_row_skip_nine_rows)
+                df_raw_CS_sheet = all_sheets.parse(sheet_name=sheet_comparison_summary, header=None,
+                                                   skiprows=start_row_skip_nine_rows)
                 df_raw_CS_sheet = df_raw_CS_sheet[df_raw_CS_sheet.iloc[:, 0].notna()]  # Drop empty rows
                 total_row = df_raw_CS_sheet[df_raw_CS_sheet.iloc[:, 0].astype(str).str.strip() == "Total"]
                 if not total_row.empty:
@@ -123,8 +124,8 @@ async def generate_bo_comparison_summary_analysis(gstin):
         # Read Reverse charge sheet and draw analysis
         try:
             if sheet_reverse_charge in all_sheets.sheet_names:
-                df_raw_RC_sheet = pd.read_excel(bo_file, sheet_name=sheet_reverse_charge, header=None,
-                                                skiprows=start_row_skip_six_rows)
+                df_raw_RC_sheet = all_sheets.parse(sheet_name=sheet_reverse_charge, header=None,
+                                                   skiprows=start_row_skip_six_rows)
                 total_row_RC = df_raw_RC_sheet[df_raw_RC_sheet.iloc[:, 0].astype(str).str.strip() == "Total"]
                 if not total_row_RC.empty:
                     # Column letters J, K, L, M correspond to indices 9, 10, 11, 12 (0-based)
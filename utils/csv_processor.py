@@ -1,11 +1,15 @@
 import pandas as pd
-import os
+
+from utils.globals.settings import PROCESS_CSV_CHUNK_ROWS
+from utils.master_csv_writer import MasterCsvWriter
 
 
 def process_csv_files(file_paths: list[str], return_type: str) -> str:
-    df_list = [pd.read_csv(path) for path in file_paths]
-    master_df = pd.concat(df_list).fillna(0)
+    # Files are read and written PROCESS_CSV_CHUNK_ROWS rows at a time, so memory stays at one chunk. Values are
+    # read as text so that a column's numbers are written the same way in every chunk.
     master_path = f"reports/{return_type}_master.csv"
-    os.makedirs("reports", exist_ok=True)
-    master_df.to_csv(master_path, index=False)
+    with MasterCsvWriter(master_path) as writer:
+        for path in file_paths:
+            for chunk in pd.read_csv(path, chunksize=PROCESS_CSV_CHUNK_ROWS, dtype=str):
+                writer.append(chunk)
     return master_path
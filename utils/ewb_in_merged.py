@@ -1,6 +1,8 @@
 import os
 import pandas as pd
 from glob import glob
+from utils.merged_sidecar import SheetGrid, write_sheet_sidecars
+from utils.progress import emit
 
 from utils.globals.constants import ewb_in_MIS_report
 
@@ -15,16 +17,18 @@ async def generate_ewb_in_merged(input_dir, output_dir):
 
     merged_df = pd.DataFrame()
     dataframes = []
-    for file_path in sorted(xls_files):
+    for file_index, file_path in enumerate(sorted(xls_files)):
         try:
             print(f"[EWB-IN_merged.py] Processing file: {file_path}")
             df = pd.read_html(file_path)[0]  # These are .html files disguised as .xls. We take 1st table.
             dataframes.append(df)
+            emit("file_parsed", file=os.path.basename(file_path), index=file_index + 1, total=len(xls_files))
         except Exception as e:
             print(f"[EWB-IN_merged.py] ❌ Failed to read file {file_path}: {str(e)}")
     if dataframes:
         merged_df = pd.concat(dataframes, ignore_index=True)
         dataframes.clear()
+        emit("rows_merged", sheet=ewb_in_MIS_report, rows=len(merged_df))
     # Write merged DataFrame to .xlsx
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, "EWB-In_merged.xlsx")
@@ -37,5 +41,8 @@ async def generate_ewb_in_merged(input_dir, output_dir):
         worksheet.set_column(0, 11, 20, wrap_format)  # From columns 0 to 12
 
     print(f"[EWB-IN_merged.py] Merged file saved: {output_path}")
+    grid = SheetGrid()
+    grid.put_frame(merged_df)
+    write_sheet_sidecars(output_path, {ewb_in_MIS_report: grid.rows()})
     print("[EWB-IN_merged.py] Completed execution of method merge_ewb_in_files.")
     return output_dir
@@ -1,6 +1,7 @@
 import os
 import pandas as pd
 from utils.globals.constants import ewb_out_MIS_report, result_point_6
+from utils.merged_sidecar import read_merged_sheet
 
 TAX_COL = [7, 8]  # Assess val. and Tax val.
 sheet_name = ["By_HSN_Code", "By_GSTIN", "By_Vehicle_No."]
@@ -19,7 +20,7 @@ async def generate_ewb_out_merged_analysis(gstin):
             print(f"[EWB-Out_merged analysis] Skipped: Input file not found at {input_path}")
             return final_result_points
 
-        df = pd.read_excel(input_path, sheet_name=ewb_out_MIS_report, header=0)
+        df = read_merged_sheet(input_path, ewb_out_MIS_report, header=0)
         # Convert relevant tax columns to numeric
         for col in TAX_COL:
             df.iloc[:, col] = pd.to_numeric(df.iloc[:, col], errors='coerce')
@@ -0,0 +1,328 @@
+import re
+from dataclasses import dataclass, field
+
+from utils.globals.constants import oldFormat, newFormat, format19_20, month_lookup
+from utils.globals.settings import PDF_REGION_EXTRACTION
+
+# Registry of the table layouts the GST portal has used for each PDF form. A layout says where each table the
+# readers need sits among the tables of the PDF. The layout of a PDF is picked from the financial year and
+# period printed on its first page, which only needs the first page's text. The number of tables in the PDF is
+# only checked when the first page leaves more than one layout possible (e.g. GSTR-9 before FY 2019-20 or after it).
+# A new portal format is supported by adding a FormLayout here, ahead of the layouts it supersedes.
+# A layout can also give the page region and column rules of its tables (TableRegion). Those tables are then read
+# from the cropped regions alone, without table detection on the whole PDF; if a region's table fails validation
+# the reader falls back to generic detection.
+FORM_LAYOUTS_VERSION = 1
+
+_number_pattern = re.compile(r"-?[\d,]*\.?\d+")
+_financial_year_pattern = re.compile(r"Year\s*:?\s*(\d{4}\s*-\s*\d{2})")
+_period_pattern = re.compile(r"Period\s*:?\s*([A-Za-z]+)")
+
+
+@dataclass(frozen=True)
+class FormLayout:
+    """
+    form: "GSTR-3B", "GSTR-9" or "GSTR-9C". name: the format constant passed on to the readers' downstream code.
+    first_period / last_period: (financial year, month) range in which the portal issued the form in this layout,
+    None when open-ended or not known. table_count: number of tables in the PDF with this layout, None for any.
+    tables: GSTR-3B: table number -> position among the PDF's tables; GSTR-9/9C: position -> header rows to skip.
+    merged_tables: GSTR-3B table number -> positions of the parts it is split into across a page break.
+    header_rows: GSTR-9/9C position -> row holding the column headers.
+    regions: key of tables / merged_tables -> TableRegions of the table's parts, in page order.
+    """
+    form: str
+    name: str
+    version: int
+    first_period: tuple = None
+    last_period: tuple = None
+    table_count: int = None
+    tables: dict = field(default_factory=dict)
+    merged_tables: dict = field(default_factory=dict)
+    header_rows: dict = field(default_factory=dict)
+    regions: dict = field(default_factory=dict)
+
+    @property
+    def label(self):
+        return f"{self.form} {self.name} v{self.version}"
+
+    def covers(self, period):
+        if period is None:
+            return self.first_period is None and self.last_period is None
+        return ((self.first_period is None or _period_key(self.first_period) <= period) and
+                (self.last_period is None or period <= _period_key(self.last_period, end=True)))
+
+
+@dataclass(frozen=True)
+class TableRegion:
+    """
+    Where (part of) a table sits on a fixed-layout form. page: 0-based page number. bbox: (x0, top, x1, bottom) in
+    PDF points as pdfplumber measures them. column_lines: x of every vertical rule of the table, both outer edges
+    included; rows are still found from the horizontal rules. header_row: the first row holds the column headers.
+    row_count: rows expected, header included, None to not check it. Cells from numeric_from_column on (after the
+    header) must read as numbers, else the extraction is rejected; None for tables of text such as GSTR-3B table 1.
+    """
+    page: int
+    bbox: tuple
+    column_lines: tuple
+    header_row: bool = True
+    row_count: int = None
+    numeric_from_column: int = 1
+
+
+def _period_key(period, end=False):
+    # (financial year, month) -> comparable (FY start year, month number within the FY starting April = 1);
+    # a missing month stands for the whole year: the annual returns' own period, or every month up to the year's end
+    # for the end of a layout's range
+    financial_year, month = period
+    fy_start = int(financial_year.split("-")[0])
+    if month is None:
+        return fy_start, 12 if end else 0
+    return fy_start, (month_lookup[month] - 4) % 12 + 1
+
+
+_gstr3b_tables_before_2022 = {"1": 0, "2": 1, "3.1": 2, "3.2": 3, "4": 4, "5": 5, "5.1": 6, "6.1": 7, "7": 8}
+_gstr3b_tables_later_than_2022 = {
+    "1": 0,
+    "2": 1,
+    "3.1": 2,
+    "3.1.1": 3,
+    "3.2": 4,
+    # "4" is the concatenation of the two tables 5 & 6 split across the 1st page end & 2nd page beginning
+    "5": 7,  # There seems to be some issue with 5 & 5.1. While creating GSTR-3B merged,
+    "5.1": 8,  # the table header is not populated properly. We are proceeding with this known
+    "6.1": 9,  # defect as of now since we don't use tables 5 & 5.1 . Later on, it needs a fix.
+    "7": 10
+}
+
+# GSTR-9: position -> header rows to skip (-1: none, 4: the first 5 rows) and position -> row holding the headers
+_gstr9_header_rows_skip_2019_20_format = {
+    0: -1,  # We are not dropping any row
+    1: 4,  # Table 4 Part I : here 4 means We are skipping first 5 header rows
+    2: -1,  # Table 4 Part II  : 0 means We are skipping first row only
+    3: 4,  # Table 5 Part I
+    4: -1,  # Table 5 Part II
+    # 5 : 4, Table 6 part I not required
+    6: -1,  # Table 6 part II
+    7: 3,  # Table 7 part I
+    8: 3,  # Part I of Table 8
+    # It starts differing from here in comparison to old format
+    9: -1,  # Part II of Table 8
+    10: 3,  # Table 9
+    12: -1  # Table 11, 12 ,13:  Although only Table 13 is required
+}
+_gstr9_header_rows_skip_old_format = {
+    0: -1,  # We are not dropping any row
+    1: 4,  # Table 4 Part I : here 4 means We are skipping first 5 header rows
+    2: -1,  # Table 4 Part II  : 0 means We are skipping first row only
+    3: 4,  # Table 5 Part I
+    4: -1,  # Table 5 Part II
+    # 5 : 4, Table 6 part I not required
+    6: -1,  # Table 6 part II
+    7: 3,  # Table 7
+    # 8: 0,  Part II of Table 7 not required
+    9: 3,  # Table 8
+    10: 3,  # Table 9
+    11: 2  # Table 10, 11, 12 ,13
+}
+_gstr9_header_rows_skip_new_format = {
+    0: -1,
+    1: 4,  # Table 4
+    2: -1,  # Table 4
+    3: 4,  # Table 5 Part I
+    4: -1,  # Table 5 Part II
+    # 5 : 3, Table 6 Part I not required
+    # 6: 0,  Table 6 Part II not required
+    7: -1,  # Table 6 Part III
+    8: 3,  # Table 7
+    # 9 : 0,  Part of Table 7 not required
+    10: 3,  # Table 8
+    11: 3,  # Table 9
+    12: 2  # Table 10, 11, 12 ,13
+}
+_gstr9_header_row_map_2019_20_format = {
+    # 0:
+    1: 2,
+    3: 2,
+    7: 1,
+    8: 1,
+    10: 2,
+    11: 1
+}
+_gstr9_header_row_map_old_format = {
+    # 0:
+    1: 2,
+    3: 2,
+    7: 1,
+    9: 1,
+    10: 2,
+    11: 1
+}
+_gstr9_header_row_map_new_format = {
+    # 0:
+    1: 2,
+    3: 2,
+    8: 1,
+    10: 1,
+    11: 2,
+    12: 1
+}
+
+
+# GSTR-9C: same as GSTR-9
+_gstr9c_header_rows_skip_old_format = {
+    0: -1,  # We are not dropping any row
+    2: -1,  # Table 5 Part II
+    8: -1,  # Table 9 Part II
+    10: 2,  # Table 11 Part I
+    11: -1,  # Table 11 Part II
+    12: 1,  # Table 12
+    18: 0,  # Table 16
+}
+_gstr9c_header_rows_skip_new_format = {
+    0: -1,
+    2: -1,  # Table 5 Part II
+    8: -1,  # Table 9 Part II
+    10: 2,  # Table 11 Part I
+    11: -1,  # Table 11 Part II
+    12: 1,  # Table 12
+    17: 0,  # Table 16
+}
+_gstr9c_header_row_map_old_format = {
+    0: 0,
+    10: 2,
+    12: 2,
+    18: 1
+}
+_gstr9c_header_row_map_new_format = {
+    0: 0,
+    1: 2,
+    12: 2,
+    17: 1
+}
+
+FORM_LAYOUTS = {
+    "GSTR-3B": [
+        FormLayout("GSTR-3B", oldFormat, 1, last_period=("2021-22", "March"), table_count=9,
+                   tables=_gstr3b_tables_before_2022),
+        FormLayout("GSTR-3B", newFormat, 3, first_period=("2024-25", "September"), table_count=10,
+                   tables=_gstr3b_tables_later_than_2022, merged_tables={"4": (5, 6)}),
+        FormLayout("GSTR-3B", newFormat, 2, first_period=("2022-23", "April"), last_period=("2024-25", "August"),
+                   tables=_gstr3b_tables_later_than_2022, merged_tables={"4": (5, 6)}),
+    ],
+    "GSTR-9": [
+        FormLayout("GSTR-9", format19_20, 1, first_period=("2019-20", None), last_period=("2019-20", None),
+                   table_count=18, tables=_gstr9_header_rows_skip_2019_20_format,
+                   header_rows=_gstr9_header_row_map_2019_20_format),
+        FormLayout("GSTR-9", oldFormat, 1, table_count=18, tables=_gstr9_header_rows_skip_old_format,
+                   header_rows=_gstr9_header_row_map_old_format),
+        FormLayout("GSTR-9", newFormat, 1, tables=_gstr9_header_rows_skip_new_format,
+                   header_rows=_gstr9_header_row_map_new_format),
+    ],
+    "GSTR-9C": [
+        # GSTR-9C is self-certified from FY 2020-21 on (Notification 30/2021-CT), without the auditor's part
+        FormLayout("GSTR-9C", oldFormat, 1, last_period=("2019-20", None), table_count=21,
+                   tables=_gstr9c_header_rows_skip_old_format, header_rows=_gstr9c_header_row_map_old_format),
+        FormLayout("GSTR-9C", newFormat, 1, first_period=("2020-21", None),
+                   tables=_gstr9c_header_rows_skip_new_format, header_rows=_gstr9c_header_row_map_new_format),
+    ],
+}
+
+
+def first_page_period(text):
+    """(financial year, month or None) printed on a form's first page, or None when not found."""
+    year_match = _financial_year_pattern.search(text or "")
+    if not year_match:
+        return None
+    financial_year = re.sub(r"\s", "", year_match.group(1))
+    period_match = _period_pattern.search(text)
+    month = period_match.group(1) if period_match and period_match.group(1) in month_lookup else None
+    return financial_year, month
+
+
+def first_table_period(rows):
+    """Same as first_page_period, from the form's first table (rows "Year"/"Financial Year" and "Period")."""
+    cells = [str(row[1]).strip() for row in (rows or [])[:2] if row and len(row) > 1 and row[1]]
+    if not cells or not re.fullmatch(r"\d{4}-\d{2}", cells[0]):
+        return None
+    month = cells[1] if len(cells) > 1 and cells[1] in month_lookup else None
+    return cells[0], month
+
+
+def period_layout(form, pdf_tables):
+    """The layout of a PdfTables when the financial year and period on its first page leave a single one, else None."""
+    period, candidates = _period_candidates(form, pdf_tables)
+    if len(candidates) != 1:
+        return None
+    print(f"[Form layouts] {pdf_tables.file_name}: {candidates[0].label} from first page period {period}")
+    return candidates[0]
+
+
+def detect_layout(form, pdf_tables, table_count=None):
+    """
+    Picks the layout of a PdfTables among FORM_LAYOUTS[form]: from the first page's financial year and period when
+    they leave a single layout, otherwise by the number of tables in the PDF (layouts are tried in registry order).
+    The tables are not all counted: a layout's table count is checked by looking for its last table and the one
+    after it. table_count overrides the number of tables for readers that do not index the PDF's tables themselves.
+    """
+    layout = period_layout(form, pdf_tables)
+    if layout is not None:
+        return layout
+    period, candidates = _period_candidates(form, pdf_tables)
+    for layout in candidates or FORM_LAYOUTS[form]:
+        if layout.table_count is None or _has_table_count(pdf_tables, layout.table_count, table_count):
+            print(f"[Form layouts] {pdf_tables.file_name}: {layout.label} from its table count")
+            return layout
+    raise ValueError(f"No {form} layout matches {pdf_tables.file_name} (period {period})")
+
+
+def _has_table_count(pdf_tables, expected, table_count):
+    # Whether the PDF has exactly expected tables: only the pages up to table expected + 1 are searched
+    if table_count is not None:
+        return table_count == expected
+    return pdf_tables.get(expected - 1) is not None and pdf_tables.get(expected) is None
+
+
+def _period_candidates(form, pdf_tables):
+    period = first_page_period(pdf_tables.first_page_text()) or first_table_period(pdf_tables.get(0))
+    period_key = _period_key(period) if period else None
+    return period, [layout for layout in FORM_LAYOUTS[form] if layout.covers(period_key)]
+
+
+def region_tables(pdf_tables, layout, keys):
+    """
+    {key: rows} of the given tables of a layout, read from their TableRegions alone. None when region extraction is
+    off (PDF_REGION_EXTRACTION), a table has no region, or a table fails validation: the caller then falls back to
+    generic table detection. The parts of a split table are joined, without the header row of the later parts.
+    """
+    if not PDF_REGION_EXTRACTION or not layout.regions:
+        return None
+    tables = {}
+    for key in keys:
+        regions = layout.regions.get(key)
+        if not regions:
+            return None
+        rows = []
+        for part, region in enumerate(regions):
+            part_rows = pdf_tables.region_table(region.page, region.bbox, region.column_lines)
+            if not _region_rows_valid(part_rows, region):
+                print(f"[Form layouts] {pdf_tables.file_name}: table {key} of {layout.label} failed validation in "
+                      f"its region, using generic table detection")
+                return None
+            rows += part_rows[1:] if part > 0 and region.header_row else part_rows
+        tables[key] = rows
+    return tables
+
+
+def _region_rows_valid(rows, region):
+    if not rows or (region.row_count is not None and len(rows) != region.row_count):
+        return False
+    if any(len(row) != len(region.column_lines) - 1 for row in rows):
+        return False
+    if region.numeric_from_column is None:
+        return True
+    for row in rows[1:] if region.header_row else rows:
+        for cell in row[region.numeric_from_column:]:
+            text = re.sub(r"\s", "", cell or "")
+            if text not in ("", "-") and not _number_pattern.fullmatch(text):
+                return False
+    return True
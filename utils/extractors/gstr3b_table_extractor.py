@@ -1,44 +1,29 @@
-import pdfplumber
 import pandas as pd
 from tabulate import tabulate
 
-from utils.globals.constants import int_nine, int_zero, int_one, int_ten
-
-index_map_format_before_2022 = {
-    "1": 0,
-    "2": 1,
-    "3.1": 2,
-    "3.2": 3,
-    "4": 4,
-    "5": 5,
-    "5.1": 6,
-    "6.1": 7,
-    "7": 8
-}
-index_map_format_later_than_2022 = {
-    "1": 0,
-    "2": 1,
-    "3.1": 2,
-    "3.1.1": 3,
-    "3.2": 4,
-    "4": 6,  # Table 4 Is added manually later on since its concatenation of two tables 5 & 6
-    "5": 7,  # There seems to be some issue with 5 & 5.1. While creating GSTR-3B merged,
-    "5.1": 8,  # the table header is not populated properly. We are proceeding with this known
-    "6.1": 9,  # defect as of now since we don't use tables 5 & 5.1 . Later on, it needs a fix.
-    "7": 10
-}
+from utils.extractors.form_layouts import detect_layout, period_layout, region_tables
+from utils.globals.constants import int_zero, int_one
+from utils.globals.settings import GSTR3B_WORD_EXTRACTION
+from utils.pdf_table_cache import PdfTables
 
 
 # This function receives one PDF file at a time and extracts all tables in it.
-def extract_fixed_tables_from_gstr3b(pdf_path):
+def extract_fixed_tables_from_gstr3b(pdf_path, words=GSTR3B_WORD_EXTRACTION):
     print(f"Starting execution of function extract_fixed_tables_from_gstr3b for: {pdf_path}")
     all_tables = []
-    table_map = {}
     """Extract tables using fixed position assumptions (e.g., 4th table = 3.1)."""
     print(f"")
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables()
+    with PdfTables(pdf_path, words=bool(words)) as pdf_tables:
+        # A layout known from the first page whose tables have regions is read from those regions alone
+        layout = period_layout("GSTR-3B", pdf_tables)
+        region_rows = region_tables(pdf_tables, layout, list(layout.tables) + list(layout.merged_tables)) \
+            if layout else None
+        if region_rows is not None:
+            print(f"GSTR-3B file {pdf_path} uploaded is {layout.label}, read from its table regions.")
+            return extract_region_tables(region_rows, layout)
+        # With the layout known, the pages after the last table it needs are never searched for tables
+        needed = layout_table_count(layout) if layout else None
+        for tables in pdf_tables.page_tables():
             for i, table in enumerate(tables):
                 if table and len(table) > 1 and len(table[0]) > 1:
                     df = pd.DataFrame(table)
@@ -48,48 +33,54 @@ def extract_fixed_tables_from_gstr3b(pdf_path):
                     all_tables.append(df)
                     # print(f"{df}")
                     # print("*****************")
+            if needed is not None and len(all_tables) >= needed:
+                break
+        layout = layout or detect_layout("GSTR-3B", pdf_tables, table_count=len(all_tables))
 
-    if len(all_tables) == int_nine:  # New format has 11 tables
-        print(
-            f"GSTR-3B file {pdf_path} uploaded is old format (earlier than or 2021-22) since it has {len(all_tables)} tables.")
-        return extract_old_format_tables(all_tables, table_map)
-    elif len(all_tables) == int_ten:  # New format has 10 tables (Sep 2024 onwards)
-        print(
-            f"GSTR-3B file {pdf_path} uploaded is new format (Sep 2024 onwards) since it has {len(all_tables)} tables.")
-        return extract_new_format_tables(all_tables, table_map)
-    else:
-        print(
-            f"GSTR-3B file {pdf_path} uploaded is new format (later than FY 2021-22) since it has {len(all_tables)} tables.")
-        return extract_new_format_tables(all_tables, table_map)
+    print(f"GSTR-3B file {pdf_path} uploaded is {layout.label} with {len(all_tables)} tables.")
+    return extract_layout_tables(all_tables, layout)
 
 
-def extract_old_format_tables(all_tables, table_map):
-    for key, idx in index_map_format_before_2022.items():
+def extract_layout_tables(all_tables, layout):
+    table_map = {}
+    for key, idx in layout.tables.items():
         if idx < len(all_tables):
             table_map[key] = all_tables[idx]
-    return table_map
+    for key, positions in layout.merged_tables.items():
+        if max(positions) < len(all_tables):
+            table_map[key] = merge_split_table([all_tables[idx] for idx in positions])
+    # Keep the table order of the PDF, which the merged workbook is written in
+    return {key: table_map[key] for key in sorted(table_map, key=_table_number_key)}
 
 
-def extract_new_format_tables(all_tables, table_map):
-    for key, idx in index_map_format_later_than_2022.items():
-        if idx < len(all_tables):
-            if key == "4":
-                processtable4(all_tables, table_map)
-            else:
-                table_map[key] = all_tables[idx]
-    return table_map
+def layout_table_count(layout):
+    """Number of leading tables of the PDF that hold every table the layout reads."""
+    positions = list(layout.tables.values()) + [idx for parts in layout.merged_tables.values() for idx in parts]
+    return max(positions) + 1
+
+
+def extract_region_tables(region_rows, layout):
+    table_map = {}
+    for key, rows in region_rows.items():
+        df = pd.DataFrame(rows)
+        if layout.regions[key][0].header_row:
+            df.columns = df.iloc[0]
+            df = df[1:].reset_index(drop=True)
+        table_map[key] = df
+    return {key: table_map[key] for key in sorted(table_map, key=_table_number_key)}
+
 
+def _table_number_key(key):
+    return tuple(int(part) for part in key.split("."))
 
-def processtable4(all_tables, table_map):
-    # manually add PDF table 4 to table_map since its the concatenation of two split
-    # tables 5 & 6 present on 1st page end & 2nd page beginning of any GSTR_3B pdf
-    # print(tabulate(all_tables[5], tablefmt='grid', maxcolwidths=20))
-    # print("===================================")
-    # print(tabulate(all_tables[6], tablefmt='grid', maxcolwidths=20))
 
-    df5 = all_tables[5].copy()
-    df6 = all_tables[6].copy()
-    df6.columns = df5.columns
-    df_merged = pd.concat([df5, df6], ignore_index=True)
-    # print(tabulate(df_merged, tablefmt='grid', maxcolwidths=20))
-    table_map["4"] = df_merged
+def merge_split_table(parts):
+    # A table split across a page break (e.g. table 4 at the 1st page end & 2nd page beginning of any GSTR-3B pdf)
+    # comes out as separate tables; the later parts take the columns of the first.
+    first = parts[0].copy()
+    rest = []
+    for part in parts[1:]:
+        part = part.copy()
+        part.columns = first.columns
+        rest.append(part)
+    return pd.concat([first] + rest, ignore_index=True)
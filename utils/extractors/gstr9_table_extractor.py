@@ -1,6 +1,8 @@
+import os
 import pdfplumber
 import pandas as pd
 from tabulate import tabulate
+from utils.pdf_pages import iter_pages
 table_header_rows_skip = {
     0: -1,
     1 : 4, # Table 4
@@ -22,7 +24,7 @@ def extract_fixed_tables_from_gstr9(pdf_path):
     all_tables = []
 
     with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
+        for page in iter_pages(pdf, os.path.basename(pdf_path)):
             tables = page.extract_tables()
             for table in tables:
                 all_tables.append(table)
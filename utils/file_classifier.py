@@ -0,0 +1,76 @@
+import os
+import re
+import zipfile
+
+import pdfplumber
+
+from utils.workbook_reader import workbook_sheet_parts
+
+# Works out the return type folder of an uploaded file from its content, for zip uploads where the user does not
+# pick a return type per file. Only the cheap parts of a file are read: the sheet list of a workbook (workbook.xml,
+# no cell data), the first bytes of an EWB export and the first page of a PDF.
+
+SNIFF_BYTES = 64 * 1024
+
+_pdf_form_pattern = re.compile(r"GSTR\s*-?\s*(9C|9|3B)\b", re.IGNORECASE)
+_pdf_return_types = {"9C": "GSTR-9C", "9": "GSTR-9", "3B": "GSTR-3B"}
+
+# Sheet names only found in one kind of workbook, checked in this order
+_bo_comparison_sheets = {"tax liability summary", "comparison summary"}
+_gstr2b_sheets = {"itc available", "itc not available", "b2b-cdnr", "b2b-cdnra"}
+_gstr1_sheets = {"hsn", "docs", "b2b, sez, de", "exemp"}
+_gstr2a_sheets = {"b2b", "b2ba", "cdnr", "cdnra", "isd", "isda", "tds", "tdsa", "tcs", "impg", "impg sez", "impgsez"}
+
+
+def classify_file(file_path, file_name=None):
+    """Returns the return type folder for the file (e.g. "GSTR-3B"), or None when it is not recognised."""
+    extension = os.path.splitext(file_name or file_path)[1].lower()
+    try:
+        match extension:
+            case ".pdf":
+                return _classify_pdf(file_path)
+            case ".xlsx":
+                return _classify_workbook(file_path)
+            case ".xls":
+                return _classify_ewb(file_path)
+            case _:
+                return None
+    except Exception as e:
+        print(f"[File classifier] ❌ Could not classify {file_name or file_path}: {e}")
+        return None
+
+
+def _classify_pdf(file_path):
+    with pdfplumber.open(file_path) as pdf:
+        if not pdf.pages:
+            return None
+        text = pdf.pages[0].extract_text() or ""
+    match = _pdf_form_pattern.search(text)
+    return _pdf_return_types[match.group(1).upper()] if match else None
+
+
+def _classify_workbook(file_path):
+    # Sheet names straight from xl/workbook.xml: even read-only openpyxl parses the shared strings and styles
+    with zipfile.ZipFile(file_path) as archive:
+        sheets = {name.strip().lower() for name in workbook_sheet_parts(archive)}
+    if sheets & _bo_comparison_sheets:
+        return "BO comparison summary"
+    if sheets & _gstr2b_sheets:
+        return "GSTR-2B"
+    if sheets & _gstr1_sheets:
+        return "GSTR-1"
+    if sheets & _gstr2a_sheets:
+        return "GSTR-2A"
+    return None
+
+
+def _classify_ewb(file_path):
+    # EWB MIS reports are HTML tables saved as .xls; the counterparty column tells inward from outward
+    with open(file_path, "rb") as f:
+        head = f.read(SNIFF_BYTES).decode("utf-8", errors="ignore")
+    has_from, has_to = "From GSTIN" in head, "To GSTIN" in head
+    if has_from and not has_to:
+        return "EWB-IN"
+    if has_to and not has_from:
+        return "EWB-OUT"
+    return None
@@ -1,19 +1,334 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import asyncio
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import threading
+import zipfile
+
+from utils.globals.settings import UPLOAD_BASE_PATH, UPLOAD_CHUNK_SIZE, MAX_UPLOAD_FILE_BYTES, UPLOAD_TEMP_SUFFIX, \
+    BLOB_STORE_PATH, UPLOAD_INDEX_FILE, MAX_UPLOAD_REQUEST_BYTES
+from utils.file_classifier import classify_file
 
 app = FastAPI()
 
-UPLOAD_DIR = "uploaded_files"
+UPLOAD_DIR = UPLOAD_BASE_PATH
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Guards the per-folder index files and blob reference changes
+_store_lock = threading.Lock()
+
 
 @app.post("/upload/")
-async def save_uploaded_file(file: UploadFile, gstn: str, return_type: str) -> str:
-    folder = os.path.join("uploaded_files", gstn, return_type)
-    os.makedirs(folder, exist_ok=True)
-    file_path = os.path.join(folder, file.filename)
-    
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+async def save_uploaded_file(file: UploadFile, gstn: str, return_type: str,
+                             max_bytes: int = MAX_UPLOAD_FILE_BYTES) -> tuple[str, str, int]:
+    """
+    Streams the upload into the content-addressed blob store in UPLOAD_CHUNK_SIZE pieces, hashing it on the fly,
+    then links it as uploaded_files/<gstn>/<return_type>/<filename>. Bytes already present in the store are not
+    written again; the name is simply linked to the existing blob. The temp file is committed only once the whole
+    upload is written, so a half-finished upload is never picked up by the mergers.
+    Returns (file_path, sha256 hex digest, size in bytes).
+    """
+    temp_path, sha256, size = await _stream_to_temp(file, max_bytes)
+    file_path = _store_temp_file(temp_path, sha256, size, gstn, return_type, os.path.basename(file.filename))
+    return file_path, sha256, size
+
+
+async def save_uploaded_files(files: list[UploadFile], gstn: str, return_type: str,
+                              max_file_bytes: int = MAX_UPLOAD_FILE_BYTES,
+                              max_request_bytes: int = MAX_UPLOAD_REQUEST_BYTES) -> list[tuple[str, str, int]]:
+    """
+    save_uploaded_file for all files of one request, all or nothing: every file is streamed to a temp file first
+    and only committed once all of them are within max_file_bytes each and max_request_bytes together. When a
+    limit is exceeded nothing is stored and the 413 names the limit that was hit.
+    Returns [(file_path, sha256 hex digest, size in bytes)] in the order of files.
+    """
+    staged = []
+    remaining_bytes = max_request_bytes  # Budget shared by all files of this request
+    try:
+        for file in files:
+            temp_path, sha256, size = await _stream_to_temp(file, max_file_bytes,
+                                                            request_limit=(remaining_bytes, max_request_bytes))
+            staged.append((temp_path, sha256, size, os.path.basename(file.filename)))
+            remaining_bytes -= size
+    except BaseException:
+        _discard_temp_files(temp_path for temp_path, _, _, _ in staged)
+        raise
+    return [(_store_temp_file(temp_path, sha256, size, gstn, return_type, file_name), sha256, size)
+            for temp_path, sha256, size, file_name in staged]
+
 
+async def save_uploaded_zip(file: UploadFile, gstn: str) -> tuple[list, list]:
+    """
+    Stores every member of a zip upload under uploaded_files/<gstn>/<return type>, the return type being sniffed
+    from the member's content (see file_classifier). Each member is decompressed once, straight into the blob
+    store's temp area, with the sizes enforced on the decompressed bytes. Returns (saved, skipped):
+    saved = [{"file_path", "return_type", "sha256", "size"}], skipped = [{"name", "reason"}].
+    """
+    # The zip itself is spooled to disk first: zipfile needs a seekable file to read the central directory
+    zip_path, _, _ = await _stream_to_temp(file, MAX_UPLOAD_REQUEST_BYTES,
+                                           request_limit=(MAX_UPLOAD_REQUEST_BYTES, MAX_UPLOAD_REQUEST_BYTES))
+    try:
+        return await asyncio.to_thread(_extract_zip_members, zip_path, gstn, MAX_UPLOAD_FILE_BYTES,
+                                       MAX_UPLOAD_REQUEST_BYTES)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail=f"{file.filename} is not a valid zip file.")
+    finally:
+        os.remove(zip_path)
+
+
+def _extract_zip_members(zip_path, gstn, max_member_bytes, max_total_bytes):
+    # Like save_uploaded_files, all or nothing: members are committed only once the whole zip is within the limits
+    staged, skipped = [], []
+    staged_members = {}  # (return type, file name) -> zip member stored under that name
+    remaining_bytes = max_total_bytes
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            for member in archive.infolist():
+                file_name = os.path.basename(member.filename)
+                if member.is_dir() or not file_name or file_name.startswith(".") or "__MACOSX" in member.filename:
+                    continue
+                with archive.open(member) as member_file:
+                    temp_path, sha256, size = _copy_to_temp(member_file, max_member_bytes, member.filename,
+                                                            request_limit=(remaining_bytes, max_total_bytes))
+                remaining_bytes -= size
+                return_type = classify_file(temp_path, file_name)
+                if return_type is None:
+                    os.remove(temp_path)
+                    print(f"[File handler] Could not classify zip member {member.filename}, skipping.")
+                    skipped.append({"name": member.filename, "reason": "Unrecognised file type or content"})
+                    continue
+                # Members are stored by base name, so two of them in different zip folders would overwrite each other
+                first_member = staged_members.setdefault((return_type, file_name), member.filename)
+                if first_member != member.filename:
+                    os.remove(temp_path)
+                    print(f"[File handler] Zip member {member.filename} has the same name as {first_member}, skipping.")
+                    skipped.append({"name": member.filename,
+                                    "reason": f"Same {return_type} file name as {first_member}"})
+                    continue
+                staged.append((temp_path, sha256, size, return_type, file_name))
+    except BaseException:
+        _discard_temp_files(temp_path for temp_path, _, _, _, _ in staged)
+        raise
+    saved = []
+    for temp_path, sha256, size, return_type, file_name in staged:
+        file_path = _store_temp_file(temp_path, sha256, size, gstn, return_type, file_name)
+        saved.append({"file_path": file_path, "return_type": return_type, "sha256": sha256, "size": size})
+    return saved, skipped
+
+
+def _store_temp_file(temp_path, sha256, size, gstn, return_type, file_name):
+    # Commits a fully written temp file to the blob store and links it under its name. Returns the named path.
+    folder = os.path.join(UPLOAD_BASE_PATH, gstn, return_type)
+    os.makedirs(folder, exist_ok=True)
+    file_path = os.path.join(folder, file_name)
+    # Committed and linked in one critical section: a delete of the last name linking the same bytes must not drop
+    # the blob between the two
+    with _store_lock:
+        blob_path = _commit_blob(temp_path, sha256)
+        _link_blob(blob_path, file_path)
+        index = read_upload_index(folder)
+        previous = index.get(file_name)
+        index[file_name] = {"sha256": sha256, "size": size}
+        _write_upload_index(folder, index)
+        if previous and previous.get("sha256") != sha256:
+            _remove_blob_if_unreferenced(previous["sha256"])  # The name was re-uploaded with new content
     return file_path
+
+
+async def _stream_to_temp(file: UploadFile, max_bytes, request_limit=None):
+    # request_limit: (bytes left in the request's budget, the request limit) for a file sharing a request budget
+    tmp_dir = os.path.join(BLOB_STORE_PATH, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(prefix=".", suffix=UPLOAD_TEMP_SUFFIX, dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                _check_upload_limits(file.filename, size, max_bytes, request_limit)
+                sha256.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        await file.close()
+    return temp_path, sha256.hexdigest(), size
+
+
+def _copy_to_temp(file_obj, max_bytes, name, request_limit=None):
+    # Blocking counterpart of _stream_to_temp for plain file objects (zip members)
+    tmp_dir = os.path.join(BLOB_STORE_PATH, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(prefix=".", suffix=UPLOAD_TEMP_SUFFIX, dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: file_obj.read(UPLOAD_CHUNK_SIZE), b""):
+                size += len(chunk)
+                _check_upload_limits(name, size, max_bytes, request_limit)
+                sha256.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return temp_path, sha256.hexdigest(), size
+
+
+def _check_upload_limits(name, size, max_bytes, request_limit):
+    if request_limit is not None and size > request_limit[0]:
+        raise HTTPException(status_code=413,
+                            detail=f"Upload exceeds the per-request limit of {request_limit[1]} bytes (at file {name}).")
+    if size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File {name} exceeds the per-file upload limit of {max_bytes} bytes.")
+
+
+def _discard_temp_files(temp_paths):
+    for temp_path in temp_paths:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def blob_path_for(sha256):
+    return os.path.join(BLOB_STORE_PATH, sha256[:2], sha256)
+
+
+def _commit_blob(temp_path, sha256):
+    blob_path = blob_path_for(sha256)
+    if os.path.exists(blob_path):
+        print(f"[File handler] Blob {sha256[:12]} already stored, skipping write.")
+        os.remove(temp_path)
+        return blob_path
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    os.replace(temp_path, blob_path)  # Atomic commit
+    return blob_path
+
+
+def _link_blob(blob_path, file_path):
+    # Hard link so the mergers keep reading plain files; fall back to a copy where links are not supported.
+    temp_link = f"{file_path}{UPLOAD_TEMP_SUFFIX}"
+    if os.path.exists(temp_link):
+        os.remove(temp_link)
+    try:
+        os.link(blob_path, temp_link)
+    except OSError:
+        shutil.copyfile(blob_path, temp_link)
+    os.replace(temp_link, file_path)
+
+
+def read_upload_index(folder):
+    index_path = os.path.join(folder, UPLOAD_INDEX_FILE)
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[File handler] ❌ Could not read upload index {index_path}: {e}")
+        return {}
+
+
+def _write_upload_index(folder, index):
+    index_path = os.path.join(folder, UPLOAD_INDEX_FILE)
+    temp_path = f"{index_path}{UPLOAD_TEMP_SUFFIX}"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(temp_path, index_path)
+
+
+def list_uploaded_files_with_hash(gstn, return_type):
+    """Returns [{"name", "sha256", "size"}] for every committed file in uploaded_files/<gstn>/<return_type>."""
+    folder = os.path.join(UPLOAD_BASE_PATH, gstn, return_type)
+    if not os.path.exists(folder):
+        return []
+    index = read_upload_index(folder)
+    files = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name.startswith(".") or not os.path.isfile(path):
+            continue
+        entry = index.get(name)
+        if not _index_entry_current(path, entry):
+            entry = {"sha256": _hash_file(path), "size": os.path.getsize(path)}
+        files.append({"name": name, "sha256": entry["sha256"], "size": entry["size"]})
+    return files
+
+
+def get_file_hash(file_path):
+    """
+    SHA-256 of an uploaded file. Uses the folder index written at upload time while the file is still the blob it
+    names, and hashes the file when it was placed or replaced by other means. Downstream stages key their caches on
+    this value.
+    """
+    index = read_upload_index(os.path.dirname(file_path))
+    entry = index.get(os.path.basename(file_path))
+    if _index_entry_current(file_path, entry):
+        return entry["sha256"]
+    return _hash_file(file_path)
+
+
+def _index_entry_current(file_path, entry):
+    # A name still links to the blob of its entry unless the file was overwritten or replaced out of band (or the
+    # link fell back to a copy, which is then hashed like any other file)
+    if not entry or "sha256" not in entry:
+        return False
+    try:
+        return os.path.samefile(file_path, blob_path_for(entry["sha256"]))
+    except OSError:
+        return False
+
+
+def _hash_file(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def delete_uploaded_file(gstn, return_type, filename):
+    """Removes the name link and its index entry; the blob is dropped once no name links to it anymore."""
+    folder = os.path.join(UPLOAD_BASE_PATH, gstn, return_type)
+    file_path = os.path.join(folder, os.path.basename(filename))
+    with _store_lock:
+        if not os.path.exists(file_path):
+            return False
+        index = read_upload_index(folder)
+        entry = index.pop(os.path.basename(filename), None)
+        os.remove(file_path)
+        _write_upload_index(folder, index)
+        if entry:
+            _remove_blob_if_unreferenced(entry["sha256"])
+    return True
+
+
+def _remove_blob_if_unreferenced(sha256):
+    # Called with _store_lock held, once a name no longer links to the blob
+    blob_path = blob_path_for(sha256)
+    # A blob with a single link is referenced only by the store itself
+    if os.path.exists(blob_path) and os.stat(blob_path).st_nlink == 1 and _blob_unreferenced(sha256):
+        os.remove(blob_path)
+        print(f"[File handler] Removed unreferenced blob {sha256[:12]}.")
+
+
+def _blob_unreferenced(sha256):
+    # Copies made where hard links are unsupported don't raise st_nlink, so confirm through the indexes too
+    for gstn in os.listdir(UPLOAD_BASE_PATH):
+        gstn_dir = os.path.join(UPLOAD_BASE_PATH, gstn)
+        if gstn.startswith(".") or not os.path.isdir(gstn_dir):
+            continue
+        for return_type in os.listdir(gstn_dir):
+            folder = os.path.join(gstn_dir, return_type)
+            if os.path.isdir(folder) and any(e.get("sha256") == sha256 for e in read_upload_index(folder).values()):
+                return False
+    return True
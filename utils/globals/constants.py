@@ -1,6 +1,8 @@
 from datetime import date
 import re
 
+import pandas as pd
+
 # Table position starts with Table header and not the first row of table.
 OLD_TABLE_POSITIONS_GSTR_3B = {
     "1": {
@@ -236,10 +238,33 @@ def parse_month(month_name):
     return month_lookup[month_name]
 
 
+# Everything but digits, "." and "-": Indian comma grouping, newlines, non-breaking spaces, tabs, etc.
+_non_numeric_pattern = re.compile(r'[^\d.-]+')
+_non_ascii_pattern = re.compile(r'[^\x00-\x7f]')
+
+
 def clean_and_parse_number(text):
     # Remove special characters like newlines, non-breaking spaces, tabs, etc.
-    cleaned = re.sub(r'[^\d.-]+', '', str(text))
+    cleaned = _non_numeric_pattern.sub('', str(text))
     try:
         return float(cleaned)
     except ValueError:
         return 0
+
+
+def clean_and_parse_numbers(frame):
+    """
+    clean_and_parse_number for every cell of a DataFrame at once: a float64 DataFrame with the same index and
+    columns, with 0 where a cell holds no number (None, "", "-", ...). Much faster than calling
+    clean_and_parse_number per cell, see benchmarks/bench_clean_numbers.py.
+    """
+    # One pass of pandas string ops over all cells, so duplicate or missing column headers don't matter
+    cells = pd.Series(frame.to_numpy(dtype=object).ravel()).astype(str)
+    numbers = pd.to_numeric(cells.str.replace(_non_numeric_pattern, '', regex=True), errors='coerce')
+    # \d and float() also take non-ASCII digits (e.g. full-width or Devanagari), which to_numeric does not: the
+    # few cells with non-ASCII characters go through clean_and_parse_number itself
+    non_ascii = cells.str.contains(_non_ascii_pattern)
+    if non_ascii.any():
+        numbers = numbers.mask(non_ascii, cells[non_ascii].map(clean_and_parse_number))
+    values = numbers.fillna(0).to_numpy(dtype='float64').reshape(frame.shape)
+    return pd.DataFrame(values, index=frame.index, columns=frame.columns)
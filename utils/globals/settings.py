@@ -0,0 +1,69 @@
+import os
+
+# Runtime tunables. Every value can be overridden through an environment variable of the same name
+# so the packaged exe and the server deployment can be sized without code changes.
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# === Uploads ===
+UPLOAD_BASE_PATH = "uploaded_files"
+UPLOAD_CHUNK_SIZE = _env_int("UPLOAD_CHUNK_SIZE", 1024 * 1024)  # 1 MB buffer per read/write
+MAX_UPLOAD_FILE_BYTES = _env_int("MAX_UPLOAD_FILE_BYTES", 512 * 1024 * 1024)  # 512 MB per file
+MAX_UPLOAD_REQUEST_BYTES = _env_int("MAX_UPLOAD_REQUEST_BYTES", 2 * 1024 * 1024 * 1024)  # 2 GB per /upload/ call
+UPLOAD_TEMP_SUFFIX = ".part"
+BLOB_STORE_PATH = os.path.join(UPLOAD_BASE_PATH, ".blobs")  # Content-addressed store, one blob per SHA-256
+UPLOAD_INDEX_FILE = ".index.json"  # Per <gstn>/<return_type> folder: file name -> sha256/size
+
+# === Reports ===
+REPORTS_BASE_PATH = "reports"  # reports/<gstin>/: merged workbooks, analyses, docx reports and the stage cache
+CACHE_BASE_PATH = os.path.join(REPORTS_BASE_PATH, ".cache")  # Caches shared by all GSTINs
+
+# === Report jobs ===
+JOB_WORKERS = _env_int("JOB_WORKERS", max(1, (os.cpu_count() or 2) // 2))  # Reports generated at the same time
+JOB_HISTORY_LIMIT = _env_int("JOB_HISTORY_LIMIT", 200)  # Finished jobs kept for /jobs/{id}
+JOB_EVENT_LIMIT = _env_int("JOB_EVENT_LIMIT", 5000)  # Progress events kept per job for /jobs/{id}/events
+JOB_EVENT_POLL_SECONDS = 0.5  # How often the SSE stream checks a running job for new events
+BATCH_POLL_SECONDS = 5  # How often the batch CLI refreshes its progress line
+
+# === CPU-bound stages (mergers, PDF readers, analyses) ===
+STAGE_WORKERS = _env_int("STAGE_WORKERS", os.cpu_count() or 1)  # Worker processes shared by all running jobs
+STAGE_TIMEOUT_SECONDS = _env_int("STAGE_TIMEOUT_SECONDS", 30 * 60)  # A stage running longer is killed as timed out
+STAGE_POLL_SECONDS = 0.05  # How often a waiting stage checks its worker, timeout and job cancellation
+# Processes the stages start for their files (see process_pool.map_in_subprocesses) are taken from one budget shared
+# by all stage workers, so a lone job's stage gets every CPU and busy stages together stay within the budget
+SUBPROCESS_WORKERS = _env_int("SUBPROCESS_WORKERS", os.cpu_count() or 1)
+PDF_EXTRACT_WORKERS = _env_int("PDF_EXTRACT_WORKERS", os.cpu_count() or 1)  # At most, for one stage's PDFs
+WORKBOOK_PARSE_WORKERS = _env_int("WORKBOOK_PARSE_WORKERS", os.cpu_count() or 1)  # At most, for one stage's workbooks
+PDF_WORKER_RSS_BUDGET_BYTES = _env_int("PDF_WORKER_RSS_BUDGET_BYTES", 2 * 1024 * 1024 * 1024)  # Per PDF-reading process
+
+# === PDF table cache ===
+PDF_TABLE_CACHE_PATH = os.path.join(CACHE_BASE_PATH, "pdf_tables")  # Raw tables per PDF hash, see pdf_table_cache.py
+PDF_TABLE_CACHE_MAX_BYTES = _env_int("PDF_TABLE_CACHE_MAX_BYTES", 256 * 1024 * 1024)  # LRU-evicted above this
+PDF_TABLE_CACHE_VERSION = "2"  # Bump when the way tables are extracted from the PDFs changes
+PDF_REGION_EXTRACTION = _env_int("PDF_REGION_EXTRACTION", 1)  # 0: never read tables from form layout regions
+# 1: GSTR-3B cell text from page word coordinates. Off until the benchmark finds no mismatch on real filings
+GSTR3B_WORD_EXTRACTION = _env_int("GSTR3B_WORD_EXTRACTION", 0)
+
+# === Excel inputs ===
+WORKBOOK_READER = os.getenv("WORKBOOK_READER", "calamine")  # "openpyxl": never read workbooks with python-calamine
+HEADER_TEMPLATE_CACHE_PATH = os.path.join(CACHE_BASE_PATH, "header_templates")  # See utils/header_templates.py
+HEADER_TEMPLATE_CACHE_VERSION = "1"  # Bump when the way header templates are extracted changes
+
+# === Merged workbook sidecars ===
+MERGED_SIDECARS = _env_int("MERGED_SIDECARS", 1)  # 0: analyses always read the merged xlsx, see utils/merged_sidecar.py
+MERGED_SIDECAR_DIR = ".columnar"  # In reports/<gstin>/: one folder of Parquet files per merged workbook
+MERGED_SIDECAR_VERSION = "1"  # Bump when the way sheets are stored in sidecars changes
+
+# === /process/ master CSVs ===
+PROCESS_CSV_CHUNK_ROWS = _env_int("PROCESS_CSV_CHUNK_ROWS", 50_000)  # Rows read and written at a time per CSV file
+
+# === Incremental regeneration ===
+STAGE_CACHE_VERSION = "1"  # Bump to invalidate every cached stage result, e.g. after a change in result semantics
+STAGE_MANIFEST_FILE = ".manifest.json"  # In reports/<gstin>/: stage -> input fingerprint and outputs
+STAGE_CACHE_DIR = ".stage_cache"  # In reports/<gstin>/: pickled stage results reused when fingerprints match
@@ -10,6 +10,9 @@ from openpyxl.styles import Alignment, Font
 from openpyxl.utils import get_column_letter
 from openpyxl.utils.dataframe import dataframe_to_rows
 from utils.globals.constants import parse_month_year, late_fee_headers, parse_month
+from utils.merged_sidecar import openpyxl_sheets, write_sheet_sidecars
+from utils.progress import emit
+from utils.workbook_reader import open_rows_workbook, non_empty_rows
 
 financial_year_2021_22 = "2021-22"
 special_months = [11, 12, 1, 2, 3]
@@ -31,41 +34,40 @@ async def generate_gstr1_merged(input_dir, output_dir):
         list_of_dfs = []
 
         for file_index, file_path in enumerate(excel_files):
-            wb = load_workbook(file_path, data_only=True)
+            wb = open_rows_workbook(file_path)
             print(f"Processing file: {os.path.basename(file_path)}")
-
-            for sheet_name in wb.sheetnames:
-                ws = wb[sheet_name]
-
-                if sheet_name.lower().strip() == "read me":
-                    rows = [
-                        row for row in ws.iter_rows(min_row=4, max_row=10, min_col=2, max_col=3, values_only=True)
-                        if any(cell is not None for cell in row)
-                    ]
-                    if rows:
-                        df = pd.DataFrame(rows, columns=["Field", "Value"])
-                        list_of_dfs.append(df)
-                else:
-                    # Capture headers only from the first file
-                    if file_index == 0:
-                        header_rows = []
-                        for row_idx in [2, 3]:  # 3rd and 4th rows (0-indexed)
-                            row_values = [cell.value if cell.value is not None else "" for cell in ws[row_idx + 1]]
-                            header_rows.append(row_values)
-                        header_map[sheet_name] = header_rows
-
-                    # Extract data from row 5 onward
-                    data_rows = []
-                    for row in ws.iter_rows(min_row=5, values_only=True):
-                        if all(cell is None for cell in row):
-                            continue
-                        data_rows.append(row)
-
-                    if data_rows:
-                        df = pd.DataFrame(data_rows)
-                        sheet_data[sheet_name].append(df)
+            emit("file_parsed", file=os.path.basename(file_path), index=file_index + 1, total=len(excel_files))
+
+            try:
+                for sheet_name in wb.sheetnames:
+                    ws = wb[sheet_name]
+
+                    if sheet_name.lower().strip() == "read me":
+                        rows = [
+                            row for row in ws.iter_rows(min_row=4, max_row=10, min_col=2, max_col=3, values_only=True)
+                            if any(cell is not None for cell in row)
+                        ]
+                        if rows:
+                            df = pd.DataFrame(rows, columns=["Field", "Value"])
+                            list_of_dfs.append(df)
                     else:
-                        sheet_data[sheet_name]  # Ensure key exists even if empty
+                        # Capture headers only from the first file: the 3rd and 4th rows
+                        if file_index == 0:
+                            header_rows = [[value if value is not None else "" for value in row]
+                                           for row in ws.iter_rows(min_row=3, max_row=4, values_only=True)]
+                            header_rows += [[] for _ in range(2 - len(header_rows))]  # Sheet shorter than its header
+                            header_map[sheet_name] = header_rows
+
+                        # Extract data from row 5 onward
+                        data_rows = non_empty_rows(ws, min_row=5)
+
+                        if data_rows:
+                            df = pd.DataFrame(data_rows)
+                            sheet_data[sheet_name].append(df)
+                        else:
+                            sheet_data[sheet_name]  # Ensure key exists even if empty
+            finally:
+                wb.close()
 
         # ✅ Late Fee Calculation
         late_fee_records = calculate_late_fee(list_of_dfs)
@@ -92,6 +94,7 @@ async def generate_gstr1_merged(input_dir, output_dir):
                     )
                     for header in header_rows:
                         writer.sheets[sheet_name + "_merged"].append(header)
+                    emit("rows_merged", sheet=sheet_name, rows=len(combined_df))
 
             # ✅ Insert Late Fee Records
             late_fee_df = pd.DataFrame(late_fee_records, columns=late_fee_headers)
@@ -110,6 +113,7 @@ async def generate_gstr1_merged(input_dir, output_dir):
         # ✅ Save File
         wb.save(output_path)
         print(f"✅ GSTR-1 merged Excel saved to: {output_path}")
+        write_sheet_sidecars(output_path, openpyxl_sheets(wb))
         return output_path, final_result_points
     except Exception as e:
         print(f"[GSTR-1_merged]: ❌ Error while merging GSTR-1 files. {e}")
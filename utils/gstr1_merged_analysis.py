@@ -6,6 +6,7 @@ from openpyxl.styles import Alignment
 from openpyxl.utils import get_column_letter
 
 from utils.globals.constants import string_yes, string_no, result_point_14
+from utils.merged_sidecar import read_merged_sheet
 
 HSN_COL = 0
 RATE_COL = 4
@@ -25,7 +26,7 @@ async def generate_gstr1_merged_analysis(gstin: str):
     try:
         # Read the HSN sheet with header at second row (index 1)
         print(f"[GSTR-1 Analysis] Started analysing HSN_merged sheet.")
-        df = pd.read_excel(input_path, sheet_name="hsn_merged", header=1)
+        df = read_merged_sheet(input_path, "hsn_merged", header=1)
 
         # Convert relevant tax columns to numeric
         for col in TAX_COLS:
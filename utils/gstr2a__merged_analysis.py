@@ -8,6 +8,7 @@ from utils.globals.constants import result_point_15, result_point_16, empty_stri
     string_NO, \
     string_YES, string_Y, cdnr_merged_sheet, credit_note, debit_note, isd_merged_sheet, impg_merged_sheet, \
     impg_sez_merged_sheet, eco_merged_sheet, tcs_merged_sheet, tds_merged_sheet
+from utils.merged_sidecar import MergedWorkbook
 
 TAX_COL_NAMES = ["Integrated Tax (₹)", "Central Tax (₹)", "State/UT Tax (₹)", "Cess (₹)"]
 ECOM_COL_NAMES = [8, 9, 10, 11, 12]
@@ -34,10 +35,10 @@ async def generate_gstr2a_merged_analysis(gstin):
             print(f"[GSTR-2A Analysis] Skipped: Input file not found at {input_path}")
             return final_result_points
         reverse_charge_liability_B2B_merged = pd.DataFrame()
-        all_sheets = pd.ExcelFile(input_path)
+        all_sheets = MergedWorkbook(input_path)  # Parquet sidecars written by the merger, else the xlsx
         # Load Excel and extract headers
         if b2b_merged_sheet in all_sheets.sheet_names:
-            df_raw = pd.read_excel(input_path, sheet_name=b2b_merged_sheet, header=None)
+            df_raw = all_sheets.parse(sheet_name=b2b_merged_sheet, header=None)
             # Read data rows after header
             df_B2B_merged = df_raw.iloc[HEADER_ROW + 1:].reset_index(drop=True)
             # New excel format has multiple header rows. We are setting column names present in 2nd row.
@@ -110,7 +111,7 @@ async def generate_gstr2a_merged_analysis(gstin):
             for sheet in sheet_names:
                 if sheet in all_sheets.sheet_names:
                     print(f"Evaluating sheet: {sheet}")
-                    df_raw = pd.read_excel(input_path, sheet_name=sheet, header=None)
+                    df_raw = all_sheets.parse(sheet_name=sheet, header=None)
                     df = df_raw.iloc[HEADER_ROW + 1:].reset_index(drop=True)
                     df.columns = df_raw.iloc[HEADER_ROW]
                     # Strip whitespace from all string entries
@@ -136,7 +137,7 @@ async def generate_gstr2a_merged_analysis(gstin):
 
             # CDNR = Credit Debit Note Regular
             print(f"Evaluating sheet: CDNR_merged")
-            cdnr_raw = pd.read_excel(input_path, sheet_name=cdnr_merged_sheet, header=None)
+            cdnr_raw = all_sheets.parse(sheet_name=cdnr_merged_sheet, header=None)
             cdnr_df = cdnr_raw.iloc[HEADER_ROW + 1:].reset_index(drop=True)
             cdnr_df.columns = cdnr_raw.iloc[HEADER_ROW]
             # Strip whitespace from all string entries
@@ -203,7 +204,7 @@ async def generate_gstr2a_merged_analysis(gstin):
             ecom_df = pd.DataFrame()
             if eco_merged_sheet in all_sheets.sheet_names:
                 print("Started processing sheet ECO_merged.")
-                ecom_df_raw = pd.read_excel(input_path, sheet_name=eco_merged_sheet, header=None)
+                ecom_df_raw = all_sheets.parse(sheet_name=eco_merged_sheet, header=None)
                 ecom_df = ecom_df_raw.iloc[HEADER_ROW + 1:].reset_index(drop=True)
                 ecom_df.columns = ecom_df_raw.iloc[HEADER_ROW]
                 # Strip whitespace from all string entries
@@ -230,7 +231,7 @@ async def generate_gstr2a_merged_analysis(gstin):
         try:
             tcs_df = pd.DataFrame()
             if tcs_merged_sheet in all_sheets.sheet_names:
-                tcs_df_raw = pd.read_excel(input_path, sheet_name=tcs_merged_sheet, header=None)
+                tcs_df_raw = all_sheets.parse(sheet_name=tcs_merged_sheet, header=None)
                 tcs_df = tcs_df_raw.iloc[HEADER_ROW + 1:].reset_index(drop=True)
                 tcs_df.columns = tcs_df_raw.iloc[HEADER_ROW]
                 # Strip whitespace from all string entries
@@ -259,7 +260,7 @@ async def generate_gstr2a_merged_analysis(gstin):
         try:
             tds_df = pd.DataFrame()
             if tds_merged_sheet in all_sheets.sheet_names:
-                tds_df_raw = pd.read_excel(input_path, sheet_name=tds_merged_sheet, header=None)
+                tds_df_raw = all_sheets.parse(sheet_name=tds_merged_sheet, header=None)
                 tds_df = tds_df_raw.iloc[HEADER_ROW + 1:].reset_index(drop=True)
                 tds_df.columns = tds_df_raw.iloc[HEADER_ROW]
                 # Strip whitespace from all string entries
@@ -2,11 +2,16 @@ import os
 import pandas as pd
 from glob import glob
 from collections import defaultdict
-from openpyxl import load_workbook, Workbook
+from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
-import copy
 
 from utils.globals.constants import total_string, sheet_overview
+from utils.globals.settings import WORKBOOK_PARSE_WORKERS
+from utils.header_templates import load_header_templates, stamp_header
+from utils.merged_sidecar import decode_frame, encode_frame, openpyxl_sheets, pa, write_sheet_sidecars
+from utils.process_pool import map_in_subprocesses
+from utils.progress import emit
+from utils.workbook_reader import open_rows_workbook, non_empty_rows, sheet_names
 
 # Define header row ranges per sheet (0-indexed)
 header_row_map_new = {
@@ -59,54 +64,64 @@ TAX_HEADER_STANDARDIZATION = {
 }
 
 
-def copy_header_with_styles(source_ws, target_ws, header_rows):
+def _parse_gstr2a_file(item):
     """
-    Copies specified header rows from source_ws to target_ws,
-    preserving formatting, merged cells, column widths, and row heights.
+    Data rows of one monthly GSTR-2A workbook, run in a parsing process. item is (file path, index, file count).
+    Returns {sheet name: its rows as a DataFrame, or None when the sheet has no data rows}. The DataFrames go back to
+    the stage as encode_frame() bytes (typed Arrow columns, one per kind of value in the text and mixed columns) and
+    as pickled objects only without pyarrow or for cells of another kind.
     """
-    header_rows = sorted(header_rows)
-
-    # 1. Copy column widths
-    for col_letter, dim in source_ws.column_dimensions.items():
-        target_ws.column_dimensions[col_letter].width = dim.width
-
-    # 2. Copy styled header rows
-    for target_row_idx, source_row_idx in enumerate(header_rows, start=1):
-        source_row = source_ws[source_row_idx + 1]  # openpyxl is 1-indexed
-        target_ws.row_dimensions[target_row_idx].height = source_ws.row_dimensions[source_row_idx + 1].height
-
-        for col_idx, cell in enumerate(source_row, start=1):
-            # new_cell = target_ws.cell(row=target_row_idx, column=col_idx, value=cell.value)
-            raw_value = cell.value
-            # Normalize header names if they match known messy versions
-            if isinstance(raw_value, str) and raw_value.strip() in TAX_HEADER_STANDARDIZATION:
-                raw_value = TAX_HEADER_STANDARDIZATION[raw_value.strip()]
-            new_cell = target_ws.cell(row=target_row_idx, column=col_idx, value=raw_value)
-            if cell.has_style:
-                if cell.font: new_cell.font = copy.copy(cell.font)
-                if cell.border: new_cell.border = copy.copy(cell.border)
-                if cell.fill: new_cell.fill = copy.copy(cell.fill)
-                if cell.number_format: new_cell.number_format = cell.number_format
-                if cell.protection: new_cell.protection = copy.copy(cell.protection)
-                if cell.alignment: new_cell.alignment = copy.copy(cell.alignment)
-
-    # 3. Copy merged cells within header range
-    header_row_set = set(r + 1 for r in header_rows)  # 1-based
-    for merged_range in source_ws.merged_cells.ranges:
-        min_row, min_col, max_row, max_col = merged_range.bounds
-        if all(row in header_row_set for row in range(min_row, max_row + 1)):
-            try:
-                mapped_min_row = header_rows.index(min_row - 1) + 1
-                mapped_max_row = header_rows.index(max_row - 1) + 1
-                target_ws.merge_cells(
-                    start_row=mapped_min_row,
-                    start_column=min_col,
-                    end_row=mapped_max_row,
-                    end_column=max_col
-                )
-            except ValueError:
+    file_path, file_idx, file_count = item
+    sheet_frames = {}
+    wb = open_rows_workbook(file_path)
+    try:
+        print(f"Processing file: {os.path.basename(file_path)}")
+        # Determine format once per file
+        current_header_map = header_row_map_old if sheet_overview in wb.sheetnames else header_row_map_new
+
+        for sheet_name in wb.sheetnames:
+            if sheet_name not in current_header_map:
+                continue  # Skip unknown sheets early
+
+            ws = wb[sheet_name]
+            header_rows = current_header_map[sheet_name]
+            data_start_row = max(header_rows) + 1
+
+            # Rows are streamed from the sheet XML and empty ones dropped during iteration
+            data_rows = non_empty_rows(ws, min_row=data_start_row + 1)
+
+            if not data_rows:
+                sheet_frames[sheet_name] = None
                 continue
 
+            df = pd.DataFrame(data_rows)
+
+            # Apply filtering efficiently
+            # Rows only reach their last non-empty cell, so the column may be missing altogether
+            if (sheet_name in row_filter_column_map and
+                    current_header_map == header_row_map_new and not df.empty and
+                    row_filter_column_map[sheet_name] < df.shape[1]):
+                col_idx = row_filter_column_map[sheet_name]
+                # More efficient string filtering
+                mask = ~df.iloc[:, col_idx].astype(str).str.endswith(total_string)
+                df = df[mask]
+
+            if not df.empty:
+                sheet_frames[sheet_name] = _encoded(df)
+    finally:
+        wb.close()
+    emit("file_parsed", file=os.path.basename(file_path), index=file_idx + 1, total=file_count)
+    return sheet_frames
+
+
+def _encoded(df):
+    if pa is None:
+        return df
+    try:
+        return encode_frame(df)
+    except (TypeError, ValueError, OverflowError, pa.ArrowException):
+        return df
+
 
 async def generate_gstr2a_merged(input_dir, output_dir):
     print(f"[GSTR-2A_merged] Started execution of method generate_gstr2a_merged for: {input_dir}")
@@ -121,67 +136,35 @@ async def generate_gstr2a_merged(input_dir, output_dir):
     # readme_copy = None
     # readme_done = False
 
-    # Memory-efficient processing: collect all data first, then concatenate once per sheet
-    for file_idx, file_path in enumerate(excel_files):
-        try:
-            wb = load_workbook(file_path, data_only=True)
-            print(f"Processing file: {os.path.basename(file_path)}")
-
-            # Determine format once per file
-            current_header_map = header_row_map_old if sheet_overview in wb.sheetnames else header_row_map_new
-
-            for sheet_name in wb.sheetnames:
-                if sheet_name not in current_header_map:
-                    continue  # Skip unknown sheets early
-
-                ws = wb[sheet_name]
-                header_rows = current_header_map[sheet_name]
-                data_start_row = max(header_rows) + 1
-
-                # More efficient data extraction - filter empty rows during iteration
-                data_rows = [
-                    row for row in ws.iter_rows(min_row=data_start_row + 1, values_only=True)
-                    if not all(cell is None for cell in row)
-                ]
-
-                if not data_rows:
-                    sheet_data[sheet_name]  # Ensure sheet exists even if empty
-                    continue
-
-                df = pd.DataFrame(data_rows)
-
-                # Apply filtering efficiently
-                if (sheet_name in row_filter_column_map and
-                        current_header_map == header_row_map_new and not df.empty):
-                    col_idx = row_filter_column_map[sheet_name]
-                    # More efficient string filtering
-                    mask = ~df.iloc[:, col_idx].astype(str).str.endswith(total_string)
-                    df = df[mask]
-
-                if not df.empty:
-                    sheet_data[sheet_name].append(df)
-
-            wb.close()  # Explicitly close to free memory
+    # Monthly files are independent: they are parsed in parallel processes and their sheets come back in file order
+    items = [(file_path, file_idx, len(excel_files)) for file_idx, file_path in enumerate(excel_files)]
+    parsed = map_in_subprocesses(_parse_gstr2a_file, items, WORKBOOK_PARSE_WORKERS)
+    for file_path, (sheet_frames, error) in zip(excel_files, parsed):
+        if error:
+            print(f"[GSTR-2A_merged] ❌ Error while copying excel file {file_path}: {error}")
+            continue
+        for sheet_name, df in sheet_frames.items():
+            if df is None:
+                sheet_data[sheet_name]  # Ensure sheet exists even if empty
+                continue
+            sheet_data[sheet_name].append(decode_frame(df) if isinstance(df, bytes) else df)
 
-        except Exception as e:
-            print(f"[GSTR-2A_merged] ❌ Error while copying excel file {file_path}: {str(e)}")
     # Prepare output excel file
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, "GSTR-2A_merged.xlsx")
     merged_wb = Workbook()
     merged_wb.remove(merged_wb.active)
 
-    # Load source workbook once for header copying
-    source_wb = None
+    # Header templates of the first file's format, extracted with styles only the first time the format is seen
     try:
-        source_wb = load_workbook(excel_files[0], data_only=False)
+        source_sheets = sheet_names(excel_files[0])
+        # Determine which header map to use for output
+        output_header_map = header_row_map_old if sheet_overview in source_sheets else header_row_map_new
+        header_templates = load_header_templates(excel_files[0], output_header_map, TAX_HEADER_STANDARDIZATION)
     except Exception as e:
         print(f"❌ Could not load source file for headers: {str(e)}")
         return None
 
-    # Determine which header map to use for output
-    output_header_map = header_row_map_old if sheet_overview in source_wb.sheetnames else header_row_map_new
-
     for sheet_name in output_header_map:
         try:
             # Create sheet with proper naming
@@ -189,10 +172,8 @@ async def generate_gstr2a_merged(input_dir, output_dir):
             merged_ws = merged_wb.create_sheet(title=(display_name + "_merged")[:31])
 
             # Copy formatted header if source sheet exists
-            if sheet_name in source_wb.sheetnames:
-                source_ws = source_wb[sheet_name]
-                header_rows = output_header_map[sheet_name]
-                copy_header_with_styles(source_ws, merged_ws, header_rows)
+            if sheet_name in header_templates.sheets:
+                stamp_header(header_templates, sheet_name, merged_ws, "GSTR-2A")
 
                 # Memory-efficient data writing: single concatenation + bulk write
                 df_list = sheet_data.get(sheet_name, [])
@@ -211,19 +192,17 @@ async def generate_gstr2a_merged(input_dir, output_dir):
                     # Clear DataFrame to free memory
                     del combined_df
                     print(f"[GSTR-2A_merged] ✅ Written {len(data_rows)} rows to {sheet_name}")
+                    emit("rows_merged", sheet=sheet_name, rows=len(data_rows))
             else:
                 print(f"Sheet '{sheet_name}' not found in source. Creating empty sheet.")
 
         except Exception as e:
             print(f"[GSTR-2A_merged] ❌ Error while writing sheet {sheet_name}: {str(e)}")
 
-    # Close source workbook to free memory
-    if source_wb:
-        source_wb.close()
-
     # Clear all sheet data to free memory before saving
     sheet_data.clear()
 
     merged_wb.save(output_path)
     print(f"✅ [GSTR-2A_merged] merged Excel saved to: {output_path}")
+    write_sheet_sidecars(output_path, openpyxl_sheets(merged_wb))
     return output_path
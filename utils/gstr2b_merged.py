@@ -2,9 +2,12 @@ import os
 import pandas as pd
 from glob import glob
 from collections import defaultdict
-from openpyxl import load_workbook, Workbook
+from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
-import copy
+from utils.header_templates import load_header_templates, stamp_header
+from utils.merged_sidecar import openpyxl_sheets, write_sheet_sidecars
+from utils.progress import emit
+from utils.workbook_reader import open_rows_workbook, non_empty_rows
 
 # Define header row ranges per sheet (0-indexed)
 header_row_map = {
@@ -27,50 +30,6 @@ header_row_map = {
 }
 
 
-def copy_header_with_styles(source_ws, target_ws, header_rows):
-    """
-    Copies specified header rows from source_ws to target_ws,
-    preserving formatting, merged cells, column widths, and row heights.
-    """
-    header_rows = sorted(header_rows)
-
-    # 1. Copy column widths
-    for col_letter, dim in source_ws.column_dimensions.items():
-        target_ws.column_dimensions[col_letter].width = dim.width
-
-    # 2. Copy styled header rows
-    for target_row_idx, source_row_idx in enumerate(header_rows, start=1):
-        source_row = source_ws[source_row_idx + 1]  # openpyxl is 1-indexed
-        target_ws.row_dimensions[target_row_idx].height = source_ws.row_dimensions[source_row_idx + 1].height
-
-        for col_idx, cell in enumerate(source_row, start=1):
-            new_cell = target_ws.cell(row=target_row_idx, column=col_idx, value=cell.value)
-            if cell.has_style:
-                if cell.font: new_cell.font = copy.copy(cell.font)
-                if cell.border: new_cell.border = copy.copy(cell.border)
-                if cell.fill: new_cell.fill = copy.copy(cell.fill)
-                if cell.number_format: new_cell.number_format = cell.number_format
-                if cell.protection: new_cell.protection = copy.copy(cell.protection)
-                if cell.alignment: new_cell.alignment = copy.copy(cell.alignment)
-
-    # 3. Copy merged cells within header range
-    header_row_set = set(r + 1 for r in header_rows)  # 1-based
-    for merged_range in source_ws.merged_cells.ranges:
-        min_row, min_col, max_row, max_col = merged_range.bounds
-        if all(row in header_row_set for row in range(min_row, max_row + 1)):
-            try:
-                mapped_min_row = header_rows.index(min_row - 1) + 1
-                mapped_max_row = header_rows.index(max_row - 1) + 1
-                target_ws.merge_cells(
-                    start_row=mapped_min_row,
-                    start_column=min_col,
-                    end_row=mapped_max_row,
-                    end_column=max_col
-                )
-            except ValueError:
-                continue
-
-
 async def generate_gstr2b_merged(input_dir, output_dir):
     print(f"[GSTR-2B] Started execution of method generate_gstr2b_merged for: {input_dir}")
 
@@ -85,39 +44,39 @@ async def generate_gstr2b_merged(input_dir, output_dir):
     readme_done = False
 
     for file_idx, file_path in enumerate(excel_files):
-        wb = load_workbook(file_path, data_only=True)
+        wb = open_rows_workbook(file_path)
         print(f"Processing file: {os.path.basename(file_path)}")
-
-        for sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            # We don't need to merge "read me" sheet
-            # if sheet_name.lower().strip() == "read me":
-            #     if not readme_done:
-            #         readme_copy = ws
-            #         readme_done = True
-            #     continue
-
-            if sheet_name not in header_row_map:
-                print(f"Skipping unknown GSTR-2B sheet: {sheet_name}")
-                continue
-
-            header_rows = header_row_map[sheet_name]
-            data_start_row = max(header_rows) + 1
-
-            # Extract data rows
-            data_rows = []
-            for row in ws.iter_rows(min_row=data_start_row + 1, values_only=True):
-                if all(cell is None for cell in row):
+        emit("file_parsed", file=os.path.basename(file_path), index=file_idx + 1, total=len(excel_files))
+
+        try:
+            for sheet_name in wb.sheetnames:
+                ws = wb[sheet_name]
+                # We don't need to merge "read me" sheet
+                # if sheet_name.lower().strip() == "read me":
+                #     if not readme_done:
+                #         readme_copy = ws
+                #         readme_done = True
+                #     continue
+
+                if sheet_name not in header_row_map:
+                    print(f"Skipping unknown GSTR-2B sheet: {sheet_name}")
                     continue
-                data_rows.append(row)
 
-            if not data_rows:
-                sheet_data[sheet_name]  # ensure key exists
-                continue
+                header_rows = header_row_map[sheet_name]
+                data_start_row = max(header_rows) + 1
 
-            df = pd.DataFrame(data_rows)
-            if not df.empty:
-                sheet_data[sheet_name].append(df)
+                # Extract data rows
+                data_rows = non_empty_rows(ws, min_row=data_start_row + 1)
+
+                if not data_rows:
+                    sheet_data[sheet_name]  # ensure key exists
+                    continue
+
+                df = pd.DataFrame(data_rows)
+                if not df.empty:
+                    sheet_data[sheet_name].append(df)
+        finally:
+            wb.close()
 
     # Prepare output
     os.makedirs(output_dir, exist_ok=True)
@@ -125,23 +84,25 @@ async def generate_gstr2b_merged(input_dir, output_dir):
     merged_wb = Workbook()
     merged_wb.remove(merged_wb.active)
 
+    # Header templates of the first file's format, extracted with styles only the first time the format is seen
+    header_templates = load_header_templates(excel_files[0], header_row_map)
+
     for sheet_name in header_row_map:
         merged_ws = merged_wb.create_sheet(title=(sheet_name + "_merged")[:31])
 
         # Copy formatted header from the first file
-        source_wb = load_workbook(excel_files[0], data_only=False)
-        if sheet_name in source_wb.sheetnames:
-            source_ws = source_wb[sheet_name]
-            header_rows = header_row_map[sheet_name]
-            copy_header_with_styles(source_ws, merged_ws, header_rows)
+        if sheet_name in header_templates.sheets:
+            stamp_header(header_templates, sheet_name, merged_ws, "GSTR-2B")
             # Write stacked data
             df_list = sheet_data.get(sheet_name)
             if df_list:
                 combined_df = pd.concat(df_list, ignore_index=True)
                 for row in dataframe_to_rows(combined_df, index=False, header=False):
                     merged_ws.append(row)
+                emit("rows_merged", sheet=sheet_name, rows=len(combined_df))
         else:
             print(f"Sheet '{sheet_name}' not found. Skipping writing to merged excel sheet.")
     merged_wb.save(output_path)
     print(f"✅ [GSTR-2B] merged Excel saved to: {output_path}")
+    write_sheet_sidecars(output_path, openpyxl_sheets(merged_wb))
     return output_path
@@ -6,6 +6,7 @@ from utils.globals.constants import NEW_TABLE_POSITIONS_GSTR_3B
 from utils.globals.constants import OLD_TABLE_POSITIONS_GSTR_3B
 from utils.globals.constants import extract_table_with_header
 from utils.globals.constants import newFormat
+from utils.merged_sidecar import read_merged_sheet
 
 
 async def gstr3b_merged_reader(gstin):
@@ -19,7 +20,7 @@ async def gstr3b_merged_reader(gstin):
             return valuesFrom3b
         else:
             # Load full sheet without header
-            df_full = pd.read_excel(input_path, sheet_name="GSTR-3B_merged", header=None)
+            df_full = read_merged_sheet(input_path, "GSTR-3B_merged", header=None)
             print("GSTR-3B_merged.xlsx fetched successfully.")
             # Read cell a1 (row 0, column 0)
             gstr3b_format = str(df_full.iat[0, 0]).strip()
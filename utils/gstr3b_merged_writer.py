@@ -3,12 +3,17 @@ import os
 from collections import defaultdict
 from glob import glob
 
+import numpy as np
 import pandas as pd
 from dateutil.relativedelta import relativedelta
 
 from utils.extractors.gstr3b_table_extractor import extract_fixed_tables_from_gstr3b
+from utils.globals.settings import PDF_EXTRACT_WORKERS
+from utils.merged_sidecar import SheetGrid, write_sheet_sidecars, write_table_cubes
+from utils.process_pool import map_in_subprocesses
+from utils.progress import emit
 from utils.globals.constants import newFormat, str_six_point_one, str_two, str_one, \
-    str_three_point_one_point_one, oldFormat, parse_month_year, clean_and_parse_number, late_fee_headers, str_four, \
+    str_three_point_one_point_one, oldFormat, parse_month_year, clean_and_parse_numbers, late_fee_headers, str_four, \
     str_three_point_one, financial_year_2022_23, parse_month, financial_year_2023_24, financial_year_2024_25
 
 manual_columns = [
@@ -36,20 +41,31 @@ async def generate_gstr3b_merged(input_dir, output_dir):
     try:
         gstr3b_format = newFormat  # Let by-default be NEW_FORMAT
 
-        pdf_files = glob(os.path.join(input_dir, "*.pdf"))
+        pdf_files = sorted(glob(os.path.join(input_dir, "*.pdf")))
         if not pdf_files:
             raise FileNotFoundError("No PDF files found in input directory.")
 
         print(f"Found {len(pdf_files)} PDF files.")
+        # Table detection is most of this stage's time, so the monthly PDFs are parsed in parallel.
+        # Results come back in file order; a PDF that fails to parse is left out instead of failing the stage.
+        extracted = map_in_subprocesses(extract_fixed_tables_from_gstr3b, pdf_files, PDF_EXTRACT_WORKERS)
         interest_matrix = []  # A list of lists: each element list contains table 1, 2, 6.1 for interest calculation
         # For a given key ("3.1"), combined_tables contains all the 3.1 tables from multiple uploaded PDF files
         combined_tables = defaultdict(list)
-        for pdf_path in pdf_files:
+        combined_months = defaultdict(list)  # For a given key, the PDF file of each table in combined_tables
+        for pdf_index, (pdf_path, (table_map, error)) in enumerate(zip(pdf_files, extracted)):
+            if error:
+                print(f"[GSTR-3b_merged_writer] ❌ Skipping {pdf_path}, table extraction failed: {error}")
+                emit("file_failed", file=os.path.basename(pdf_path), index=pdf_index + 1, total=len(pdf_files),
+                     error=error)
+                continue
             interest_tables_list = []
-            table_map = extract_fixed_tables_from_gstr3b(pdf_path)
+            emit("file_parsed", file=os.path.basename(pdf_path), index=pdf_index + 1, total=len(pdf_files),
+                 tables=len(table_map))
             for key, df in table_map.items():
                 if key == str_six_point_one:
                     df = preprocess_table_6(df)
+                combined_months[key].append(os.path.basename(pdf_path))
                 combined_tables[key].append(df)  #  contains list of tables as value from all PDF files with table number as key
                 # We need tables 1,2,4 & 6 for interest calc & late fee.
                 if key in (str_one, str_two, str_three_point_one, str_four, str_six_point_one):
@@ -61,28 +77,21 @@ async def generate_gstr3b_merged(input_dir, output_dir):
             gstr3b_format = oldFormat
         print(f"Set GSTR-3B format as : {gstr3b_format}")
         final_tables = {}
+        table_cubes = {}  # Key -> (months, merged table, cube), kept next to the merged workbook for drill-downs
         for key, df_list in combined_tables.items():
             if key in (str_one, str_two):  # We are not adding values from two tables as these are info values
                 final_tables[key] = df_list[0]
                 continue
             # elif key == str_six_point_one:
             #     preprocess_table_6(df_list)
-            base_df = df_list[0].copy(deep=True)
+            base_df = df_list[0].astype(object)  # A copy whose number columns can take the floats (pandas 3 str)
             print(f"Processing table: {key}")
             # print(f"Number of files: {len(df_list)}")
-            for row_idx in range(base_df.shape[0]):  # Summation logic cell by cell
-                for col_idx in range(1, base_df.shape[1]):
-                    total = 0.0
-                    for df_num, df in enumerate(df_list):
-                        try:
-                            num = clean_and_parse_number(df.iat[row_idx, col_idx])
-                            #     print(f"File {df_num}: Cell[{row_idx},{col_idx}] = {num}")
-                            total += num
-                            #     print(f"  File {df_num}: Cell[{row_idx},{col_idx}] = {val} → {num}")
-                        except Exception as e:
-                            print(f"  [Error] File {df_num}: Cell[{row_idx},{col_idx}] → {e}")
-                            continue
-                    base_df.iat[row_idx, col_idx] = total  # if pd.notnull(total) and total != 0 else ""
+            # Summation logic cell by cell: the numbers of every month are cleaned once into a
+            # months × rows × columns cube (cube[i] is month i, in file order) and summed over the month axis
+            cube = stack_monthly_tables(df_list, base_df.shape)
+            base_df.iloc[:, 1:] = cube.sum(axis=0)  # if pd.notnull(total) and total != 0 else ""
+            table_cubes[key] = (combined_months[key], base_df, cube)
             final_tables[key] = base_df  # Contains summed up values of tables to be written in excel
             print(f"Processing table completed: {key}")
         print("[GSTR-3B_merged_writer]: Addition of values of tables across all files completed.")
@@ -137,6 +146,7 @@ async def generate_gstr3b_merged(input_dir, output_dir):
         os.makedirs(output_dir, exist_ok=True)
         output_path = os.path.join(output_dir, "GSTR-3B_merged.xlsx")
         print(f"Starting to write GSTR-3B_merged sheet to: {output_path}")
+        grids = defaultdict(SheetGrid)  # Sheet name -> cells written, for the columnar sidecars of the analyses
         with pd.ExcelWriter(output_path, engine="xlsxwriter") as writer:
             start_row = 1  # Reserve row 0 for format info ("Old Format" or "New Format")
             sheet_name = "GSTR-3B_merged"
@@ -144,8 +154,10 @@ async def generate_gstr3b_merged(input_dir, output_dir):
             for key, df in final_tables.items():
                 title_df = pd.DataFrame([[f"Table {key}"]])
                 title_df.to_excel(writer, sheet_name=sheet_name, startrow=start_row, index=False, header=False)
+                grids[sheet_name].put_frame(title_df, start_row, header=False)
                 start_row += 1
                 df.to_excel(writer, sheet_name=sheet_name, startrow=start_row, index=False)
+                grids[sheet_name].put_frame(df, start_row)
                 start_row += len(df) + 2
 
             # Access the worksheet and workbook
@@ -155,6 +167,7 @@ async def generate_gstr3b_merged(input_dir, output_dir):
             wrap_format = workbook.add_format({'text_wrap': True})
             # Write format info in cell A1
             worksheet.write(0, 0, gstr3b_format, wrap_format)  # gstr3b_format = "Old Format" or "New Format"
+            grids[sheet_name].put(0, 0, gstr3b_format)
             # Apply wrap format and width to all relevant columns
             num_columns = max(len(df.columns) for df in final_tables.values())
             worksheet.set_column(0, num_columns - 1, 30, wrap_format)
@@ -164,6 +177,7 @@ async def generate_gstr3b_merged(input_dir, output_dir):
             print(f"Starting to write Interest Calculation sheet to: {output_path}")
             interest_df = pd.DataFrame(interest_records_for_excel, columns=interest_calc_headers)
             interest_df.to_excel(writer, sheet_name="Interest Calculation", index=False)
+            grids["Interest Calculation"].put_frame(interest_df)
             interest_sheet = writer.sheets["Interest Calculation"]
             interest_sheet.set_column(0, len(interest_df.columns) - 1, 20, wrap_format)
             print(f"Completed writing Interest Calculation sheet to: {output_path}")
@@ -172,6 +186,7 @@ async def generate_gstr3b_merged(input_dir, output_dir):
             print(f"Starting to write Late Fee sheet to: {output_path}")
             late_fee_df = pd.DataFrame(late_fee_records, columns=late_fee_headers)
             late_fee_df.to_excel(writer, sheet_name="Late Fee Record", index=False)
+            grids["Late Fee Record"].put_frame(late_fee_df)
             late_fee_sheet = writer.sheets["Late Fee Record"]
             late_fee_sheet.set_column(0, len(late_fee_df.columns) - 1, 20, wrap_format)
             print(f"Completed writing Late Fee sheet to: {output_path}")
@@ -182,18 +197,38 @@ async def generate_gstr3b_merged(input_dir, output_dir):
             spacing = 2  # Number of blank rows between monthly blocks
             for itc_df in month_wise_table_4_df:
                 itc_df.to_excel(writer, sheet_name='Monthly ITC', index=False, startrow=start_row)
+                grids["Monthly ITC"].put_frame(itc_df, start_row)
                 start_row += len(itc_df) + spacing  # Move to next block
             monthly_itc_sheet = writer.sheets["Monthly ITC"]
             monthly_itc_sheet.set_column(0, len(itc_df.columns) - 1, 25, wrap_format)
             print(f"Completed writing Monthly ITC sheet to: {output_path}")
 
         print(f"✅ GSTR-3B_merged.xlsx saved to: {output_path}")
+        write_sheet_sidecars(output_path, {name: grid.rows() for name, grid in grids.items()})
+        write_table_cubes(output_path, table_cubes)
         return output_path, final_result_points  # ✅ Return the file path for use in API response
     except Exception as e:
         print(f"[GSTR3b_merged]: ❌ Error while merging GSTR-3B files. {e}")
         return output_path, final_result_points
 
 
+def stack_monthly_tables(df_list, shape):
+    """
+    Numbers of the monthly copies of a GSTR-3B table as a float64 array of months × rows × columns, where columns
+    leaves out the description column. Every month is cut or zero-padded to shape (rows, columns incl. the
+    description), so a cell missing in one month's table counts as 0.
+    """
+    row_count, col_count = shape
+    cube = np.zeros((len(df_list), row_count, max(col_count - 1, 0)))
+    for month_idx, df in enumerate(df_list):
+        try:
+            values = clean_and_parse_numbers(df.iloc[:row_count, 1:col_count]).to_numpy()
+            cube[month_idx, :values.shape[0], :values.shape[1]] = values
+        except Exception as e:
+            print(f"  [Error] File {month_idx}: {e}")
+    return cube
+
+
 #  Parameter 8 of ASMT-10 report
 # Due date for ineligible ITC for financial_year 2019-20 is = 30-Nov-2021
 # Due date for ineligible ITC for financial_year 2020-21 is = 30-Nov-2021
@@ -1,89 +1,20 @@
 import os
 import pandas as pd
 from glob import glob
-import pdfplumber
 import datetime
 from tabulate import tabulate
-from utils.globals.constants import int_eighteen, clean_and_parse_number, newFormat, oldFormat, format19_20
+from utils.pdf_table_cache import PdfTables
+from utils.progress import emit
+from utils.extractors.form_layouts import detect_layout, region_tables
+from utils.globals.constants import clean_and_parse_numbers, oldFormat, format19_20
 
 financial_year_2019_20 = "2019-20"
 financial_year_2020_21 = "2020-21"
 
-# Define how many rows to skip per table before setting headers. Don't comment out any line else uploaded
-# table_position_in_useful_tables will have to be changed accordingly. Out of all tables extracted from the
-# PDF file, only the tables whose positions are mentioned as keys in table_header_rows_skip will be saved in
-# useful_tables. The table name : position as per GSTR-9 PDF file is stored in table_position_in_useful_tables.
-table_header_rows_skip_gstr9_2019_20_format = {
-    0: -1,  # We are not dropping any row
-    1: 4,  # Table 4 Part I : here 4 means We are skipping first 5 header rows
-    2: -1,  # Table 4 Part II  : 0 means We are skipping first row only
-    3: 4,  # Table 5 Part I
-    4: -1,  # Table 5 Part II
-    # 5 : 4, Table 6 part I not required
-    6: -1,  # Table 6 part II
-    7: 3,  # Table 7 part I
-    8: 3,  # Part I of Table 8
-    # It starts differing from here in comparison to old format
-    9: -1,  # Part II of Table 8
-    10: 3,  # Table 9
-    12: -1  # Table 11, 12 ,13:  Although only Table 13 is required
-}
-table_header_rows_skip_gstr9_old_format = {
-    0: -1,  # We are not dropping any row
-    1: 4,  # Table 4 Part I : here 4 means We are skipping first 5 header rows
-    2: -1,  # Table 4 Part II  : 0 means We are skipping first row only
-    3: 4,  # Table 5 Part I
-    4: -1,  # Table 5 Part II
-    # 5 : 4, Table 6 part I not required
-    6: -1,  # Table 6 part II
-    7: 3,  # Table 7
-    # 8: 0,  Part II of Table 7 not required
-    9: 3,  # Table 8
-    10: 3,  # Table 9
-    11: 2  # Table 10, 11, 12 ,13
-}
-table_header_rows_skip_gstr9_new_format = {
-    0: -1,
-    1: 4,  # Table 4
-    2: -1,  # Table 4
-    3: 4,  # Table 5 Part I
-    4: -1,  # Table 5 Part II
-    # 5 : 3, Table 6 Part I not required
-    # 6: 0,  Table 6 Part II not required
-    7: -1,  # Table 6 Part III
-    8: 3,  # Table 7
-    # 9 : 0,  Part of Table 7 not required
-    10: 3,  # Table 8
-    11: 3,  # Table 9
-    12: 2  # Table 10, 11, 12 ,13
-}
-header_row_map_2019_20_format = {
-    # 0:
-    1: 2,
-    3: 2,
-    7: 1,
-    8: 1,
-    10: 2,
-    11: 1
-}
-header_row_map_old_format = {
-    # 0:
-    1: 2,
-    3: 2,
-    7: 1,
-    9: 1,
-    10: 2,
-    11: 1
-}
-header_row_map_new_format = {
-    # 0:
-    1: 2,
-    3: 2,
-    8: 1,
-    10: 1,
-    11: 2,
-    12: 1
-}
+# Out of all tables extracted from the PDF file, only the tables whose positions are listed in the GSTR-9 layout
+# (utils/extractors/form_layouts.py) are saved in useful_tables. Don't drop a position from a layout else
+# table_position_in_useful_tables will have to be changed accordingly. The table name : position as per GSTR-9
+# PDF file is stored in table_position_in_useful_tables.
 table_position_in_useful_tables_gstr9 = {
     "Table_1": 0,
     "Table_4_part_I": 1,
@@ -100,7 +31,6 @@ table_position_in_useful_tables_gstr9 = {
 
 async def gstr9_pdf_reader(gstin):
     print(f"[GSTR-9 reader] Starting execution of file gstr9_pdf_reader.py ===")
-    all_tables = []
     useful_tables = []
     valuesFrom9 = {}
     gstr9_format = oldFormat  # Let by-default be OLD_FORMAT
@@ -114,52 +44,34 @@ async def gstr9_pdf_reader(gstin):
             return output_path_GSTR_9, valuesFrom9
         print(f"Found {len(pdf_files)} GSTR-9 PDF file(s).")
 
-        # Read the only annual GSTR-9 file and extract tables
-        with pdfplumber.open(pdf_files[0]) as pdf:
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                for table in tables:
-                    all_tables.append(table)
-        print(f" No. of tables in GSTR-9 PDF: {len(all_tables)}")
-
-        if len(all_tables) == int_eighteen:  # Old format = 18, New format = 19 tables
-            if all_tables[0][0][1] == financial_year_2019_20:
-                gstr9_format = format19_20
-                table_header_rows_skip = table_header_rows_skip_gstr9_2019_20_format
-                header_row_map = header_row_map_2019_20_format
-                print(f"GSTR-9.pdf is based on 2019-20 format")
-            else:
-                # By-default gstr9_format is set as oldFormat
-                table_header_rows_skip = table_header_rows_skip_gstr9_old_format
-                header_row_map = header_row_map_old_format
-                print(f"GSTR-9.pdf is based on old format")
-        else:
-            gstr9_format = newFormat
-            table_header_rows_skip = table_header_rows_skip_gstr9_new_format
-            header_row_map = header_row_map_new_format
-            print(f"GSTR-9.pdf is based on new format")
+        # Read the only annual GSTR-9 file. Only the tables listed in its layout are parsed.
+        with PdfTables(pdf_files[0]) as pdf_tables:
+            layout = detect_layout("GSTR-9", pdf_tables)
+            region_rows = region_tables(pdf_tables, layout, layout.tables) or {}  # Cropped regions, if defined
+            gstr9_format = layout.name
+            print(f"GSTR-9.pdf is based on {layout.label}")
 
-        # Clean and process specific tables of GSTR-9
-        for idx, skip_rows in table_header_rows_skip.items():
-            if idx < len(all_tables):
-                df = pd.DataFrame(all_tables[idx])
-                if idx in header_row_map:
-                    df.columns = df.iloc[header_row_map.get(idx)]  # Set new header
-                df = df.drop(index=range(skip_rows + 1))  # Drop the header rows
-                df = df.reset_index(drop=True)  # Reset index
-                useful_tables.append(df)
-                # Table 6 can't be printed using tabulate due to its merged cell structure
-                #     print(f"Table no: {idx}")
-                #     print(tabulate(df, tablefmt='grid', maxcolwidths=20))
+            # Clean and process specific tables of GSTR-9
+            for idx, skip_rows in layout.tables.items():
+                table = region_rows[idx] if idx in region_rows else pdf_tables.get(idx)
+                if table is not None:
+                    df = pd.DataFrame(table)
+                    if idx in layout.header_rows:
+                        df.columns = df.iloc[layout.header_rows.get(idx)]  # Set new header
+                    df = df.drop(index=range(skip_rows + 1))  # Drop the header rows
+                    df = df.reset_index(drop=True)  # Reset index
+                    useful_tables.append(df)
+                    # Table 6 can't be printed using tabulate due to its merged cell structure
+                    #     print(f"Table no: {idx}")
+                    #     print(tabulate(df, tablefmt='grid', maxcolwidths=20))
+        emit("file_parsed", file=os.path.basename(pdf_files[0]), index=1, total=1, tables=len(useful_tables))
 
         # Set column headers which are not set
         setColumnHeaders(useful_tables, gstr9_format)
 
         # Clean the values of useful_tables content before saving to excel.
         for df in useful_tables:
-            for row_idx in range(df.shape[0]):
-                for col_idx in range(2, df.shape[1]):
-                    df.iat[row_idx, col_idx] = clean_and_parse_number(df.iat[row_idx, col_idx])
+            df.iloc[:, 2:] = clean_and_parse_numbers(df.iloc[:, 2:]).to_numpy()
 
         print(f"useful_tables size: {len(useful_tables)}")  # It should be 10 for both old & new.
         table_4_merged = pd.concat([useful_tables[table_position_in_useful_tables_gstr9["Table_4_part_I"]],
@@ -1,48 +1,20 @@
 import os
 import pandas as pd
 from glob import glob
-import pdfplumber
 import datetime
 from tabulate import tabulate
-from utils.globals.constants import int_eighteen, clean_and_parse_number, newFormat, oldFormat, int_twenty_one
+from utils.pdf_table_cache import PdfTables
+from utils.progress import emit
+from utils.extractors.form_layouts import detect_layout, region_tables
+from utils.globals.constants import int_eighteen, clean_and_parse_numbers, oldFormat
 
 financial_year_2019_20 = "2019-20"
 financial_year_2020_21 = "2020-21"
 
-# Define how many rows to skip per table before setting headers. Don't comment out any line else uploaded
-# table_position_in_useful_tables will have to be changed accordingly. Out of all tables extracted from the
-# PDF file, only the tables whose positions are mentioned as keys in table_header_rows_skip will be saved in
-# useful_tables. The table name : position as per GSTR-9C PDF file is stored in table_position_in_useful_tables.
-table_header_rows_skip_gstr9c_old_format = {
-    0: -1,  # We are not dropping any row
-    2: -1,  # Table 5 Part II
-    8: -1,  # Table 9 Part II
-    10: 2,  # Table 11 Part I
-    11: -1,  # Table 11 Part II
-    12: 1,  # Table 12
-    18: 0,  # Table 16
-}
-table_header_rows_skip_gstr9c_new_format = {
-    0: -1,
-    2: -1,  # Table 5 Part II
-    8: -1,  # Table 9 Part II
-    10: 2,  # Table 11 Part I
-    11: -1,  # Table 11 Part II
-    12: 1,  # Table 12
-    17: 0,  # Table 16
-}
-header_row_map_old_format = {
-    0: 0,
-    10: 2,
-    12: 2,
-    18: 1
-}
-header_row_map_new_format = {
-    0: 0,
-    1: 2,
-    12: 2,
-    17: 1
-}
+# Out of all tables extracted from the PDF file, only the tables whose positions are listed in the GSTR-9C layout
+# (utils/extractors/form_layouts.py) are saved in useful_tables. Don't drop a position from a layout else
+# table_position_in_useful_tables will have to be changed accordingly. The table name : position as per GSTR-9C
+# PDF file is stored in table_position_in_useful_tables.
 table_position_in_useful_tables_gstr9c = {
     "Table_1": 0,
     "Table_5_part_II": 1,
@@ -56,7 +28,6 @@ table_position_in_useful_tables_gstr9c = {
 
 async def gstr9c_pdf_reader(gstin):
     print(f"[GSTR-9C reader] Starting execution of file gstr9c_pdf_reader.py ===")
-    all_tables = []
     useful_tables = []
     valuesFrom9c = {}
     gstr9c_format = oldFormat  # Let by-default be OLD_FORMAT
@@ -70,44 +41,33 @@ async def gstr9c_pdf_reader(gstin):
             return output_path_GSTR_9C, valuesFrom9c
         print(f"Found {len(pdf_files)} GSTR-9C PDF file(s).")
 
-        # Read the only annual GSTR-9 file and extract tables
-        with pdfplumber.open(pdf_files[0]) as pdf:
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                for table in tables:
-                    all_tables.append(table)
-        print(f" No. of tables in GSTR-9 PDF: {len(all_tables)}")
-
-        if len(all_tables) == int_twenty_one:  # Old format = 21, New format =  tables
-            table_header_rows_skip = table_header_rows_skip_gstr9c_old_format
-            header_row_map = header_row_map_old_format
-            print(f"GSTR-9C.pdf is based on old format")
-        else:
-            gstr9c_format = newFormat
-            table_header_rows_skip = table_header_rows_skip_gstr9c_new_format
-            header_row_map = header_row_map_new_format
-            print(f"GSTR-9C.pdf is based on new format")
-
-        # Clean and process specific tables of GSTR-9
-        for idx, skip_rows in table_header_rows_skip.items():
-            if idx < len(all_tables):
-                df = pd.DataFrame(all_tables[idx])
-                if idx in header_row_map:
-                    df.columns = df.iloc[header_row_map.get(idx)]  # Set new header
-                df = df.drop(index=range(skip_rows + 1))  # Drop the unnecessary rows
-                df = df.reset_index(drop=True)  # Reset index
-                useful_tables.append(df)
-                # Few tables can't be printed using tabulate due to its merged cell structure
-                # print(f"Table no: {idx}")
-                # print(tabulate(df, tablefmt='grid', maxcolwidths=20))
+        # Read the only annual GSTR-9C file. Only the tables listed in its layout are parsed.
+        with PdfTables(pdf_files[0]) as pdf_tables:
+            layout = detect_layout("GSTR-9C", pdf_tables)
+            region_rows = region_tables(pdf_tables, layout, layout.tables) or {}  # Cropped regions, if defined
+            gstr9c_format = layout.name
+            print(f"GSTR-9C.pdf is based on {layout.label}")
+
+            # Clean and process specific tables of GSTR-9
+            for idx, skip_rows in layout.tables.items():
+                table = region_rows[idx] if idx in region_rows else pdf_tables.get(idx)
+                if table is not None:
+                    df = pd.DataFrame(table)
+                    if idx in layout.header_rows:
+                        df.columns = df.iloc[layout.header_rows.get(idx)]  # Set new header
+                    df = df.drop(index=range(skip_rows + 1))  # Drop the unnecessary rows
+                    df = df.reset_index(drop=True)  # Reset index
+                    useful_tables.append(df)
+                    # Few tables can't be printed using tabulate due to its merged cell structure
+                    # print(f"Table no: {idx}")
+                    # print(tabulate(df, tablefmt='grid', maxcolwidths=20))
+        emit("file_parsed", file=os.path.basename(pdf_files[0]), index=1, total=1, tables=len(useful_tables))
         print(f"[GSTR-9C] useful_tables size: {len(useful_tables)}")  # It should be 7 for both old & new.
 
         for idx, df in enumerate(useful_tables):
             if idx == 0:
                 continue
-            for row_idx in range(df.shape[0]):
-                for col_idx in range(2, df.shape[1]):
-                    df.iat[row_idx, col_idx] = clean_and_parse_number(df.iat[row_idx, col_idx])
+            df.iloc[:, 2:] = clean_and_parse_numbers(df.iloc[:, 2:]).to_numpy()
 
         # Write the dataframes in excel sheet GSTR-9.xlsx
         output_path_GSTR_9C = f"reports/{gstin}/GSTR-9C.xlsx"
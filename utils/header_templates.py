@@ -0,0 +1,272 @@
+import copy
+import hashlib
+import json
+import os
+import pickle
+import re
+import tempfile
+import zipfile
+from dataclasses import dataclass
+
+import openpyxl
+from openpyxl import load_workbook
+from openpyxl.styles import NamedStyle
+
+from utils.globals.settings import HEADER_TEMPLATE_CACHE_PATH, HEADER_TEMPLATE_CACHE_VERSION, UPLOAD_TEMP_SUFFIX
+from utils.workbook_reader import workbook_shared_strings_part, workbook_sheet_parts
+
+# The merged GSTR-2A/2B sheets start with the styled header rows of the first monthly workbook. Loading a workbook
+# with styles takes as long as reading all of its data, and the headers only change when the portal changes its
+# export format, so each format's header rows (values, cell styles, merges, column widths, row heights) are extracted
+# once and cached on disk as a pickled HeaderTemplates. The key is the format signature, taken from the raw zip parts
+# without opening the workbook: the sheet names, a hash of the style table (xl/styles.xml), of each header sheet's
+# column widths, header row and cell XML and merged ranges, and of the shared strings of the header cells, plus
+# HEADER_TEMPLATE_CACHE_VERSION and the openpyxl version.
+# The cell styles are added to the merged workbook as named styles ("GSTR-2A header 1", ...) and the header cells
+# refer to them, instead of each cell getting its own copy of every font, border and fill.
+
+_LAYOUT_SCAN_CHUNK_BYTES = 1024 * 1024
+# Tags of the sheet XML, with or without a namespace prefix. "<c" is followed by a space, "/" or ">", not "<cols"
+_row_tag_pattern = re.compile(rb"<(?:\w+:)?row\b[^>]*>")
+_row_number_pattern = re.compile(rb"\sr=\"(\d+)\"")
+_cell_tag_pattern = re.compile(rb"<(?:\w+:)?c\b[^>]*>")
+_cols_pattern = re.compile(rb"<(?:\w+:)?cols\b.*?</(?:\w+:)?cols>", re.DOTALL)
+_merges_pattern = re.compile(rb"<(?:\w+:)?mergeCells\b.*?</(?:\w+:)?mergeCells>", re.DOTALL)
+_sheet_data_end_pattern = re.compile(rb"</(?:\w+:)?sheetData>|<(?:\w+:)?sheetData\s*/>")
+_merges_end_pattern = re.compile(rb"</(?:\w+:)?mergeCells>")
+# A whole cell, its attributes and its content: <v> (a shared string index where t="s") or <is> for inline strings
+_cell_pattern = re.compile(rb"<(?:\w+:)?c\b([^>]*?)(?:/>|>(.*?)</(?:\w+:)?c>)", re.DOTALL)
+_shared_type_pattern = re.compile(rb"\st=\"s\"")
+_value_pattern = re.compile(rb"<(?:\w+:)?v>\s*(\d+)\s*</(?:\w+:)?v>")
+_string_item_pattern = re.compile(rb"<(?:\w+:)?si\b.*?</(?:\w+:)?si>|<(?:\w+:)?si\s*/>", re.DOTALL)
+
+
+@dataclass
+class SheetHeader:
+    column_widths: dict  # Column letter -> width
+    row_heights: list  # Per header row, None for the default height
+    rows: list  # Per header row: [(value, index in HeaderTemplates.styles or None)] from column A
+    merges: list  # (min_row, min_col, max_row, max_col) of merged ranges, in the header's own 1-based rows
+
+
+@dataclass
+class HeaderTemplates:
+    sheets: dict  # Sheet name -> SheetHeader, for the sheets of the header row map found in the workbook
+    styles: list  # Distinct cell styles: (font, border, fill, number_format, protection, alignment)
+
+
+def load_header_templates(file_path, header_row_map, value_map=None):
+    """
+    Header templates of the sheets of file_path, for header_row_map (sheet name -> 0-based header rows). Header
+    values found in value_map (stripped) are replaced by its value, e.g. to standardise tax column names.
+    """
+    cache_path = os.path.join(HEADER_TEMPLATE_CACHE_PATH,
+                              _format_signature(file_path, header_row_map, value_map) + ".pkl")
+    templates = _load(cache_path)
+    if templates is None:
+        templates = _extract(file_path, header_row_map, value_map or {})
+        _store(cache_path, templates)
+    return templates
+
+
+def stamp_header(templates, sheet_name, target_ws, style_prefix):
+    """Writes the header rows of sheet_name to the top of target_ws, with its widths, heights and merges."""
+    header = templates.sheets[sheet_name]
+    style_names = _add_named_styles(target_ws.parent, templates.styles, style_prefix)
+
+    for col_letter, width in header.column_widths.items():
+        target_ws.column_dimensions[col_letter].width = width
+
+    for row_idx, (height, cells) in enumerate(zip(header.row_heights, header.rows), start=1):
+        target_ws.row_dimensions[row_idx].height = height
+        for col_idx, (value, style) in enumerate(cells, start=1):
+            cell = target_ws.cell(row=row_idx, column=col_idx, value=value)
+            if style is not None:
+                cell.style = style_names[style]
+
+    for min_row, min_col, max_row, max_col in header.merges:
+        target_ws.merge_cells(start_row=min_row, start_column=min_col, end_row=max_row, end_column=max_col)
+
+
+def _format_signature(file_path, header_row_map, value_map):
+    # Read from the raw zip parts only: no workbook is opened and the shared string table is not parsed
+    with zipfile.ZipFile(file_path) as archive:
+        members = set(archive.namelist())
+        styles = hashlib.sha256(archive.read("xl/styles.xml")).hexdigest() if "xl/styles.xml" in members else None
+        sheets, shared_indexes = [], set()
+        for sheet_name, part in workbook_sheet_parts(archive).items():
+            header_rows = header_row_map.get(sheet_name)
+            if header_rows is None or part not in members:
+                sheets.append([sheet_name])
+                continue
+            digest, indexes = _sheet_header_digest(archive, part, header_rows)
+            sheets.append([sheet_name, sorted(header_rows), digest])
+            shared_indexes |= indexes
+        shared_strings = _shared_strings_digest(archive, shared_indexes)
+    signature = [HEADER_TEMPLATE_CACHE_VERSION, openpyxl.__version__, sorted((value_map or {}).items()), styles,
+                 sheets, shared_strings]
+    return hashlib.sha256(json.dumps(signature, default=str).encode("utf-8")).hexdigest()
+
+
+def _sheet_header_digest(archive, part, header_rows):
+    """
+    SHA-256 of the parts of a sheet's XML that make up its header, and the shared string indexes of the header
+    values. Hashed are the <cols> widths, the <row> and <c> tags of the rows up to the last header row (heights and
+    style ids), the whole cells of the header rows (their values) and the <mergeCells>. The XML is streamed: the
+    data rows are only searched for the end of sheetData, and reading stops once the merged ranges are read.
+    """
+    last_header_row = max(header_rows) + 1
+    header_row_numbers = {row_idx + 1 for row_idx in header_rows}
+    digest, shared_indexes = hashlib.sha256(), set()
+    buffer, head_done, tail = b"", False, False
+    with archive.open(part) as f:
+        for chunk in iter(lambda: f.read(_LAYOUT_SCAN_CHUNK_BYTES), b""):
+            buffer += chunk
+            if not head_done:
+                head_end = _header_end(buffer, last_header_row)
+                if head_end is None:
+                    continue
+                _hash_head(buffer[:head_end], header_row_numbers, digest, shared_indexes)
+                buffer, head_done = buffer[head_end:], True
+            if not tail:
+                sheet_data_end = _sheet_data_end_pattern.search(buffer)
+                if sheet_data_end is None:
+                    buffer = buffer[-64:]  # Enough for a tag split across chunks
+                    continue
+                buffer, tail = buffer[sheet_data_end.end():], True
+            if _merges_end_pattern.search(buffer):
+                break
+    if not head_done:  # Rows end before the last header row
+        _hash_head(buffer, header_row_numbers, digest, shared_indexes)
+    elif tail:
+        for match in _merges_pattern.finditer(buffer):
+            digest.update(match.group(0))
+    return digest.hexdigest(), shared_indexes
+
+
+def _hash_head(head, header_row_numbers, digest, shared_indexes):
+    # head is the sheet XML up to the first row after the header rows
+    for match in _cols_pattern.finditer(head):
+        digest.update(match.group(0))
+    row_tags = list(_row_tag_pattern.finditer(head))
+    row_number = 0
+    for idx, row_tag in enumerate(row_tags):
+        r = _row_number_pattern.search(row_tag.group(0))
+        row_number = int(r.group(1)) if r else row_number + 1
+        row_end = row_tags[idx + 1].start() if idx + 1 < len(row_tags) else len(head)
+        digest.update(row_tag.group(0))
+        if row_number not in header_row_numbers:
+            for cell_tag in _cell_tag_pattern.finditer(head, row_tag.end(), row_end):
+                digest.update(cell_tag.group(0))
+            continue
+        for cell in _cell_pattern.finditer(head, row_tag.end(), row_end):
+            digest.update(cell.group(0))
+            if _shared_type_pattern.search(cell.group(1)):
+                value = _value_pattern.search(cell.group(2) or b"")
+                if value:
+                    shared_indexes.add(int(value.group(1)))
+
+
+def _shared_strings_digest(archive, indexes):
+    # SHA-256 of the shared strings at indexes, streamed only up to the last of them
+    part = workbook_shared_strings_part(archive) if indexes else None
+    if part is None or part not in archive.namelist():
+        return None
+    digest, last, position, buffer = hashlib.sha256(), max(indexes), 0, b""
+    with archive.open(part) as f:
+        for chunk in iter(lambda: f.read(_LAYOUT_SCAN_CHUNK_BYTES), b""):
+            buffer += chunk
+            consumed = 0
+            for match in _string_item_pattern.finditer(buffer):
+                if position in indexes:
+                    digest.update(b"%d:" % position + match.group(0))
+                position, consumed = position + 1, match.end()
+                if position > last:
+                    return digest.hexdigest()
+            buffer = buffer[consumed:]
+    return digest.hexdigest()
+
+
+def _header_end(xml, last_header_row):
+    # Offset of the first row after the header rows (or of the end of sheetData), None when not in xml yet
+    row_number = 0
+    for match in _row_tag_pattern.finditer(xml):
+        r = _row_number_pattern.search(match.group(0))
+        row_number = int(r.group(1)) if r else row_number + 1
+        if row_number > last_header_row:
+            return match.start()
+    sheet_data_end = _sheet_data_end_pattern.search(xml)
+    return sheet_data_end.start() if sheet_data_end else None
+
+
+def _extract(file_path, header_row_map, value_map):
+    wb = load_workbook(file_path, data_only=False)
+    try:
+        styles = {}  # Style -> index, in order of first use
+        sheets = {sheet_name: _sheet_header(wb[sheet_name], sorted(header_rows), value_map, styles)
+                  for sheet_name, header_rows in header_row_map.items() if sheet_name in wb.sheetnames}
+    finally:
+        wb.close()
+    return HeaderTemplates(sheets=sheets, styles=list(styles))
+
+
+def _sheet_header(source_ws, header_rows, value_map, styles):
+    column_widths = {col_letter: dim.width for col_letter, dim in source_ws.column_dimensions.items()}
+    row_heights, rows = [], []
+    for source_row_idx in header_rows:
+        row_heights.append(source_ws.row_dimensions[source_row_idx + 1].height)  # openpyxl is 1-indexed
+        cells = []
+        for cell in source_ws[source_row_idx + 1]:
+            value = cell.value
+            # Normalize header names if they match known messy versions
+            if isinstance(value, str) and value.strip() in value_map:
+                value = value_map[value.strip()]
+            style = None
+            if cell.has_style:
+                style = styles.setdefault((copy.copy(cell.font), copy.copy(cell.border), copy.copy(cell.fill),
+                                           cell.number_format, copy.copy(cell.protection),
+                                           copy.copy(cell.alignment)), len(styles))
+            cells.append((value, style))
+        rows.append(cells)
+
+    # Merged ranges lying wholly within the header rows, mapped onto the rows of the header
+    merges = []
+    header_row_set = set(r + 1 for r in header_rows)  # 1-based
+    for merged_range in source_ws.merged_cells.ranges:
+        min_row, min_col, max_row, max_col = merged_range.bounds
+        if all(row in header_row_set for row in range(min_row, max_row + 1)):
+            merges.append((header_rows.index(min_row - 1) + 1, min_col, header_rows.index(max_row - 1) + 1, max_col))
+    return SheetHeader(column_widths=column_widths, row_heights=row_heights, rows=rows, merges=merges)
+
+
+def _add_named_styles(wb, styles, style_prefix):
+    names = [f"{style_prefix} header {idx + 1}" for idx in range(len(styles))]
+    for name, (font, border, fill, number_format, protection, alignment) in zip(names, styles):
+        if name not in wb.style_names:
+            wb.add_named_style(NamedStyle(name=name, font=copy.copy(font), border=copy.copy(border),
+                                          fill=copy.copy(fill), number_format=number_format,
+                                          protection=copy.copy(protection), alignment=copy.copy(alignment)))
+    return names
+
+
+def _load(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        print(f"[Header templates] ❌ Ignoring unreadable cache file {cache_path}: {e}")
+        return None
+
+
+def _store(cache_path, templates):
+    try:
+        os.makedirs(HEADER_TEMPLATE_CACHE_PATH, exist_ok=True)
+        # Jobs for other GSTINs may be writing the same format's templates at the same time
+        fd, temp_path = tempfile.mkstemp(prefix=".", suffix=UPLOAD_TEMP_SUFFIX, dir=HEADER_TEMPLATE_CACHE_PATH)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(templates, f)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"[Header templates] ❌ Could not cache header templates in {cache_path}: {e}")
@@ -0,0 +1,206 @@
+import asyncio
+import datetime
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.globals.settings import JOB_WORKERS, JOB_HISTORY_LIMIT, JOB_EVENT_LIMIT
+from utils.master_generator import generate_merged_excel_and_analysis_report
+from utils.process_pool import StageCancelledError
+from utils.progress import emit, set_job_context, subscribe
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+
+# Jobs run on a bounded pool of worker threads, each driving one GSTIN's report chain in its own event loop,
+# so /generate_reports/ can return immediately and the server event loop stays free for status polling.
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="report-job")
+_jobs = OrderedDict()  # job_id -> job dict, oldest first
+_active_job_by_gstin = {}  # gstin -> job_id of its queued/running job
+_lock = threading.Lock()
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def submit_report_job(gstin, report_flag, batch_id=None):
+    """
+    Enqueues report generation for a GSTIN and returns (job snapshot, attached). When a job for the same GSTIN is
+    already queued or running, no new job is created and the caller is attached to the existing one. batch_id is
+    added to the job's batch_ids in the same critical section, so its "job_finished" event always names the batch.
+    """
+    with _lock:
+        active_id = _active_job_by_gstin.get(gstin)
+        if active_id is not None:
+            job = _jobs[active_id]
+            if batch_id is not None and batch_id not in job["batch_ids"]:
+                job["batch_ids"].append(batch_id)
+            # A queued job can still pick up the ASMT-10 report asked for by the later request
+            if report_flag and job["state"] == JOB_QUEUED:
+                job["include_asmt_10_report"] = True
+            print(f"[Job queue] GSTIN {gstin} already has job {active_id} ({job['state']}), attaching.")
+            return _snapshot(job), True
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "gstin": gstin,
+            "include_asmt_10_report": report_flag,
+            "state": JOB_QUEUED,
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "stage_timings": {},
+            "reports": [],
+            "error": None,
+            "elapsed_seconds": None,
+            "events": [],  # Progress events, see utils/progress.py; streamed by /jobs/{id}/events
+            "events_dropped": 0,
+            "pdf_table_cache": {"hits": 0, "misses": 0},
+            "cancel_requested": False,
+            "batch_ids": [] if batch_id is None else [batch_id],  # Batches the job belongs to, see utils/batch.py
+            "_cancel_event": threading.Event(),
+        }
+        _jobs[job_id] = job
+        _active_job_by_gstin[gstin] = job_id
+        _trim_history()
+    _executor.submit(_run_job, job_id)
+    print(f"[Job queue] Queued job {job_id} for GSTIN {gstin}.")
+    return _snapshot(job), False
+
+
+def get_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        return _snapshot(job) if job else None
+
+
+def list_jobs(gstin=None):
+    with _lock:
+        return [_snapshot(job) for job in _jobs.values() if gstin is None or job["gstin"] == gstin]
+
+
+def cancel_job(job_id):
+    """
+    Cancels a job. A queued job never starts; for a running job the stage processes are killed and the remaining
+    stages skipped. Returns the job snapshot, or None for an unknown job.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        if job["state"] in ACTIVE_STATES:
+            job["cancel_requested"] = True
+            job["_cancel_event"].set()
+            if job["state"] == JOB_QUEUED:
+                job["state"] = JOB_CANCELLED
+                job["finished_at"] = _now()
+                if _active_job_by_gstin.get(job["gstin"]) == job_id:
+                    del _active_job_by_gstin[job["gstin"]]
+            print(f"[Job queue] Cancellation requested for job {job_id} ({job['state']}).")
+        return _snapshot(job)
+
+
+def get_job_events(job_id, start=0):
+    """Returns the job's progress events from index start on, or None for an unknown job. The last event of a job
+    is always "job_finished"."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        # Indexes count dropped events too, so a client resuming from Last-Event-ID stays aligned
+        offset = max(0, start - job["events_dropped"])
+        return list(job["events"][offset:])
+
+
+def _record_event(event):
+    with _lock:
+        job = _jobs.get(event.get("job_id"))
+        if job is None:
+            return
+        event["elapsed_seconds_since_start"] = round(time.time() - job["_started_time"], 3) \
+            if job.get("_started_time") else None
+        event["id"] = job["events_dropped"] + len(job["events"])
+        if event["type"] == "pdf_table_cache":
+            job["pdf_table_cache"]["hits" if event["hit"] else "misses"] += 1
+        job["events"].append(event)
+        if len(job["events"]) > JOB_EVENT_LIMIT:
+            del job["events"][0]
+            job["events_dropped"] += 1
+
+
+subscribe(_record_event)
+
+
+def _run_job(job_id):
+    with _lock:
+        job = _jobs[job_id]
+        gstin = job["gstin"]
+        report_flag = job["include_asmt_10_report"]
+        cancelled = job["state"] == JOB_CANCELLED
+        batch_ids = list(job["batch_ids"])
+        if not cancelled:
+            job["state"] = JOB_RUNNING
+            job["started_at"] = _now()
+            job["_started_time"] = time.time()
+    # Everything emitted by this thread (and the stage processes it drives) is tagged with this job
+    set_job_context(job_id, gstin)
+    if cancelled:
+        print(f"[Job queue] Job {job_id} was cancelled before it started.")
+        emit("job_finished", state=JOB_CANCELLED, error=None, batch_ids=batch_ids)
+        return
+    print(f"[Job queue] Started job {job_id} for GSTIN {gstin}.")
+    emit("job_started")
+    try:
+        reports = asyncio.run(generate_merged_excel_and_analysis_report(gstin, report_flag, job["stage_timings"],
+                                                                        job["_cancel_event"]))
+        with _lock:
+            job["reports"] = reports
+            if reports:
+                job["state"] = JOB_COMPLETED
+            else:
+                job["state"] = JOB_FAILED
+                job["error"] = "No reports generated for any return type"
+    except StageCancelledError as e:
+        with _lock:
+            job["state"] = JOB_CANCELLED
+            job["error"] = str(e)
+    except Exception as e:
+        traceback.print_exc()
+        with _lock:
+            job["state"] = JOB_FAILED
+            job["error"] = str(e)
+    finally:
+        with _lock:
+            job["finished_at"] = _now()
+            job["elapsed_seconds"] = round(time.time() - job["_started_time"], 3)
+            if _active_job_by_gstin.get(gstin) == job_id:
+                del _active_job_by_gstin[gstin]
+            batch_ids = list(job["batch_ids"])  # No batch can attach any more
+        emit("job_finished", state=job["state"], error=job["error"], batch_ids=batch_ids)
+        print(f"[Job queue] Job {job_id} for GSTIN {gstin} finished: {job['state']}.")
+
+
+def _trim_history():
+    # Called with _lock held. Drops the oldest finished jobs beyond JOB_HISTORY_LIMIT.
+    finished = [job_id for job_id, job in _jobs.items() if job["state"] not in ACTIVE_STATES]
+    for job_id in finished[:max(0, len(_jobs) - JOB_HISTORY_LIMIT)]:
+        del _jobs[job_id]
+
+
+def _snapshot(job):
+    snapshot = {key: value for key, value in job.items() if not key.startswith("_") and key != "events"}
+    snapshot["events_count"] = job["events_dropped"] + len(job["events"])
+    snapshot["stage_timings"] = {stage: dict(timing) for stage, timing in list(job["stage_timings"].items())}
+    snapshot["reports"] = list(job["reports"])
+    snapshot["pdf_table_cache"] = dict(job["pdf_table_cache"])
+    snapshot["batch_ids"] = list(job["batch_ids"])
+    return snapshot
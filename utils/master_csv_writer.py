@@ -0,0 +1,100 @@
+import csv
+import os
+
+import pandas as pd
+
+from utils.globals.settings import UPLOAD_TEMP_SUFFIX
+
+
+class MasterCsvWriter:
+    """
+    Appends DataFrames (pages of a PDF, chunks of a CSV) to a master CSV as soon as they are produced, so only one
+    chunk is in memory at a time whatever the number of input files. Columns are aligned by header and missing
+    values written as 0, like pd.concat(chunks).fillna(0).to_csv(path, index=False) would:
+
+        with MasterCsvWriter(master_path) as writer:
+            for chunk in pd.read_csv(path, chunksize=PROCESS_CSV_CHUNK_ROWS, dtype=str):
+                writer.append(chunk)
+
+    Empty headers (None, or NaN under pandas 3) are written as "". Repeated headers within a chunk (e.g. several
+    empty ones in a PDF table) are told apart like pd.read_csv does: "x", "x.1", "x.2". Columns are written in order of first appearance. New columns only ever go after the known ones, so the rows
+    already written stay valid; if a later chunk brings one, close() rewrites the file once, row by row, with the
+    full header.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = []
+        self.rows = 0
+        self._header = None  # Columns in the header line of the part file
+        self._part_path = path + UPLOAD_TEMP_SUFFIX
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(self._part_path, "w", newline="", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def append(self, df):
+        columns = _unique_columns(df.columns)
+        if columns != list(df.columns):
+            df = df.set_axis(columns, axis=1)
+        for column in df.columns:
+            if column not in self.columns:
+                self.columns.append(column)
+        if self._header is None:
+            self._header = list(self.columns)
+            csv.writer(self._file).writerow(self._header)
+        df.reindex(columns=self.columns, fill_value=0).fillna(0).to_csv(self._file, header=False, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._file.closed:
+            return self.path
+        self._file.close()
+        if self._header is not None and len(self._header) < len(self.columns):
+            self._rewrite_with_full_header()
+        os.replace(self._part_path, self.path)
+        print(f"[Master CSV] Wrote {self.rows} rows x {len(self.columns)} columns to {self.path}")
+        return self.path
+
+    def _rewrite_with_full_header(self):
+        print(f"[Master CSV] {len(self.columns) - len(self._header)} column(s) appeared after the first chunk, "
+              f"rewriting {self.path} with the full header")
+        full_path = self._part_path + ".full"
+        with open(self._part_path, "r", newline="", encoding="utf-8") as src, \
+                open(full_path, "w", newline="", encoding="utf-8") as dst:
+            reader, writer = csv.reader(src), csv.writer(dst)
+            next(reader)  # Old header
+            writer.writerow(self.columns)
+            for row in reader:
+                writer.writerow(row + ["0"] * (len(self.columns) - len(row)))
+        os.replace(full_path, self._part_path)
+
+    def _discard(self):
+        self._file.close()
+        try:
+            os.remove(self._part_path)
+        except OSError:
+            pass
+
+
+def _unique_columns(columns):
+    # Missing labels become ""; the n-th repeat of a header becomes "<header>.n", skipping names the chunk already has
+    seen = set()
+    unique = []
+    for column in columns:
+        if pd.api.types.is_scalar(column) and pd.isna(column):
+            column = ""
+        name, count = column, 0
+        while name in seen:
+            count += 1
+            name = f"{column}.{count}"
+        seen.add(name)
+        unique.append(name)
+    return unique
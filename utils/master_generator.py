@@ -1,4 +1,6 @@
 import os
+import time
+from contextlib import contextmanager
 
 from .asmt_report_generator import asmt_10_report_generator
 from .general_report_generator import general_analysis_report_generator
@@ -18,38 +20,199 @@ from .gstr3b_merged_writer import generate_gstr3b_merged
 from .gstr9_Vs_3B_analysis import generate_gstr9_Vs_3B_analysis
 from .gstr9_pdf_reader import gstr9_pdf_reader
 from .gstr9c_pdf_reader import gstr9c_pdf_reader
+from .pipeline import StageNode, run_pipeline
+from .process_pool import StageCancelledError
+from .progress import emit
+from .stage_cache import StageCache, code_version, fingerprint
 
 return_types = ["GSTR-1", "GSTR-2A", "GSTR-2B", "GSTR-3B", "EWB-IN", "EWB-OUT"]
 
+# Merge node feeding each analysis node that reads a merged workbook
+merge_stage_of_analysis = {
+    "gstr1_analysis": "merge:GSTR-1",
+    "gstr2a_analysis": "merge:GSTR-2A",
+    "gstr3b_reader": "merge:GSTR-3B",
+    "ewb_in_analysis": "merge:EWB-IN",
+    "ewb_out_analysis": "merge:EWB-OUT",
+}
+merged_file_of_return_type = {
+    "GSTR-1": "GSTR-1_merged.xlsx",
+    "GSTR-2A": "GSTR-2A_merged.xlsx",
+    "GSTR-2B": "GSTR-2B_merged.xlsx",
+    "GSTR-3B": "GSTR-3B_merged.xlsx",
+    "EWB-IN": "EWB-In_merged.xlsx",
+    "EWB-OUT": "EWB-Out_merged.xlsx",
+}
 
-async def generate_merged_excel_and_analysis_report(gstin, report_flag):
+
+async def generate_merged_excel_and_analysis_report(gstin, report_flag, stage_timings=None, cancel_event=None):
+    # stage_timings is filled in place so a caller polling it (see job_queue) sees each stage as it finishes.
+    # Setting cancel_event (threading.Event) stops the job: running stages are killed and StageCancelledError raised.
+    stage_timings = {} if stage_timings is None else stage_timings
     master_dict = {'details_of_taxpayer': {'gstin_of_taxpayer': gstin}}
     generated_reports = []   # List of merged files generated
-    generated_reports = await generate_merged_excel_for_return_types(gstin, generated_reports, master_dict)
-    print(f"[Master Generator] Starting with analysis of merged reports for GSTIN: {gstin}")
-    await generate_return_type_reports(gstin, master_dict, generated_reports)
-    await general_analysis_report_generator(gstin, master_dict)
+    # Stages whose inputs did not change since the last run reuse their outputs and result-point dicts
+    cache = StageCache(gstin)
+    print(f"[Master Generator] Starting merge and analysis pipeline for GSTIN: {gstin}")
+    with timed_stage(stage_timings, "merge_and_analysis"):
+        results, fingerprints = await run_pipeline(build_report_pipeline(gstin), stage_timings, cache, cancel_event)
+    if cancel_event is not None and cancel_event.is_set():
+        raise StageCancelledError(f"Report generation for {gstin} cancelled")
+    apply_pipeline_results(results, master_dict, generated_reports)
+    # The docx reports are built from the whole master_dict, so they are rebuilt when any stage changed
+    reports_fingerprint = fingerprint("final_reports", code_version(), fingerprints)
+    await generate_final_report(cache, "general_report", reports_fingerprint,
+                                f"reports/{gstin}/{gstin}_GENERAL_REPORT.docx",
+                                general_analysis_report_generator, gstin, master_dict, stage_timings)
     if report_flag:
-        await asmt_10_report_generator(gstin, master_dict)
+        await generate_final_report(cache, "asmt_10_report", reports_fingerprint,
+                                    f"reports/{gstin}/{gstin}_ASMT_10_REPORT.docx",
+                                    asmt_10_report_generator, gstin, master_dict, stage_timings)
+    cache.save()
     print(f"generated_reports: {generated_reports}")
     return generated_reports
 
 
-async def generate_return_type_reports(gstin, master_dict, generated_reports):
-    gstr1_analysis_dict = await generate_gstr1_merged_analysis(gstin)
-    gstr2a_analysis_dict = await generate_gstr2a_merged_analysis(gstin)
-    valuesFrom3b = await gstr3b_merged_reader(gstin)
-    gstr3b_analysis_dict = await generate_gstr3b_merged_analysis(gstin, valuesFrom3b)
-    output_file_gstr9, valuesFrom9 = await gstr9_pdf_reader(gstin)
+async def generate_final_report(cache, stage, stage_fingerprint, output_file, report_fn, gstin, master_dict,
+                                stage_timings):
+    reused, _ = cache.lookup(stage, stage_fingerprint, (output_file,))
+    if reused:
+        print(f"[Master Generator] {stage} inputs unchanged, keeping {output_file}")
+        stage_timings[stage] = {"state": "reused", "elapsed_seconds": 0.0}
+        emit("stage_finished", stage=stage, state="reused", elapsed_seconds=0.0)
+        return
+    with timed_stage(stage_timings, stage):
+        await report_fn(gstin, master_dict)
+    if os.path.exists(output_file):
+        emit("report_written", stage=stage, file=os.path.basename(output_file))
+        cache.store(stage, stage_fingerprint, None)
+    else:
+        cache.forget(stage)
+
+
+@contextmanager
+def timed_stage(stage_timings, stage):
+    stage_timings[stage] = {"state": "running", "elapsed_seconds": None}
+    emit("stage_started", stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+        stage_timings[stage]["state"] = "completed"
+    except BaseException:
+        stage_timings[stage]["state"] = "failed"
+        raise
+    finally:
+        stage_timings[stage]["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        print(f"[Master Generator] Stage {stage} {stage_timings[stage]['state']} "
+              f"in {stage_timings[stage]['elapsed_seconds']}s")
+        emit("stage_finished", stage=stage, state=stage_timings[stage]["state"],
+             elapsed_seconds=stage_timings[stage]["elapsed_seconds"])
+
+
+def build_report_pipeline(gstin):
+    """
+    Declares the merge and analysis stages as a DAG. Only the real data dependencies are edges:
+    merge -> its analysis, 3B reader -> 3B analysis and 9-vs-3B, GSTR-9 reader -> 9-vs-3B.
+    Merge nodes are added only for return types with uploaded files. The analyses read the merged workbooks from
+    disk, so merge nodes are ordering-only dependencies (after) of their analysis.
+    """
+    output_dir = f"reports/{gstin}/"
+    os.makedirs(output_dir, exist_ok=True)
+    nodes = []
+    for rt in return_types:
+        input_dir = f"uploaded_files/{gstin}/{rt}"
+        # Hidden entries (upload index, in-flight temp files) don't count as inputs
+        if not os.path.exists(input_dir) or not [f for f in os.listdir(input_dir) if not f.startswith(".")]:
+            print(f"[{rt}] merge Skipped: No input files in {input_dir}")
+            continue
+        nodes.append(StageNode(f"merge:{rt}", merge_return_type, (rt, input_dir, output_dir),
+                               input_dirs=(input_dir,), outputs=(f"{output_dir}{merged_file_of_return_type[rt]}",)))
+
+    nodes += [
+        StageNode("gstr1_analysis", generate_gstr1_merged_analysis, (gstin,),
+                  after=(merge_stage_of_analysis["gstr1_analysis"],),
+                  outputs=(f"{output_dir}GSTR-1_Analysis.xlsx",)),
+        StageNode("gstr2a_analysis", generate_gstr2a_merged_analysis, (gstin,),
+                  after=(merge_stage_of_analysis["gstr2a_analysis"],),
+                  outputs=(f"{output_dir}GSTR-2A_analysis.xlsx",)),
+        StageNode("gstr3b_reader", gstr3b_merged_reader, (gstin,), after=(merge_stage_of_analysis["gstr3b_reader"],)),
+        StageNode("gstr3b_analysis", gstr3b_analysis_stage, (gstin,), ("gstr3b_reader",),
+                  outputs=(f"{output_dir}GSTR-3B_analysis.xlsx",)),
+        StageNode("gstr9_reader", gstr9_pdf_reader, (gstin,), input_dirs=(f"uploaded_files/{gstin}/GSTR-9",),
+                  outputs=(f"{output_dir}GSTR-9.xlsx",)),
+        StageNode("gstr9_vs_3b_analysis", gstr9_vs_3b_analysis_stage, (gstin,), ("gstr3b_reader", "gstr9_reader"),
+                  outputs=(f"{output_dir}GSTR-9 vs GSTR-3B.xlsx",)),
+        StageNode("gstr9c_reader", gstr9c_pdf_reader, (gstin,), input_dirs=(f"uploaded_files/{gstin}/GSTR-9C",),
+                  outputs=(f"{output_dir}GSTR-9C.xlsx",)),
+        StageNode("ewb_in_analysis", generate_ewb_in_merged_analysis, (gstin,),
+                  after=(merge_stage_of_analysis["ewb_in_analysis"],),
+                  outputs=(f"{output_dir}EWB-In_merged_analysis.xlsx",)),
+        StageNode("ewb_out_analysis", generate_ewb_out_merged_analysis, (gstin,),
+                  after=(merge_stage_of_analysis["ewb_out_analysis"],),
+                  outputs=(f"{output_dir}EWB-Out_merged_analysis.xlsx",)),
+        StageNode("bo_comparison_analysis", generate_bo_comparison_summary_analysis, (gstin,),
+                  input_dirs=(f"uploaded_files/{gstin}/BO comparison summary",)),
+    ]
+    return nodes
+
+
+async def merge_return_type(rt, input_dir, output_dir):
+    """Returns (output_file, merged result-point dict or None)."""
+    match rt:
+        case "GSTR-1":
+            return await generate_gstr1_merged(input_dir, output_dir)
+        case "GSTR-2A":
+            return await generate_gstr2a_merged(input_dir, output_dir), None
+        case "GSTR-2B":
+            return await generate_gstr2b_merged(input_dir, output_dir), None
+        case "GSTR-3B":
+            return await generate_gstr3b_merged(input_dir, output_dir)
+        # case "GSTR-9":
+        #      We don't merge GSTR-9, we directly analyse it as its a single file.
+        case "EWB-IN":
+            return await generate_ewb_in_merged(input_dir, output_dir), None
+        case "EWB-OUT":
+            return await generate_ewb_out_merged(input_dir, output_dir), None
+        case _:
+            raise ValueError(f" Not a valid return type  {rt}")
+
+
+async def gstr3b_analysis_stage(gstin, valuesFrom3b):
+    return await generate_gstr3b_merged_analysis(gstin, valuesFrom3b or {})
+
+
+async def gstr9_vs_3b_analysis_stage(gstin, valuesFrom3b, gstr9_result):
+    valuesFrom9 = gstr9_result[1] if gstr9_result else {}
+    return await generate_gstr9_Vs_3B_analysis(gstin, valuesFrom3b or {}, valuesFrom9)
+
+
+def apply_pipeline_results(results, master_dict, generated_reports):
+    # Applied in the original serial order so generated_reports and master_dict stay deterministic
+    for rt in return_types:
+        result = results.get(f"merge:{rt}")
+        if result is None:
+            continue
+        output_file, merged_dict = result
+        generated_reports.append({"return_type": rt, "report": output_file}) if output_file else None
+        match rt:
+            case "GSTR-1":
+                master_dict["gstr1_merged_dict"] = merged_dict
+            case "GSTR-3B":
+                master_dict["gstr3b_merged_dict"] = merged_dict
+
+    gstr1_analysis_dict = results.get("gstr1_analysis")
+    gstr2a_analysis_dict = results.get("gstr2a_analysis")
+    gstr3b_analysis_dict = results.get("gstr3b_analysis")
+    output_file_gstr9, valuesFrom9 = results.get("gstr9_reader") or (None, {})
     if output_file_gstr9:  # not None
         generated_reports.append(output_file_gstr9)
-    gstr9_Vs_3b_analysis_dict = await generate_gstr9_Vs_3B_analysis(gstin, valuesFrom3b, valuesFrom9)
-    output_file_gstr9c, gstr9c_analysis_dict = await gstr9c_pdf_reader(gstin)
+    gstr9_Vs_3b_analysis_dict = results.get("gstr9_vs_3b_analysis")
+    output_file_gstr9c, gstr9c_analysis_dict = results.get("gstr9c_reader") or (None, {})
     if output_file_gstr9c:  # not None
         generated_reports.append(output_file_gstr9c)
-    ewb_in_analysis_dict = await generate_ewb_in_merged_analysis(gstin)
-    ewb_out_analysis_dict = await generate_ewb_out_merged_analysis(gstin)
-    output_file_BO, bo_comparison_summary_dict = await generate_bo_comparison_summary_analysis(gstin)
+    ewb_in_analysis_dict = results.get("ewb_in_analysis")
+    ewb_out_analysis_dict = results.get("ewb_out_analysis")
+    output_file_BO, bo_comparison_summary_dict = results.get("bo_comparison_analysis") or (None, {})
     if output_file_BO:  # not None
         generated_reports.append(output_file_BO)
 
@@ -69,48 +232,3 @@ async def generate_return_type_reports(gstin, master_dict, generated_reports):
         master_dict["ewb_out_analysis_dict"] = ewb_out_analysis_dict
     if bo_comparison_summary_dict:
         master_dict["bo_comparison_summary_dict"] = bo_comparison_summary_dict
-
-
-async def generate_merged_excel_for_return_types(gstin, generated_reports, master_dict):
-    print(f"[Master Generator] Starting execution of function generate_merged_excel_for_return_types for GSTIN:{gstin}")
-    for rt in return_types:
-        input_dir = f"uploaded_files/{gstin}/{rt}"
-        output_dir = f"reports/{gstin}/"
-        os.makedirs(output_dir, exist_ok=True)
-
-        if not os.path.exists(input_dir) or not os.listdir(input_dir):
-            print(f"[{rt}] merge Skipped: No input files in {input_dir}")
-            continue
-
-        try:
-            match rt:
-                case "GSTR-1":
-                    output_file, dict_1_merged = await generate_gstr1_merged(input_dir, output_dir)
-                    generated_reports.append({"return_type": rt, "report": output_file}) if output_file else None
-                    master_dict["gstr1_merged_dict"] = dict_1_merged
-                case "GSTR-2A":
-                    output_file = await generate_gstr2a_merged(input_dir, output_dir)
-                    generated_reports.append({"return_type": rt, "report": output_file}) if output_file else None
-                case "GSTR-2B":
-                    output_file = await generate_gstr2b_merged(input_dir, output_dir)
-                    generated_reports.append({"return_type": rt, "report": output_file}) if output_file else None
-                case "GSTR-3B":
-                    output_file, dict_3b_merged = await generate_gstr3b_merged(input_dir, output_dir)
-                    generated_reports.append({"return_type": rt, "report": output_file}) if output_file else None
-                    master_dict["gstr3b_merged_dict"] = dict_3b_merged
-                # case "GSTR-9":
-                #      We don't merge GSTR-9, we directly analyse it as its a single file.
-                case "EWB-IN":
-                    output_file = await generate_ewb_in_merged(input_dir, output_dir)
-                    generated_reports.append({"return_type": rt, "report": output_file}) if output_file else None
-                case "EWB-OUT":
-                    output_file = await generate_ewb_out_merged(input_dir, output_dir)
-                    generated_reports.append({"return_type": rt, "report": output_file}) if output_file else None
-                case _:
-                    print(f" Not a valid return type  {rt}")
-        except Exception as e:
-            print(f"[{rt}] Error: {e}")
-            continue
-
-    print(f"✅ Function call generate_merged_excel_for_return_types completed for GSTIN: {gstin} ===")
-    return generated_reports
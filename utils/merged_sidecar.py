@@ -0,0 +1,405 @@
+import datetime
+import json
+import math
+import numbers
+import os
+import shutil
+import tempfile
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+from utils.globals.settings import MERGED_SIDECARS, MERGED_SIDECAR_DIR, MERGED_SIDECAR_VERSION, UPLOAD_TEMP_SUFFIX
+from utils.workbook_reader import excel_file
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: without it no sidecars are written and the analyses read the merged xlsx
+    pa = pq = None
+
+# The analyses read back the merged workbooks the mergers have just written, and parsing xlsx is the slowest way to
+# hand data from one stage to the next. So every merger also writes each sheet it puts in a *_merged.xlsx as a
+# Parquet file, next to it in reports/<gstin>/.columnar/<workbook name>/, and the analyses read those first. The
+# xlsx stays the deliverable and the fallback: a sidecar is only used while the manifest's size and mtime match the
+# xlsx (not when the xlsx was regenerated or edited by hand), and a sheet that could not be stored is read from it.
+#
+# A sidecar holds the sheet as pd.read_excel sees it: the grid of cell values from A1, "" for empty cells, whole
+# numbers as int, trimmed the way pandas' openpyxl reader does it. read_merged_sheet() runs that grid
+# through the same TextParser call as read_excel, so both give the same DataFrame. Header rows and data share the
+# columns of a sheet, so each grid column is stored as one typed Parquet column per kind of value found in it
+# ("3.text", "3.float", ...), the other kinds being null in that row.
+
+_MANIFEST_FILE = "manifest.json"
+_TABLE_CUBES_FILE = "table_cubes.npz"
+_ARROW_TYPES = {"text": "string", "int": "int64", "float": "float64", "bool": "bool_"}
+_KIND_OF_TYPE = {str: "text", int: "int", float: "float", bool: "bool", datetime.datetime: "datetime",
+                 datetime.time: "time"}
+
+
+class SheetGrid:
+    """
+    The cell values of a sheet written with pandas' ExcelWriter, recorded next to the to_excel() calls, e.g.:
+
+        df.to_excel(writer, sheet_name=sheet_name, startrow=start_row, index=False)
+        grid.put_frame(df, start_row)
+    """
+
+    def __init__(self):
+        self._cells = {}  # (row, col) -> value, 0-based
+
+    def put(self, row, col, value):
+        self._cells[(row, col)] = value
+
+    def put_frame(self, df, startrow=0, header=True):
+        """Same cells as df.to_excel(startrow=startrow, index=False, header=header)."""
+        if header:
+            for col, name in enumerate(df.columns):
+                self.put(startrow, col, name)
+            startrow += 1
+        for row, values in enumerate(df.itertuples(index=False, name=None), start=startrow):
+            for col, value in enumerate(values):
+                self.put(row, col, value)
+
+    def rows(self):
+        if not self._cells:
+            return []
+        height = max(row for row, _ in self._cells) + 1
+        width = max(col for _, col in self._cells) + 1
+        grid = [[None] * width for _ in range(height)]
+        for (row, col), value in self._cells.items():
+            grid[row][col] = value
+        return grid
+
+
+def openpyxl_sheets(wb):
+    """{sheet name: rows of cell values} of an openpyxl workbook held in memory, for write_sheet_sidecars."""
+    return {ws.title: ws.iter_rows(values_only=True) for ws in wb.worksheets}
+
+
+def write_sheet_sidecars(xlsx_path, sheets):
+    """
+    Writes the sidecars of the xlsx just saved at xlsx_path. sheets maps each sheet name, in workbook order, to its
+    rows of cell values from A1 as written to the xlsx. Never raises: without sidecars the xlsx is read instead.
+    """
+    if not MERGED_SIDECARS or pa is None:
+        return
+    sidecar_dir = _sidecar_dir(xlsx_path)
+    try:
+        shutil.rmtree(sidecar_dir, ignore_errors=True)  # The manifest goes first, so a partial write is never used
+        os.makedirs(sidecar_dir, exist_ok=True)
+        files = {}
+        for sheet_name, rows in sheets.items():
+            files[sheet_name] = None
+            try:
+                table = _grid_table(_pandas_grid(rows))
+            except (TypeError, ValueError, OverflowError, pa.ArrowException) as e:
+                print(f"[Merged sidecar] ❌ Sheet {sheet_name} of {os.path.basename(xlsx_path)} not stored: {e}")
+                continue
+            file_name = quote(sheet_name, safe="") + ".parquet"
+            pq.write_table(table, os.path.join(sidecar_dir, file_name))
+            files[sheet_name] = file_name
+        stat = os.stat(xlsx_path)
+        manifest = {"version": MERGED_SIDECAR_VERSION, "xlsx_size": stat.st_size, "xlsx_mtime_ns": stat.st_mtime_ns,
+                    "sheets": files}
+        fd, temp_path = tempfile.mkstemp(prefix=".", suffix=UPLOAD_TEMP_SUFFIX, dir=sidecar_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, os.path.join(sidecar_dir, _MANIFEST_FILE))
+    except Exception as e:
+        print(f"[Merged sidecar] ❌ Could not write sidecars of {xlsx_path}: {e}")
+        shutil.rmtree(sidecar_dir, ignore_errors=True)
+
+
+class MergedWorkbook:
+    """
+    A *_merged.xlsx for reading, from its sidecars where they are current and from the xlsx otherwise. Offers the
+    part of pd.ExcelFile the analyses use: .sheet_names and .parse(sheet_name, header, skiprows).
+    """
+
+    def __init__(self, xlsx_path):
+        self.xlsx_path = xlsx_path
+        self._manifest = _current_manifest(xlsx_path)
+        self._excel = None  # pd.ExcelFile, opened on the first sheet read from the xlsx
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def sheet_names(self):
+        if self._manifest is not None:
+            return list(self._manifest["sheets"])
+        return self._excel_file().sheet_names
+
+    def parse(self, sheet_name, header=0, skiprows=None):
+        file_name = self._manifest["sheets"].get(sheet_name) if self._manifest is not None else None
+        if file_name is not None:
+            try:
+                return _parse_grid(_read_grid(os.path.join(_sidecar_dir(self.xlsx_path), file_name)), header,
+                                   skiprows)
+            except (OSError, ValueError, pa.ArrowException) as e:
+                print(f"[Merged sidecar] ❌ Reading sheet {sheet_name} from the xlsx instead: {e}")
+        return self._excel_file().parse(sheet_name=sheet_name, header=header, skiprows=skiprows)
+
+    def close(self):
+        if self._excel is not None:
+            self._excel.close()
+            self._excel = None
+
+    def _excel_file(self):
+        if self._excel is None:
+            self._excel = excel_file(self.xlsx_path)
+        return self._excel
+
+
+def read_merged_sheet(xlsx_path, sheet_name, header=0, skiprows=None):
+    """pd.read_excel(xlsx_path, sheet_name, header=header, skiprows=skiprows), from the sidecar when current."""
+    with MergedWorkbook(xlsx_path) as workbook:
+        return workbook.parse(sheet_name, header=header, skiprows=skiprows)
+
+
+def write_table_cubes(xlsx_path, cubes):
+    """
+    Keeps the monthly numbers the merged GSTR-3B tables of xlsx_path were summed from, next to its sidecars, for
+    month-wise drill-downs (read_month_table). cubes maps each table key to (month labels, merged table, cube), the
+    cube being months × rows × the columns after the description, cube[i] the month labelled months[i]. Called after
+    write_sheet_sidecars, which clears the folder. Never raises.
+    """
+    if not MERGED_SIDECARS:
+        return
+    try:
+        stat = os.stat(xlsx_path)
+        arrays = {"keys": np.array(list(cubes), dtype=str),
+                  "xlsx": np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)}
+        for idx, (months, table, cube) in enumerate(cubes.values()):
+            arrays[f"cube{idx}"] = cube
+            arrays[f"months{idx}"] = np.array(months, dtype=str)
+            arrays[f"rows{idx}"] = np.array([str(value) for value in table.iloc[:, 0]], dtype=str)
+            arrays[f"columns{idx}"] = np.array([str(column) for column in table.columns], dtype=str)
+        sidecar_dir = _sidecar_dir(xlsx_path)
+        os.makedirs(sidecar_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".", suffix=UPLOAD_TEMP_SUFFIX, dir=sidecar_dir)
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, os.path.join(sidecar_dir, _TABLE_CUBES_FILE))
+    except Exception as e:
+        print(f"[Merged sidecar] ❌ Could not keep the monthly tables of {xlsx_path}: {e}")
+
+
+def read_month_table(xlsx_path, key, month):
+    """
+    One month's copy of merged table key, laid out like the merged table (description column first, numbers
+    cleaned), from the cubes kept by write_table_cubes. None without a current cube for that table and month.
+    """
+    if not MERGED_SIDECARS:
+        return None
+    try:
+        stat = os.stat(xlsx_path)
+        with np.load(os.path.join(_sidecar_dir(xlsx_path), _TABLE_CUBES_FILE), allow_pickle=False) as data:
+            keys = data["keys"].tolist()
+            if data["xlsx"].tolist() != [stat.st_size, stat.st_mtime_ns] or key not in keys:
+                return None
+            idx = keys.index(key)
+            months = data[f"months{idx}"].tolist()
+            if month not in months:
+                return None
+            values = data[f"cube{idx}"][months.index(month)]
+            rows, columns = data[f"rows{idx}"].tolist(), data[f"columns{idx}"].tolist()
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[Merged sidecar] ❌ Ignoring unreadable monthly tables of {xlsx_path}: {e}")
+        return None
+    df = pd.DataFrame(values, columns=columns[1:1 + values.shape[1]])
+    df.insert(0, columns[0], rows)
+    return df
+
+
+def encode_frame(df):
+    """
+    Arrow IPC stream of a DataFrame of cell values, for handing it from a parsing process to the stage as a few flat
+    buffers instead of pickled Python objects. Typed columns go as their Arrow array; object columns are split per
+    kind of value like the sidecar grids. decode_frame() gives back the same labels, dtypes and values, with a
+    RangeIndex. Raises TypeError (or pa.ArrowException) for values of another kind.
+    """
+    columns, dtypes = {}, []
+    for position, (_, series) in enumerate(df.items()):
+        dtype = str(series.dtype)
+        dtypes.append(dtype)
+        if dtype != "object":
+            columns[str(position)] = pa.Array.from_pandas(series)
+            continue
+        by_kind = {}  # kind -> values, None in the rows holding another kind or nothing
+        for row_idx, value in enumerate(series.tolist()):
+            if value is not None:
+                kind = _KIND_OF_TYPE.get(type(value))
+                if kind is None:
+                    raise TypeError(f"cannot encode a {type(value).__name__} cell")
+                values = by_kind.get(kind)
+                if values is None:
+                    values = by_kind[kind] = [None] * len(df)
+                values[row_idx] = value
+        for kind in sorted(by_kind):
+            columns[f"{position}.{kind}"] = pa.array(by_kind[kind], type=_arrow_type(kind))
+    table = pa.table(columns) if columns else pa.table({})
+    metadata = {b"height": str(len(df)).encode(), b"labels": json.dumps(list(df.columns)).encode(),
+                b"dtypes": json.dumps(dtypes).encode()}
+    table = table.replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_frame(data):
+    """The DataFrame encoded by encode_frame()."""
+    table = pa.ipc.open_stream(data).read_all()
+    height = int(table.schema.metadata[b"height"])
+    labels = json.loads(table.schema.metadata[b"labels"])
+    dtypes = json.loads(table.schema.metadata[b"dtypes"])
+    object_columns = {}  # position -> values
+    for name in table.column_names:
+        position, _, kind = name.partition(".")
+        if kind:
+            values = object_columns.setdefault(int(position), [None] * height)
+            for row_idx, value in enumerate(table.column(name).to_pylist()):
+                if value is not None:
+                    values[row_idx] = value
+    series = []
+    for position, dtype in enumerate(dtypes):
+        if dtype == "object":
+            series.append(pd.Series(object_columns.get(position, [None] * height), dtype=object))
+        else:
+            series.append(table.column(str(position)).to_pandas().astype(dtype))
+    df = pd.concat(series, axis=1, ignore_index=True) if series else pd.DataFrame(index=range(height))
+    return df.set_axis(labels, axis=1)
+
+
+def _sidecar_dir(xlsx_path):
+    name = os.path.splitext(os.path.basename(xlsx_path))[0]
+    return os.path.join(os.path.dirname(xlsx_path), MERGED_SIDECAR_DIR, name)
+
+
+def _current_manifest(xlsx_path):
+    if not MERGED_SIDECARS or pa is None:
+        return None
+    try:
+        with open(os.path.join(_sidecar_dir(xlsx_path), _MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        stat = os.stat(xlsx_path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[Merged sidecar] ❌ Ignoring unreadable sidecar manifest of {xlsx_path}: {e}")
+        return None
+    if (manifest.get("version") != MERGED_SIDECAR_VERSION or manifest.get("xlsx_size") != stat.st_size
+            or manifest.get("xlsx_mtime_ns") != stat.st_mtime_ns):
+        return None
+    return manifest
+
+
+def _pandas_grid(rows):
+    # get_sheet_data() of pandas' openpyxl reader: rows trimmed of trailing empty cells and trailing empty rows
+    # dropped. The rows are left ragged; cells past the end of a row are "" like pandas' padding.
+    data = []
+    last_row_with_data = -1
+    for row_number, row in enumerate(rows):
+        converted_row = [_excel_value(value) for value in row]
+        while converted_row and converted_row[-1] == "":
+            converted_row.pop()
+        if converted_row:
+            last_row_with_data = row_number
+        data.append(converted_row)
+    return data[:last_row_with_data + 1]
+
+
+def _excel_value(value):
+    # The value pandas reads back for a cell written with value
+    value_type = type(value)
+    if value_type is str:
+        if value.startswith("="):
+            # Written as a formula, read back as whatever the writer cached for it: None (openpyxl) or 0 (xlsxwriter)
+            raise ValueError("formula cells are read from the xlsx")
+        return value
+    if value_type is int or value_type is datetime.datetime:
+        return value
+    if value is None or value is pd.NaT:
+        return ""
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if not isinstance(value, (float, np.floating)) and isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if math.isnan(value):
+            return ""
+        if math.isinf(value):
+            return "inf" if value > 0 else "-inf"
+        return int(value) if value.is_integer() and abs(value) < 2 ** 63 else value
+    if isinstance(value, str):
+        return _excel_value(str(value))
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, datetime.datetime):
+        return datetime.datetime.combine(value.date(), value.timetz())
+    if isinstance(value, datetime.time):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    raise TypeError(f"cannot store a {type(value).__name__} cell")
+
+
+def _grid_table(grid):
+    # One pass over the cells, collecting the values of each (grid column, kind) in a column of their own
+    height = len(grid)
+    width = max((len(row) for row in grid), default=0)
+    by_column = {}  # (col, kind) -> values, None in the rows holding another kind or nothing
+    for row_idx, row in enumerate(grid):
+        for col, value in enumerate(row):
+            if value != "":
+                key = (col, _KIND_OF_TYPE[type(value)])
+                values = by_column.get(key)
+                if values is None:
+                    values = by_column[key] = [None] * height
+                values[row_idx] = value
+    columns = {f"{col}.{kind}": pa.array(by_column[(col, kind)], type=_arrow_type(kind))
+               for col, kind in sorted(by_column)}
+    table = pa.table(columns) if columns else pa.table({})
+    metadata = {b"height": str(height).encode(), b"width": str(width).encode()}
+    return table.replace_schema_metadata(metadata)
+
+
+def _arrow_type(kind):
+    if kind == "datetime":
+        return pa.timestamp("us")
+    if kind == "time":
+        return pa.time64("us")
+    return getattr(pa, _ARROW_TYPES[kind])()
+
+
+def _read_grid(path):
+    table = pq.read_table(path)
+    height, width = int(table.schema.metadata[b"height"]), int(table.schema.metadata[b"width"])
+    grid = [[""] * width for _ in range(height)]
+    for name, values in table.to_pydict().items():
+        col = int(name.split(".", 1)[0])
+        for row_idx, value in enumerate(values):
+            if value is not None:
+                grid[row_idx][col] = value
+    return grid
+
+
+def _parse_grid(grid, header, skiprows):
+    # The TextParser call of pandas' read_excel for a sheet read with only header and skiprows given
+    if not grid:
+        return pd.DataFrame()
+    try:
+        return TextParser(grid, header=header, skiprows=skiprows, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
@@ -0,0 +1,82 @@
+import gc
+import os
+
+import psutil
+
+from utils.globals.settings import PDF_WORKER_RSS_BUDGET_BYTES
+from utils.progress import emit
+
+# pdfplumber keeps the parsed layout and objects (chars, lines, rects) of every page it has touched until the PDF is
+# closed, which adds up on large GSTR-9 annexures and when a worker reads many PDFs. Readers go through iter_pages()
+# (or PdfTables, which does the same for random access) so that a page's caches are released as soon as the page is
+# done, and a PdfMemory per file checks the worker's RSS against PDF_WORKER_RSS_BUDGET_BYTES and reports the peak.
+
+_process = psutil.Process(os.getpid())
+
+
+class PdfMemoryBudgetError(MemoryError):
+    pass
+
+
+class PdfMemory:
+    """Peak RSS of the worker while one PDF is read, and the RSS budget. Call check() after each page."""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.start_rss = _rss()
+        self.peak_rss = self.start_rss
+
+    def check(self, release=None):
+        """
+        Records the RSS after a page. Above the budget, release() (if given) drops the caches still held and the
+        RSS is measured again; PdfMemoryBudgetError is raised when it stays above, so that the file fails instead
+        of the worker being killed by the OS.
+        """
+        rss = _rss()
+        self.peak_rss = max(self.peak_rss, rss)
+        if rss <= PDF_WORKER_RSS_BUDGET_BYTES:
+            return
+        if release is not None:
+            release()
+        gc.collect()
+        rss = _rss()
+        if rss > PDF_WORKER_RSS_BUDGET_BYTES:
+            raise PdfMemoryBudgetError(f"Reading {self.file_name} took the worker to {_mb(rss)} MB RSS, over the "
+                                       f"{_mb(PDF_WORKER_RSS_BUDGET_BYTES)} MB budget (PDF_WORKER_RSS_BUDGET_BYTES)")
+        print(f"[PDF pages] Released cached pages of {self.file_name} to stay within the RSS budget")
+
+    def report(self, pages):
+        print(f"[PDF pages] {self.file_name}: {pages} page(s), peak RSS {_mb(self.peak_rss)} MB "
+              f"(+{_mb(self.peak_rss - self.start_rss)} MB)")
+        emit("pdf_memory", file=self.file_name, pages=pages, peak_rss_mb=_mb(self.peak_rss),
+             added_rss_mb=_mb(self.peak_rss - self.start_rss))
+
+
+def iter_pages(pdf, file_name):
+    """
+    Yields the pages of an open pdfplumber PDF one at a time. Each page's caches are released when the caller asks
+    for the next one, so only one parsed page is held at a time; see PdfMemory for the RSS budget and report.
+    """
+    memory = PdfMemory(file_name)
+    pages = 0
+    try:
+        for page in pdf.pages:
+            yield page
+            release_page(page)
+            pages += 1
+            memory.check()
+    finally:
+        memory.report(pages)
+
+
+def release_page(page):
+    # Drops the parsed layout, objects and text map; the page is parsed again if it is used later
+    page.close()
+
+
+def _rss():
+    return _process.memory_info().rss
+
+
+def _mb(size):
+    return round(size / (1024 * 1024), 1)
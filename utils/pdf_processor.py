@@ -1,21 +1,20 @@
-import pdfplumber
-import pandas as pd
 import os
 
+import pdfplumber
+import pandas as pd
 
-def process_pdf_files(file_paths: list[str], return_type: str) -> str:
-    combined_data = []
+from utils.master_csv_writer import MasterCsvWriter
+from utils.pdf_pages import iter_pages
 
-    for path in file_paths:
-        with pdfplumber.open(path) as pdf:
-            for page in pdf.pages:
-                table = page.extract_table()
-                if table:
-                    df = pd.DataFrame(table[1:], columns=table[0])
-                    combined_data.append(df)
 
-    master_df = pd.concat(combined_data).fillna(0)
+def process_pdf_files(file_paths: list[str], return_type: str) -> str:
+    # Every page's table is written out as soon as it is extracted and the page released, so memory stays at one page
     master_path = f"reports/{return_type}_master.csv"
-    os.makedirs("reports", exist_ok=True)
-    master_df.to_csv(master_path, index=False)
+    with MasterCsvWriter(master_path) as writer:
+        for path in file_paths:
+            with pdfplumber.open(path) as pdf:
+                for page in iter_pages(pdf, os.path.basename(path)):
+                    table = page.extract_table()
+                    if table:
+                        writer.append(pd.DataFrame(table[1:], columns=table[0]))
     return master_path
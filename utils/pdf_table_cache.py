@@ -0,0 +1,318 @@
+import json
+import os
+import tempfile
+
+import pdfplumber
+
+from utils.file_handler import get_file_hash
+from utils.globals.settings import PDF_TABLE_CACHE_PATH, PDF_TABLE_CACHE_MAX_BYTES, PDF_TABLE_CACHE_VERSION, \
+    UPLOAD_TEMP_SUFFIX
+from utils.pdf_pages import PdfMemory, release_page
+from utils.progress import emit
+
+# A filed return never changes, so the raw tables pdfplumber finds in a PDF are cached on disk, one JSON sidecar per
+# PDF content hash. The key also carries PDF_TABLE_CACHE_VERSION and the pdfplumber version, since either can change
+# what extract_tables() returns. The cache is capped at PDF_TABLE_CACHE_MAX_BYTES; a hit refreshes the sidecar's
+# mtime and the least recently used sidecars are evicted first.
+
+
+class PdfTables:
+    """
+    The tables of a PDF by position, in the order page.extract_tables() returns them page after page, parsed only
+    as far as needed. Pages are indexed first with table detection alone (pages without crossing ruling lines hold no
+    table and are not even searched); the cell text of a table is only extracted when that table is asked for. So the
+    tables a reader never uses, e.g. GSTR-9 Table 6 part I, are never parsed. What was found is kept in the sidecar.
+    Use as a context manager:
+
+        with PdfTables(pdf_path) as pdf_tables:
+            if pdf_tables.count == 18:
+                rows = pdf_tables.table(4)
+
+    A page's parsed layout is released as soon as all of its tables are extracted (see utils/pdf_pages.py), and
+    every held page when the worker goes over its RSS budget.
+
+    With words=True the cell text comes from one extract_words() per page, each word placed in the cell holding its
+    midpoint, instead of pdfplumber scanning the page's characters for every row and cell; a table with a word
+    crossing a cell border is extracted by pdfplumber as usual. Both give the same rows on the tests' generated PDFs;
+    real filings are still to be compared with benchmarks/bench_gstr3b_extraction.py. Tables are still found by
+    table detection: rows are not yet mapped from their labels ("(a) Outward taxable supplies", ...) by coordinates.
+    """
+
+    def __init__(self, pdf_path, words=False):
+        self.pdf_path = pdf_path
+        self.file_name = os.path.basename(pdf_path)
+        self._words_mode = words
+        self._cache_path = _cache_path(get_file_hash(pdf_path), words)
+        cached = _load(self._cache_path) or {}
+        self._page_total = cached.get("page_total")
+        self._page_table_counts = cached.get("page_table_counts", [])  # Tables on each indexed page, in page order
+        self._tables = {int(idx): rows for idx, rows in cached.get("tables", {}).items()}
+        self._first_page_text = cached.get("first_page_text")
+        self._region_tables = cached.get("region_tables", {})  # Region key -> rows, see region_table()
+        self._found = {}  # Page number -> pdfplumber tables found on it in this session
+        self._words = {}  # Page number -> extract_words() of the page, in words mode
+        self._pdf = None
+        self._memory = None  # PdfMemory while the PDF is open
+        self._changed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def count(self):
+        """Number of tables in the whole PDF."""
+        while not self._all_pages_indexed():
+            self._index_next_page()
+        return sum(self._page_table_counts)
+
+    def table(self, idx):
+        """Rows of the idx-th table (cell strings, None for empty cells). Raises IndexError past the last table."""
+        if idx not in self._tables:
+            page_number, idx_on_page = self._locate(idx)
+            if page_number not in self._found:
+                self._found[page_number] = self._open().pages[page_number].find_tables()
+            self._tables[idx] = self._extract(page_number, self._found[page_number][idx_on_page])
+            self._changed = True
+            self._page_done(page_number)
+        return self._tables[idx]
+
+    def get(self, idx):
+        """Like table(), but None past the last table."""
+        try:
+            return self.table(idx)
+        except IndexError:
+            return None
+
+    def first_page_text(self):
+        """Text of the first page, e.g. to tell the form layout apart before any table is searched."""
+        if self._first_page_text is None:
+            pdf = self._open()
+            self._first_page_text = (pdf.pages[0].extract_text() or "") if pdf.pages else ""
+            self._changed = True
+            self._memory.check(release=self._release_all_pages)
+        return self._first_page_text
+
+    def region_table(self, page_number, bbox, column_lines):
+        """
+        Rows of the single table inside bbox on a page, with explicit column rules: only the cropped region is
+        parsed. None when the page does not exist or nothing is found there.
+        """
+        key = f"{page_number}:{list(bbox)}:{list(column_lines)}"
+        if key not in self._region_tables:
+            pdf = self._open()
+            rows = None
+            if page_number < len(pdf.pages):
+                rows = pdf.pages[page_number].crop(bbox).extract_table({
+                    "vertical_strategy": "explicit",
+                    "explicit_vertical_lines": list(column_lines),
+                    "horizontal_strategy": "lines",
+                })
+            self._region_tables[key] = rows
+            self._changed = True
+            self._memory.check(release=self._release_all_pages)
+        return self._region_tables[key]
+
+    def page_tables(self):
+        """
+        The tables page after page, like page.extract_tables() for page in pdf.pages. A generator: a page is only
+        searched for tables when the caller asks for it, so a caller that stops early leaves the rest unparsed.
+        """
+        # Page after page, so that each page is released before the next one is parsed
+        page_number, idx = 0, 0
+        while page_number < len(self._page_table_counts) or not self._all_pages_indexed():
+            if page_number == len(self._page_table_counts):
+                self._index_next_page()
+                if page_number == len(self._page_table_counts):
+                    return  # A PDF without pages
+            table_count = self._page_table_counts[page_number]
+            yield [self.table(i) for i in range(idx, idx + table_count)]
+            idx += table_count
+            page_number += 1
+
+    def close(self):
+        hit = self._pdf is None
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+            self._memory.report(self._page_total)
+        if self._changed:
+            _store(self._cache_path, {
+                "page_total": self._page_total,
+                "page_table_counts": self._page_table_counts,
+                "first_page_text": self._first_page_text,
+                "region_tables": self._region_tables,
+                "tables": {str(idx): rows for idx, rows in sorted(self._tables.items())},
+            })
+            self._changed = False
+        print(f"[PDF table cache] {'Hit' if hit else 'Miss'} for {self.file_name}")
+        emit("pdf_table_cache", file=self.file_name, hit=hit)
+
+    def _open(self):
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.pdf_path)
+            self._page_total = len(self._pdf.pages)
+            self._memory = PdfMemory(self.file_name)
+        return self._pdf
+
+    def _page_done(self, page_number):
+        # Releases the page once every table on it is extracted, then checks the RSS budget
+        first_idx = sum(self._page_table_counts[:page_number])
+        if all(idx in self._tables for idx in range(first_idx, first_idx + self._page_table_counts[page_number])):
+            self._release_page(page_number)
+        self._memory.check(release=self._release_all_pages)
+
+    def _release_page(self, page_number):
+        release_page(self._pdf.pages[page_number])
+        self._found.pop(page_number, None)
+        self._words.pop(page_number, None)
+
+    def _release_all_pages(self):
+        for page_number in range(len(self._pdf.pages)):
+            self._release_page(page_number)
+
+    def _extract(self, page_number, table):
+        if self._words_mode:
+            if page_number not in self._words:
+                self._words[page_number] = self._open().pages[page_number].extract_words()
+            rows = _rows_from_words(table, self._words[page_number])
+            if rows is not None:
+                return rows
+            print(f"[PDF table cache] A word crosses a cell border on page {page_number + 1} of {self.file_name}, "
+                  f"extracting that table with pdfplumber")
+        return table.extract()
+
+    def _all_pages_indexed(self):
+        return self._page_total is not None and len(self._page_table_counts) >= self._page_total
+
+    def _index_next_page(self):
+        pdf = self._open()
+        page_number = len(self._page_table_counts)
+        if page_number >= self._page_total:
+            return  # Nothing left, e.g. a PDF without pages
+        page = pdf.pages[page_number]
+        # The default "lines" strategy builds cells where horizontal and vertical ruling lines cross, so a page
+        # without both (no lines at all, or only underlines and rules between paragraphs) has nothing to find
+        tables = page.find_tables() if page.horizontal_edges and page.vertical_edges else []
+        self._found[page_number] = tables
+        self._page_table_counts.append(len(tables))
+        self._changed = True
+        self._page_done(page_number)
+        emit("page_parsed", file=self.file_name, index=page_number + 1, total=self._page_total, tables=len(tables))
+
+    def _locate(self, idx):
+        first_idx = 0
+        page_number = 0
+        while True:
+            if page_number == len(self._page_table_counts):
+                if self._all_pages_indexed():
+                    raise IndexError(f"{self.file_name} has only {first_idx} tables, no table {idx}")
+                self._index_next_page()
+            table_count = self._page_table_counts[page_number]
+            if idx < first_idx + table_count:
+                return page_number, idx - first_idx
+            first_idx += table_count
+            page_number += 1
+
+
+def _cache_path(sha256, words=False):
+    mode = "-words" if words else ""
+    return os.path.join(PDF_TABLE_CACHE_PATH,
+                        f"{sha256}-v{PDF_TABLE_CACHE_VERSION}-{pdfplumber.__version__}{mode}.json")
+
+
+def _rows_from_words(table, words):
+    # Same rows as table.extract(), which gives each cell the characters whose midpoint lies in it, joined into
+    # words and lines with pdfplumber's default 3pt tolerances. A word that lies wholly inside one cell has all its
+    # characters there, so placing whole words is exact; None when a word of the table area is not inside a cell.
+    x0, top, x1, bottom = table.bbox
+    table_words = [word for word in words
+                   if word["x0"] < x1 and word["x1"] > x0 and word["top"] < bottom and word["bottom"] > top]
+    placed = 0
+    rows = []
+    for row in table.rows:
+        row_top, row_bottom = row.bbox[1], row.bbox[3]
+        row_words = [word for word in table_words if row_top <= (word["top"] + word["bottom"]) / 2 < row_bottom]
+        cells = []
+        for cell in row.cells:
+            if cell is None:
+                cells.append(None)
+                continue
+            cell_x0, cell_top, cell_x1, cell_bottom = cell
+            cell_words = [word for word in row_words if cell_x0 <= (word["x0"] + word["x1"]) / 2 < cell_x1]
+            for word in cell_words:
+                if (word["x0"] < cell_x0 or word["x1"] > cell_x1 or word["top"] < cell_top or
+                        word["bottom"] > cell_bottom):
+                    return None
+            placed += len(cell_words)
+            cells.append(_cell_text(cell_words))
+        rows.append(cells)
+    return rows if placed == len(table_words) else None
+
+
+def _cell_text(words):
+    # Lines are clustered on their top like pdfplumber's extract_text: sorted tops within 3pt of the previous one
+    if not words:
+        return ""
+    line_of_top, line, last_top = {}, 0, None
+    for word_top in sorted({word["top"] for word in words}):
+        if last_top is not None and word_top > last_top + 3:
+            line += 1
+        line_of_top[word_top] = line
+        last_top = word_top
+    lines = {}
+    for word in sorted(words, key=lambda w: (line_of_top[w["top"]], w["x0"])):
+        lines.setdefault(line_of_top[word["top"]], []).append(word["text"])
+    return "\n".join(" ".join(texts) for _, texts in sorted(lines.items()))
+
+
+def _load(cache_path):
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[PDF table cache] ❌ Ignoring unreadable cache file {cache_path}: {e}")
+        return None
+    try:
+        os.utime(cache_path)  # Mark as recently used for eviction
+    except OSError:
+        pass
+    return entry
+
+
+def _store(cache_path, entry):
+    try:
+        os.makedirs(PDF_TABLE_CACHE_PATH, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".", suffix=UPLOAD_TEMP_SUFFIX, dir=PDF_TABLE_CACHE_PATH)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, separators=(",", ":"))
+        os.replace(temp_path, cache_path)
+        _evict()
+    except OSError as e:
+        print(f"[PDF table cache] ❌ Could not write {cache_path}: {e}")
+
+
+def _evict():
+    entries = []
+    for name in os.listdir(PDF_TABLE_CACHE_PATH):
+        if name.startswith("."):
+            continue
+        try:
+            stat = os.stat(os.path.join(PDF_TABLE_CACHE_PATH, name))
+        except FileNotFoundError:
+            continue  # Evicted by another process
+        entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= PDF_TABLE_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(os.path.join(PDF_TABLE_CACHE_PATH, name))
+            print(f"[PDF table cache] Evicted {name}")
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from utils.globals.settings import STAGE_TIMEOUT_SECONDS
+from utils.process_pool import run_in_process, run_coroutine, StageTimeoutError, StageCancelledError
+from utils.progress import emit, run_in_job_context, stage_context
+from utils.stage_cache import code_version, fingerprint, hash_input_dir
+
+STAGE_COMPLETED = "completed"
+STAGE_FAILED = "failed"
+STAGE_REUSED = "reused"
+STAGE_TIMED_OUT = "timed_out"
+STAGE_CANCELLED = "cancelled"
+
+
+@dataclass
+class StageNode:
+    """
+    One node of the report pipeline. fn is a module-level async function called as fn(*args, *input_values) in a
+    stage worker process, where input_values are the outputs of the nodes named in inputs, in order. An input
+    whose node is not part of the pipeline (e.g. no files uploaded for that return type) or whose node failed is
+    passed as None. Nodes named in after are waited for but their outputs are not passed (e.g. an analysis that
+    reads the merged workbook from disk). input_dirs are the upload folders the node reads and outputs the files it
+    writes; both are used to decide whether a cached result can be reused. A node running longer than timeout
+    seconds (default STAGE_TIMEOUT_SECONDS) is killed and treated like a failed node.
+    """
+    name: str
+    fn: Callable
+    args: tuple = ()
+    inputs: tuple = field(default_factory=tuple)
+    after: tuple = field(default_factory=tuple)
+    input_dirs: tuple = field(default_factory=tuple)
+    outputs: tuple = field(default_factory=tuple)
+    timeout: float = STAGE_TIMEOUT_SECONDS
+
+    @property
+    def dependencies(self):
+        return self.inputs + self.after
+
+
+async def run_pipeline(nodes, stage_timings, cache=None, cancel_event=None):
+    """
+    Runs the nodes as a DAG: every node starts as soon as all of its inputs are available, in parallel with
+    unrelated nodes. Returns ({node name: output}, {node name: fingerprint}). Per-node timings and the critical path
+    (the chain of nodes that bounded end-to-end latency) are recorded in stage_timings. With a StageCache, a node
+    whose fingerprint matches the previous run reuses its cached output instead of running. Setting cancel_event
+    (a threading.Event) kills the running nodes and skips the rest; they are recorded as cancelled.
+    """
+    nodes_by_name = {node.name: node for node in nodes}
+    order = _topological_order(nodes_by_name)
+    fingerprints = {}
+    for name in order:
+        node = nodes_by_name[name]
+        fingerprints[name] = fingerprint(
+            name, code_version(), node.args,
+            {input_dir: hash_input_dir(input_dir) for input_dir in node.input_dirs},
+            {dep: fingerprints.get(dep, "absent") for dep in node.dependencies})
+    pipeline_start = time.perf_counter()
+    spans = {}  # name -> (start offset, end offset)
+    tasks = {}
+
+    async def run_node(node):
+        input_values = [await tasks[dep] if dep in tasks else None for dep in node.inputs]
+        for dep in node.after:
+            if dep in tasks:
+                await tasks[dep]
+        start = time.perf_counter() - pipeline_start
+        stage_timings[node.name] = {"state": "running", "inputs": list(node.dependencies),
+                                    "started_at_seconds": round(start, 3), "elapsed_seconds": None}
+        emit("stage_started", stage=node.name)
+        reused, result = cache.lookup(node.name, fingerprints[node.name], node.outputs) if cache else (False, None)
+        if cancel_event is not None and cancel_event.is_set():
+            stage_timings[node.name]["state"] = STAGE_CANCELLED
+            result = None
+        elif reused:
+            print(f"[Pipeline] Stage {node.name} inputs unchanged, reusing previous result.")
+            stage_timings[node.name]["state"] = STAGE_REUSED
+        else:
+            try:
+                result = await run_in_process(run_in_job_context, stage_context(node.name), run_coroutine, node.fn,
+                                              *node.args, *input_values, timeout=node.timeout,
+                                              cancel_event=cancel_event)
+                stage_timings[node.name]["state"] = STAGE_COMPLETED
+                if cache:
+                    cache.store(node.name, fingerprints[node.name], result)
+            except Exception as e:
+                if isinstance(e, StageTimeoutError):
+                    state = STAGE_TIMED_OUT
+                elif isinstance(e, StageCancelledError):
+                    state = STAGE_CANCELLED
+                else:
+                    state = STAGE_FAILED
+                print(f"[Pipeline] ❌ Stage {node.name} {state}: {e}")
+                stage_timings[node.name]["state"] = state
+                stage_timings[node.name]["error"] = str(e)
+                result = None
+                if cache:
+                    cache.forget(node.name)
+        end = time.perf_counter() - pipeline_start
+        spans[node.name] = (start, end)
+        stage_timings[node.name]["elapsed_seconds"] = round(end - start, 3)
+        emit("stage_finished", stage=node.name, state=stage_timings[node.name]["state"],
+             elapsed_seconds=stage_timings[node.name]["elapsed_seconds"])
+        return result
+
+    # All tasks exist before any of them runs, so each node can await its inputs by name
+    for node in nodes:
+        tasks[node.name] = asyncio.ensure_future(run_node(node))
+    results = await asyncio.gather(*tasks.values())
+
+    critical_path = _critical_path(nodes_by_name, spans)
+    stage_timings["critical_path"] = {
+        "state": STAGE_COMPLETED,
+        "stages": critical_path,
+        "elapsed_seconds": round(time.perf_counter() - pipeline_start, 3),
+    }
+    print(f"[Pipeline] Critical path: {' -> '.join(critical_path)}")
+    if cache:
+        cache.save()
+    return dict(zip(tasks.keys(), results)), fingerprints
+
+
+def _topological_order(nodes_by_name):
+    remaining = {name: {dep for dep in node.dependencies if dep in nodes_by_name} for name, node in nodes_by_name.items()}
+    order = []
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Pipeline has a dependency cycle among: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+        order += ready
+    return order
+
+
+def _critical_path(nodes_by_name, spans):
+    # Walk back from the node that finished last, each time through the input that finished last,
+    # i.e. the one that actually held the node back.
+    if not spans:
+        return []
+    name = max(spans, key=lambda n: spans[n][1])
+    path = [name]
+    while True:
+        deps = [dep for dep in nodes_by_name[name].dependencies if dep in spans]
+        if not deps:
+            break
+        name = max(deps, key=lambda d: spans[d][1])
+        path.append(name)
+    return list(reversed(path))
@@ -0,0 +1,265 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import psutil
+
+from utils.globals.settings import STAGE_WORKERS, STAGE_POLL_SECONDS, SUBPROCESS_WORKERS
+from utils.progress import init_worker, publish, forward, get_job_context, run_in_job_context
+
+# The mergers, PDF readers and analyses are CPU-bound openpyxl/pdfplumber/pandas code behind async defs that
+# never yield, so they are run in worker processes shared by all jobs. "spawn" is used on every platform: it is
+# the only method on Windows (packaged exe) and avoids forking the multi-threaded server on Linux.
+# Workers are kept warm between stages, but each one is a plain Process with a private pipe so that a stage stuck
+# in pdfplumber can be killed (timeout or job cancellation) without affecting any other stage: the worker is
+# terminated and replaced, and nothing it shared with other workers can be left locked.
+#
+# The processes stages start for their own files (map_in_subprocesses) come out of SUBPROCESS_WORKERS slots held by
+# the server process. A stage worker asks for slots over its pipe; whatever a killed worker still held is taken back
+# with it, so the budget never leaks.
+_context = multiprocessing.get_context("spawn")
+_idle_workers = []
+_worker_count = 0
+_free_subprocess_slots = SUBPROCESS_WORKERS
+_pool_lock = threading.Lock()
+_slot_requester = None  # Set only inside stage worker processes: asks the server for subprocess slots
+
+
+class StageTimeoutError(TimeoutError):
+    pass
+
+
+class StageCancelledError(Exception):
+    pass
+
+
+class _StageWorker:
+    def __init__(self):
+        self.conn, child_conn = _context.Pipe()
+        self.subprocess_slots = 0  # Slots the stage running in this worker holds
+        # Not a daemon, so that stages can start processes of their own
+        self.process = _context.Process(target=_worker_main, args=(child_conn,), name="stage-worker")
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        # Processes started by the stage (see map_in_subprocesses) are killed with it
+        try:
+            children = psutil.Process(self.process.pid).children(recursive=True)
+        except psutil.Error:
+            children = []
+        self.process.terminate()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        for child in children:
+            try:
+                child.kill()
+            except psutil.Error:
+                pass
+        self.conn.close()
+
+
+def _worker_main(conn):
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    def request_slots(count):
+        # count > 0 asks for up to count slots and waits for the number granted; count < 0 gives slots back
+        send(("slots", count))
+        return conn.recv() if count > 0 else 0
+
+    global _slot_requester
+    _slot_requester = request_slots
+    # Progress events go over the same pipe as the results, so they reach the server in order
+    init_worker(lambda event: send(("event", event)))
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        fn, args = task
+        try:
+            send(("result", fn(*args)))
+        except BaseException as e:
+            send(("error", (f"{type(e).__name__}: {e}", traceback.format_exc())))
+
+
+async def _acquire_worker(cancel_event):
+    global _worker_count
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            raise StageCancelledError("Job cancelled before the stage started")
+        with _pool_lock:
+            if _idle_workers:
+                return _idle_workers.pop()
+            if _worker_count < STAGE_WORKERS:
+                _worker_count += 1
+                break
+        await asyncio.sleep(STAGE_POLL_SECONDS)  # All STAGE_WORKERS busy with other stages
+    try:
+        return _StageWorker()
+    except BaseException:
+        with _pool_lock:
+            _worker_count -= 1
+        raise
+
+
+def _release_worker(worker, healthy):
+    global _worker_count
+    if healthy:
+        with _pool_lock:
+            _idle_workers.append(worker)
+        return
+    worker.kill()
+    with _pool_lock:
+        _worker_count -= 1
+
+
+async def run_in_process(fn, *args, timeout=None, cancel_event=None):
+    """
+    Runs fn(*args) in a stage worker process and awaits its result. fn and args must be picklable. The worker is
+    killed, and StageTimeoutError / StageCancelledError raised, when the call runs longer than timeout seconds or
+    when cancel_event (a threading.Event) is set.
+    """
+    worker = await _acquire_worker(cancel_event)
+    healthy = False
+    try:
+        worker.conn.send((fn, args))
+        start = time.monotonic()
+        while True:
+            while worker.conn.poll():
+                kind, payload = worker.conn.recv()
+                if kind == "event":
+                    publish(payload)
+                    continue
+                if kind == "slots":
+                    granted = _take_subprocess_slots(payload) if payload > 0 else payload
+                    worker.subprocess_slots += granted
+                    if payload > 0:
+                        worker.conn.send(granted)
+                    else:
+                        _give_back_subprocess_slots(-payload)
+                    continue
+                healthy = True
+                if kind == "error":
+                    message, remote_traceback = payload
+                    print(f"[Process pool] Stage worker traceback:\n{remote_traceback}")
+                    raise RuntimeError(message)
+                return payload
+            if not worker.process.is_alive():
+                raise RuntimeError(f"Stage worker exited with code {worker.process.exitcode}")
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise StageTimeoutError(f"Stage did not finish within {timeout}s")
+            if cancel_event is not None and cancel_event.is_set():
+                raise StageCancelledError("Job cancelled")
+            await asyncio.sleep(STAGE_POLL_SECONDS)
+    finally:
+        _give_back_subprocess_slots(worker.subprocess_slots)  # Only left over when the stage was killed
+        worker.subprocess_slots = 0
+        _release_worker(worker, healthy)
+
+
+def shutdown_process_pool():
+    global _worker_count
+    with _pool_lock:
+        workers = list(_idle_workers)
+        _idle_workers.clear()
+        _worker_count -= len(workers)
+    for worker in workers:
+        try:
+            worker.conn.send(None)
+            worker.process.join(timeout=5)
+        except (OSError, EOFError):
+            pass
+        if worker.process.is_alive():
+            worker.kill()
+
+
+def run_coroutine(coroutine_fn, *args):
+    # Entry point inside the worker process for the repo's async stage functions
+    return asyncio.run(coroutine_fn(*args))
+
+
+def map_in_subprocesses(fn, items, max_workers):
+    """
+    Runs fn(item) for every item on a short-lived pool of processes started from within a stage, e.g. to parse a
+    year of monthly PDFs in parallel. Blocks until done and returns [(result, None) or (None, error message)] in the
+    order of items, so a bad item does not fail the others. fn must be a picklable module-level function.
+    Progress events emitted by fn are passed on to the job the calling stage runs for. The pool gets up to
+    max_workers processes, as many as are free in the SUBPROCESS_WORKERS budget shared by all stages; with fewer
+    than two free the items are run inline, one after the other.
+    """
+    items = list(items)
+    context = get_job_context()
+    slots = _request_subprocess_slots(min(max_workers, len(items))) if min(max_workers, len(items)) > 1 else 0
+    if slots <= 1:
+        _release_subprocess_slots(slots)
+        return [_call_isolated(fn, context, item) for item in items]
+    # The queue is private to this call: if the stage is killed, its processes and the queue go with it
+    event_queue = _context.Queue()
+    forwarder = threading.Thread(target=_forward_events, args=(event_queue,), name="subprocess-events", daemon=True)
+    forwarder.start()
+    try:
+        with ProcessPoolExecutor(max_workers=slots, mp_context=_context, initializer=_init_subprocess,
+                                 initargs=(event_queue,)) as pool:
+            return list(pool.map(functools.partial(_call_isolated, fn, context), items))
+    finally:
+        event_queue.put(None)
+        forwarder.join()
+        _release_subprocess_slots(slots)
+
+
+def _request_subprocess_slots(count):
+    # From the server when running in a stage worker, from this process's own budget otherwise (e.g. inline stages)
+    return _slot_requester(count) if _slot_requester is not None else _take_subprocess_slots(count)
+
+
+def _release_subprocess_slots(count):
+    if count <= 0:
+        return
+    if _slot_requester is not None:
+        _slot_requester(-count)
+    else:
+        _give_back_subprocess_slots(count)
+
+
+def _take_subprocess_slots(count):
+    global _free_subprocess_slots
+    with _pool_lock:
+        granted = max(0, min(count, _free_subprocess_slots))
+        _free_subprocess_slots -= granted
+    return granted
+
+
+def _give_back_subprocess_slots(count):
+    global _free_subprocess_slots
+    with _pool_lock:
+        _free_subprocess_slots += count
+
+
+def _init_subprocess(event_queue):
+    init_worker(event_queue.put)
+
+
+def _forward_events(event_queue):
+    for event in iter(event_queue.get, None):
+        forward(event)
+
+
+def _call_isolated(fn, context, item):
+    try:
+        return run_in_job_context(context, fn, item), None
+    except Exception as e:
+        traceback.print_exc()
+        return None, f"{type(e).__name__}: {e}"
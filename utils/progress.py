@@ -0,0 +1,79 @@
+import contextvars
+import json
+import logging
+import time
+
+# Structured progress events for report jobs: stage started/finished, file N of M parsed, rows merged, ...
+# Code anywhere in the pipeline calls emit(); the event is tagged with the job/stage it runs for. In stage worker
+# processes events travel over the worker's pipe to the server process, where publish() hands them to the
+# subscribers (the job store behind the SSE endpoint) and writes them to the "gst_scrutiny.progress" logger as
+# one JSON line each for log shipping.
+
+logger = logging.getLogger("gst_scrutiny.progress")
+
+_job_context = contextvars.ContextVar("progress_job_context", default=None)
+_worker_sink = None  # Set only inside stage worker processes
+_subscribers = []
+
+
+def set_job_context(job_id, gstin, stage=None):
+    return _job_context.set({"job_id": job_id, "gstin": gstin, "stage": stage})
+
+
+def get_job_context():
+    return _job_context.get()
+
+
+def stage_context(stage):
+    """Copy of the current job context for a given stage, to be handed to a stage worker process."""
+    context = _job_context.get()
+    return dict(context, stage=stage) if context else None
+
+
+def emit(event_type, **fields):
+    context = _job_context.get()
+    if context is None:
+        return  # Not running for a job (e.g. a module called directly)
+    event = {"type": event_type, "job_id": context["job_id"], "gstin": context["gstin"],
+             "stage": fields.pop("stage", context["stage"]), "time": time.time(), **fields}
+    if _worker_sink is not None:
+        _worker_sink(event)
+    else:
+        publish(event)
+
+
+def publish(event):
+    logger.info(json.dumps(event, default=str))
+    for callback in list(_subscribers):
+        try:
+            callback(event)
+        except Exception as e:
+            print(f"[Progress] ❌ Subscriber failed for event {event.get('type')}: {e}")
+
+
+def subscribe(callback):
+    _subscribers.append(callback)
+
+
+# === Stage worker process side ===
+def init_worker(sink):
+    global _worker_sink
+    _worker_sink = sink
+
+
+def forward(event):
+    # Passes on an event emitted by a process this one started (see process_pool.map_in_subprocesses)
+    if _worker_sink is not None:
+        _worker_sink(event)
+    else:
+        publish(event)
+
+
+def run_in_job_context(context, fn, *args):
+    # Entry point inside the worker process: tags every emit() of this call with the job and stage
+    token = _job_context.set(context)
+    try:
+        return fn(*args)
+    finally:
+        _job_context.reset(token)
+
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import pickle
+from glob import glob
+
+from utils.file_handler import get_file_hash
+from utils.globals.settings import STAGE_CACHE_VERSION, STAGE_MANIFEST_FILE, STAGE_CACHE_DIR, UPLOAD_TEMP_SUFFIX, \
+    REPORTS_BASE_PATH
+
+_code_version = None
+
+
+def code_version():
+    """Hash of every source file under utils/, so any code change invalidates the cached stage results."""
+    global _code_version
+    if _code_version is None:
+        sha256 = hashlib.sha256(STAGE_CACHE_VERSION.encode())
+        utils_dir = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob(os.path.join(utils_dir, "**", "*.py"), recursive=True)):
+            with open(path, "rb") as f:
+                sha256.update(os.path.relpath(path, utils_dir).encode())
+                sha256.update(f.read())
+        _code_version = sha256.hexdigest()
+    return _code_version
+
+
+def fingerprint(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def hash_input_dir(input_dir):
+    """{file name: sha256} for the committed files of an upload folder; empty when the folder does not exist."""
+    if not os.path.isdir(input_dir):
+        return {}
+    return {name: get_file_hash(os.path.join(input_dir, name)) for name in sorted(os.listdir(input_dir))
+            if not name.startswith(".") and os.path.isfile(os.path.join(input_dir, name))}
+
+
+class StageCache:
+    """
+    Per-GSTIN manifest of stage fingerprints (input file hashes + code version + upstream fingerprints) with the
+    pickled result of each stage. A stage whose fingerprint and outputs are unchanged is reused instead of rerun.
+    """
+
+    def __init__(self, gstin):
+        self.report_dir = os.path.join(REPORTS_BASE_PATH, gstin)
+        self.manifest_path = os.path.join(self.report_dir, STAGE_MANIFEST_FILE)
+        self.cache_dir = os.path.join(self.report_dir, STAGE_CACHE_DIR)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Stage cache] ❌ Ignoring unreadable manifest {self.manifest_path}: {e}")
+            return {}
+
+    def _result_path(self, stage):
+        return os.path.join(self.cache_dir, stage.replace(":", "_") + ".pkl")
+
+    def lookup(self, stage, stage_fingerprint, outputs=()):
+        """Returns (True, result) when the stage can be reused, else (False, None)."""
+        entry = self.manifest.get(stage)
+        if not entry or entry.get("fingerprint") != stage_fingerprint:
+            return False, None
+        if not all(os.path.exists(path) for path in outputs):
+            return False, None
+        try:
+            with open(self._result_path(stage), "rb") as f:
+                return True, pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"[Stage cache] ❌ Cached result of {stage} unreadable, recomputing: {e}")
+            return False, None
+
+    def store(self, stage, stage_fingerprint, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        result_path = self._result_path(stage)
+        with open(result_path + UPLOAD_TEMP_SUFFIX, "wb") as f:
+            pickle.dump(result, f)
+        os.replace(result_path + UPLOAD_TEMP_SUFFIX, result_path)
+        self.manifest[stage] = {"fingerprint": stage_fingerprint}
+
+    def forget(self, stage):
+        self.manifest.pop(stage, None)
+
+    def save(self):
+        os.makedirs(self.report_dir, exist_ok=True)
+        with open(self.manifest_path + UPLOAD_TEMP_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(self.manifest_path + UPLOAD_TEMP_SUFFIX, self.manifest_path)
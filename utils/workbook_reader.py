@@ -0,0 +1,161 @@
+import datetime
+import itertools
+import posixpath
+from xml.etree import ElementTree
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from utils.globals.settings import WORKBOOK_READER
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # Optional: without it every workbook is read with openpyxl
+    CalamineWorkbook = None
+
+# Every Excel input (monthly GSTR-1/2A/2B workbooks, BO comparison workbooks, the merged workbooks read back by the
+# analyses and /reports/preview/) is read through here, for cell values only. The default backend is calamine, a
+# native xlsx reader that is several times faster than openpyxl; openpyxl is used when python-calamine is not
+# installed, when WORKBOOK_READER=openpyxl, and for any workbook calamine fails to open. Code that needs styles
+# (the headers the mergers copy) still opens the workbook with openpyxl itself.
+#
+# openpyxl's default mode builds a Cell object (value, style, coordinates) for every cell of every sheet before the
+# first row can be read, so its fallback opens workbooks in read-only mode, where rows are parsed from the sheet XML
+# as they are iterated.
+
+
+def reader_backend():
+    return "calamine" if WORKBOOK_READER == "calamine" and CalamineWorkbook is not None else "openpyxl"
+
+
+def open_rows_workbook(file_path, backend=None):
+    """
+    Opens an xlsx for reading rows of cell values: returns an object with .sheetnames, [sheet name] and .close(),
+    whose sheets have iter_rows(min_row, max_row, min_col, max_col, values_only=True) with openpyxl's arguments and
+    values (None for empty cells, int for whole numbers, datetime for dates). Rows only reach their last non-empty
+    cell unless max_col is given; pd.DataFrame pads them with None. Close after use.
+    """
+    if (backend or reader_backend()) == "calamine":
+        try:
+            return _CalamineRowsWorkbook(file_path)
+        except Exception as e:
+            print(f"[Workbook reader] ❌ calamine could not open {file_path}, reading it with openpyxl: {e}")
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    # Read-only mode trusts the <dimension> the exporter wrote, which can be wrong: size the sheets from their rows
+    for ws in wb.worksheets:
+        ws.reset_dimensions()
+    return wb
+
+
+def non_empty_rows(ws, min_row):
+    """Value tuples of the rows from min_row (1-based) on that have at least one value."""
+    return [row for row in ws.iter_rows(min_row=min_row, values_only=True) if any(cell is not None for cell in row)]
+
+
+def sheet_names(file_path):
+    """Sheet names of an xlsx, read without parsing any sheet."""
+    wb = open_rows_workbook(file_path)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def workbook_sheet_parts(archive):
+    """
+    {sheet name: path of the sheet's XML in the zip}, in workbook order, for an xlsx opened as a zipfile.ZipFile.
+    Only xl/workbook.xml and its relationships are read: no shared strings, styles or cell data.
+    """
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    relationships = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    # Matched on local names: transitional and strict OOXML use different namespaces
+    targets = {rel.get("Id"): rel.get("Target") for rel in relationships if _local_name(rel.tag) == "Relationship"}
+    parts = {}
+    for element in workbook.iter():
+        if _local_name(element.tag) != "sheet":
+            continue
+        rel_id = next((value for key, value in element.attrib.items() if _local_name(key) == "id"), None)
+        parts[element.get("name")] = _part_path(targets.get(rel_id) or "")
+    return parts
+
+
+def workbook_shared_strings_part(archive):
+    """Path of the shared string table in the zip of an xlsx, None for a workbook without one."""
+    relationships = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for rel in relationships:
+        if _local_name(rel.tag) == "Relationship" and (rel.get("Type") or "").endswith("/sharedStrings"):
+            return _part_path(rel.get("Target") or "")
+    return None
+
+
+def _part_path(target):
+    # Relationship targets are relative to xl/ unless absolute
+    return target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def excel_file(file_path, backend=None):
+    """pd.ExcelFile on the reader backend, to .parse() several sheets of one workbook from a single open."""
+    if (backend or reader_backend()) == "calamine":
+        try:
+            return pd.ExcelFile(file_path, engine="calamine")
+        except Exception as e:
+            print(f"[Workbook reader] ❌ calamine could not open {file_path}, reading it with openpyxl: {e}")
+    return pd.ExcelFile(file_path, engine="openpyxl")
+
+
+def read_sheet(file_path, sheet_name, backend=None, **kwargs):
+    """pd.read_excel of one sheet on the reader backend; kwargs are passed on to read_excel."""
+    with excel_file(file_path, backend) as workbook:
+        return workbook.parse(sheet_name=sheet_name, **kwargs)
+
+
+class _CalamineRowsWorkbook:
+    def __init__(self, file_path):
+        self._workbook = CalamineWorkbook.from_path(file_path)
+        self.sheetnames = list(self._workbook.sheet_names)
+
+    def __getitem__(self, sheet_name):
+        return _CalamineRowsSheet(self._workbook.get_sheet_by_name(sheet_name))
+
+    def close(self):
+        self._workbook.close()
+
+
+class _CalamineRowsSheet:
+    def __init__(self, sheet):
+        self._sheet = sheet
+
+    def iter_rows(self, min_row=1, max_row=None, min_col=1, max_col=None, values_only=True):
+        if not values_only:
+            raise ValueError("calamine sheets only give cell values")
+        # calamine's iter_rows() converts one row at a time. Its rows start at row 1 but its cells at the sheet's
+        # first used column, so the columns before it are put back as empty cells.
+        # Like openpyxl's read-only sheets, rows end at the last used row whatever max_row is.
+        first_col = self._sheet.start[1] if self._sheet.start else 0
+        for row in itertools.islice(self._sheet.iter_rows(), min_row - 1, max_row):
+            yield self._values([""] * first_col + row, min_col, max_col)
+
+    @staticmethod
+    def _values(row, min_col, max_col):
+        values = [_openpyxl_value(value) for value in row[min_col - 1:max_col]]
+        if max_col is None:
+            while values and values[-1] is None:
+                values.pop()
+        else:
+            values += [None] * (max_col - min_col + 1 - len(values))
+        return tuple(values)
+
+
+def _openpyxl_value(value):
+    # calamine gives "" for empty cells, float for every number and date for date-only cells
+    if isinstance(value, str):
+        return value if value != "" else None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if type(value) is datetime.date:
+        return datetime.datetime.combine(value, datetime.time())
+    return value